@@ -5,7 +5,7 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urlencode
 import json
 import time
 import os
@@ -23,6 +23,7 @@ urllib3.disable_warnings(urllib3.exceptions.SecurityWarning)
 RESPONSE_SUCCESS = 200
 TIMEOUT = 30
 SLEEP_FOR_STATUS = 0.5
+EVENT_READ_TIMEOUT = 60
 WATCHER_POLL_TIME = 0.01
 #nosec skips pybandit hits
 REQUEST_TEMPLATE = {
@@ -268,26 +269,68 @@ def stop_pipeline(server_address, instance_id, show_request=False):
     print("Pipeline NOT stopped")
     return False
 
+def wait_for_states(server_address, instance_ids, condition, timeout_sec=None):
+    """Waits on the server event stream until condition(state) holds for
+    every instance. Returns True when it holds, False on timeout and None
+    if the event stream is not available."""
+    pending = set(instance_ids)
+    url = urljoin(server_address, "pipelines/events?" +
+                  urlencode([("id", instance_id) for instance_id in instance_ids]))
+    end_time = time.time() + timeout_sec if timeout_sec else None
+    read_timeout = timeout_sec if timeout_sec else EVENT_READ_TIMEOUT
+    try:
+        if https_request(url):
+            response = requests.get(url, stream=True, timeout=(TIMEOUT, read_timeout),
+                                    verify=os.environ["ENV_CERT"])
+        else:
+            response = requests.get(url, stream=True, timeout=(TIMEOUT, read_timeout))
+        with response:
+            if response.status_code != RESPONSE_SUCCESS:
+                return None
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    event = json.loads(line[len("data:"):])
+                    if event["type"] == "unknown" or \
+                            (event["type"] == "state" and condition(Pipeline.State[event["state"]])):
+                        pending.discard(event["id"])
+                    if not pending:
+                        return True
+                if end_time and time.time() > end_time:
+                    return False
+    except requests.exceptions.ReadTimeout:
+        return False
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        return None
+    return None
+
 def wait_for_pipeline_running(server_address,
                               instance_id,
                               timeout_sec = 30):
     status = {"state" : "QUEUED"}
     timeout_count = 0
-    while status and not Pipeline.State[status["state"]] == Pipeline.State.RUNNING:
-        time.sleep(SLEEP_FOR_STATUS)
+    started = lambda state: state == Pipeline.State.RUNNING or state.stopped()
+    if wait_for_states(server_address, [instance_id], started, timeout_sec) is not None:
         status = get_pipeline_status(server_address, instance_id)
-        if not status or Pipeline.State[status["state"]].stopped():
-            break
-        timeout_count += 1
-        if timeout_count * SLEEP_FOR_STATUS >= timeout_sec:
+        if status and not started(Pipeline.State[status["state"]]):
             print("Timed out waiting for RUNNING status")
-            break
+    else:
+        while status and not Pipeline.State[status["state"]] == Pipeline.State.RUNNING:
+            time.sleep(SLEEP_FOR_STATUS)
+            status = get_pipeline_status(server_address, instance_id)
+            if not status or Pipeline.State[status["state"]].stopped():
+                break
+            timeout_count += 1
+            if timeout_count * SLEEP_FOR_STATUS >= timeout_sec:
+                print("Timed out waiting for RUNNING status")
+                break
     if not status or status["state"] == "ERROR":
         raise ValueError(status["message"])
     return Pipeline.State[status["state"]] == Pipeline.State.RUNNING
 
 def wait_for_pipeline_completion(server_address, instance_id):
     status = {"state" : "RUNNING"}
+    if wait_for_states(server_address, [instance_id], Pipeline.State.stopped):
+        status = get_pipeline_status(server_address, instance_id)
     while status and not Pipeline.State[status["state"]].stopped():
         time.sleep(SLEEP_FOR_STATUS)
         status = get_pipeline_status(server_address, instance_id)
@@ -305,7 +348,9 @@ def wait_for_all_pipeline_completions(server_address, instance_ids, status_only=
         return None
     while status and not stopped:
         if num_streams > 1 or status_only:
-            time.sleep(10 * SLEEP_FOR_STATUS)
+            if wait_for_states(server_address, instance_ids, Pipeline.State.stopped,
+                               10 * SLEEP_FOR_STATUS) is None:
+                time.sleep(10 * SLEEP_FOR_STATUS)
             all_streams_stopped = True
             first_pipeline = True
             for instance_id in instance_ids:
@@ -321,7 +366,8 @@ def wait_for_all_pipeline_completions(server_address, instance_ids, status_only=
                 first_pipeline = False
             stopped = all_streams_stopped
         else:
-            time.sleep(SLEEP_FOR_STATUS)
+            if not wait_for_states(server_address, instance_ids, Pipeline.State.stopped):
+                time.sleep(SLEEP_FOR_STATUS)
             status = get_pipeline_status(server_address, instance_ids[0])
             stopped = Pipeline.State[status["state"]].stopped()
             status_list.append(status)
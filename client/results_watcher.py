@@ -5,6 +5,8 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 
+import gzip
+import io
 import json
 import time
 import os
@@ -16,6 +18,7 @@ import paho.mqtt.client as mqtt
 
 
 WATCHER_POLL_TIME = 0.01
+GZIP_MAGIC = b"\x1f\x8b"
 
 class ResultsWatcher(ABC):
 
@@ -42,6 +45,44 @@ class ResultsWatcher(ABC):
     def error_message(self):
         return self._error_message
 
+    @staticmethod
+    def decode_results(payload, encoding="json"):
+        # Messages published by the server may hold a batch of results,
+        # newline separated JSON or concatenated MessagePack or CBOR,
+        # and be gzip compressed
+        # pylint: disable=import-outside-toplevel
+        if payload[:2] == GZIP_MAGIC:
+            payload = gzip.decompress(payload)
+        if encoding == "msgpack":
+            import msgpack
+            unpacker = msgpack.Unpacker(raw=False)
+            unpacker.feed(payload)
+            return list(unpacker)
+        if encoding == "cbor":
+            import cbor2
+            stream = io.BytesIO(payload)
+            decoder = cbor2.CBORDecoder(stream)
+            results = []
+            while stream.tell() < len(payload):
+                results.append(decoder.decode())
+            return results
+        text = payload.decode() if isinstance(payload, bytes) else payload
+        try:
+            return [json.loads(text)]
+        except json.JSONDecodeError:
+            pass
+        # Batches separate results with newlines, results may be indented
+        decoder = json.JSONDecoder()
+        results = []
+        index = 0
+        while True:
+            while index < len(text) and text[index].isspace():
+                index += 1
+            if index == len(text):
+                return results
+            result, index = decoder.raw_decode(text, index)
+            results.append(result)
+
     @staticmethod
     def print_results(results):
         object_output = []
@@ -152,6 +193,7 @@ class MqttWatcher(ResultsWatcher):
         else:
             self._port = 1883
         self._topic = destination["topic"]
+        self._format = destination.get("format", "json")
         self._client.on_connect = self.on_connect
         self._client.on_message = self.on_message
         self._started_event = Event()
@@ -165,8 +207,8 @@ class MqttWatcher(ResultsWatcher):
             print("Error {} connecting to broker {}:{}".format(return_code, self._host, self._port))
 
     def on_message(self, _unused_client, _unused_user_data, msg):
-        result = json.loads(msg.payload)
-        ResultsWatcher.print_results(result)
+        for result in ResultsWatcher.decode_results(msg.payload, self._format):
+            ResultsWatcher.print_results(result)
 
     def start(self):
         self._client.connect(self._host, self._port)
@@ -189,6 +231,7 @@ class KafkaWatcher(ResultsWatcher):
             self._client_id = socket.gethostname()
             self._timeout_ms = 1000
             self._topic = destination["topic"]
+            self._format = destination.get("format", "json")
             self._bootstrap_servers = [destination["host"]]
             self._consumer=KafkaConsumer(
                 bootstrap_servers=self._bootstrap_servers,
@@ -232,7 +275,9 @@ class KafkaWatcher(ResultsWatcher):
                 if partitions:
                     for partition in partitions:
                         for message in partitions[partition]:
-                            ResultsWatcher.print_results(json.loads(message.value.decode('utf-8')))
+                            for result in ResultsWatcher.decode_results(message.value,
+                                                                        self._format):
+                                ResultsWatcher.print_results(result)
             self._watching = False
 
 
@@ -5,7 +5,7 @@
 '''
 
 import json
-import gva_event_meta
+from extensions.gva_event_meta import gva_event_meta
 from server.common.utils import logging
 
 logger = logging.get_logger('gva_event_convert', is_static=True)
@@ -19,14 +19,35 @@ def process_frame(frame):
     return True
 
 def add_events_message(frame):
-    events = gva_event_meta.events(frame)
+    accumulator = gva_event_meta.frame_events(frame)
+    events = accumulator.events
     if not events:
         return
-    gva_event_meta.remove_events(frame)
     for message in frame.messages():
-        message_obj = json.loads(message)
-        if "objects" in message_obj:
+        if '"objects"' not in message:
+            continue
+        merged = _merge_events(message, events)
+        if merged:
+            accumulator.clear()
+            accumulator.commit()
             frame.remove_message(message)
-            message_obj['events'] = events
-            frame.add_message(json.dumps(message_obj, separators=(',', ':')))
+            frame.add_message(merged)
             break
+    # Without an objects message, e.g. when the server encodes binary
+    # metadata, the events message is kept
+
+def _merge_events(message, events):
+    # The objects message is usually large, append the events to its
+    # serialized form instead of parsing and serializing it again
+    events_json = json.dumps(events, separators=(',', ':'))
+    body = message.rstrip()
+    if body.startswith('{') and body.endswith('}') and \
+            gva_event_meta.EVENTS_KEY not in body:
+        body = body[:-1].rstrip()
+        separator = "" if body.endswith('{') else ","
+        return '{}{}"events":{}}}'.format(body, separator, events_json)
+    message_obj = json.loads(message)
+    if "objects" not in message_obj:
+        return None
+    message_obj['events'] = events
+    return json.dumps(message_obj, separators=(',', ':'))
@@ -0,0 +1,191 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+
+The gva_event_filter module suppresses repeated events of a frame
+before they are published. Rules are set per event type, "*" applies
+to event types without their own rule:
+
+    min_interval : minimum seconds between events of the type for the
+                   same zone or line
+    change_only  : only pass events whose related objects differ from
+                   the previous frame's event of the type for the same
+                   zone or line
+    rate, burst  : token bucket limiting events of the type for the
+                   same zone or line to rate per second with bursts of
+                   up to burst events
+
+Zones and lines are identified by the zone-name, line-name or name
+attribute of events. Related objects are identified by track-ids if
+the event has them, otherwise by the object ids of related-objects.
+
+Extensions can filter their own events before committing them:
+
+    event_filter = EventFilter(rules={"object-zone-count": {"change_only": True}})
+    with gva_event_meta.frame_events(frame) as events:
+        events.add(event_type, attributes)
+        event_filter.filter(events, frame)
+
+or EventFilter can be added as a gvapython element after them.
+'''
+
+import time
+from collections import defaultdict
+from extensions.gva_event_meta import gva_event_meta
+from server.common.utils import logging
+
+logger = logging.get_logger('gva_event_filter', is_static=True)
+
+ANY_EVENT_TYPE = "*"
+NAME_KEYS = ("zone-name", "line-name", "name")
+RULE_KEYS = ("min_interval", "change_only", "rate", "burst")
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._time = None
+
+    def take(self, now):
+        if self._time is not None:
+            self._tokens = min(self._burst, self._tokens + (now - self._time) * self._rate)
+        self._time = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class EventFilter:
+
+    # Suppressed events are counted per event type and reason, if
+    # report_interval is set the counts are logged every report_interval
+    # seconds
+    def __init__(self, rules=None, report_interval=None, log_level="INFO"):
+        logger.log_level = log_level
+        self._rules = {event_type: self._validate_rule(event_type, rule)
+                       for event_type, rule in (rules or {}).items()}
+        self._report_interval = report_interval
+        self._last_report = None
+        # (event type, name) -> related object ids of the previous frame
+        self._last_objects = {}
+        # (event type, name) -> time of the last passed event
+        self._last_times = {}
+        # (event type, name) -> TokenBucket
+        self._buckets = {}
+        self.passed = 0
+        self.suppressed = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def _validate_rule(event_type, rule):
+        unknown = [key for key in rule if key not in RULE_KEYS]
+        if unknown:
+            raise ValueError('Unknown event filter rule for {}: {}'.format(event_type, unknown))
+        if ("burst" in rule) and ("rate" not in rule):
+            raise ValueError('Event filter rule for {} sets burst without rate'.format(event_type))
+        if ("rate" in rule) and (rule["rate"] <= 0):
+            raise ValueError('Event filter rate for {} must be positive'.format(event_type))
+        return rule
+
+    def _get_rule(self, event_type):
+        return self._rules.get(event_type, self._rules.get(ANY_EVENT_TYPE))
+
+    @staticmethod
+    def _get_name(event):
+        for key in NAME_KEYS:
+            if key in event:
+                return event[key]
+        return None
+
+    @staticmethod
+    def _get_objects(event, object_ids):
+        if "track-ids" in event:
+            return tuple(event["track-ids"])
+        related_objects = event.get("related-objects", [])
+        if object_ids is None:
+            return tuple(related_objects)
+        return tuple(object_ids[index] if 0 <= index < len(object_ids) else index
+                     for index in related_objects)
+
+    def _get_reason(self, event, rule, key, objects, now):
+        # Returns why the event is suppressed or None to pass it
+        if rule.get("change_only") and (self._last_objects.get(key) == objects):
+            return "change"
+        last_time = self._last_times.get(key)
+        if ("min_interval" in rule) and (last_time is not None) and \
+                (now - last_time < rule["min_interval"]):
+            return "interval"
+        if "rate" in rule:
+            # Zones and lines have their own bucket so a busy zone does
+            # not suppress the events of others
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rule["rate"],
+                                                 rule.get("burst", max(1, rule["rate"])))
+            if not self._buckets[key].take(now):
+                return "rate"
+        return None
+
+    def filter(self, frame_events, frame=None, now=None):
+        """Removes suppressed events from a gva_event_meta.FrameEvents,
+        returns the number of events suppressed. Call once per frame,
+        with frame to identify related-objects by object id."""
+        now = now if now is not None else time.time()
+        object_ids = None
+        if frame is not None:
+            object_ids = [region.object_id() for region in frame.regions()]
+        current_objects = {}
+        suppressed = []
+        for event in frame_events.events:
+            rule = self._get_rule(event.get("event-type"))
+            if not rule:
+                self.passed += 1
+                continue
+            key = (event.get("event-type"), self._get_name(event))
+            objects = self._get_objects(event, object_ids)
+            reason = self._get_reason(event, rule, key, objects, now)
+            if reason in (None, "change"):
+                current_objects[key] = objects
+            elif key in self._last_objects:
+                # Changes suppressed by another rule are reported once
+                # that rule allows it
+                current_objects.setdefault(key, self._last_objects[key])
+            if reason:
+                self.suppressed[key[0]][reason] += 1
+                suppressed.append(event)
+            else:
+                self._last_times[key] = now
+                self.passed += 1
+        # Events of zones or lines without an event in this frame pass
+        # again once they reappear
+        self._last_objects = current_objects
+        for event in suppressed:
+            frame_events.remove(event)
+        self._report(now)
+        return len(suppressed)
+
+    def _report(self, now):
+        if self._report_interval is None:
+            return
+        if self._last_report is None:
+            self._last_report = now
+        elif now - self._last_report >= self._report_interval:
+            self._last_report = now
+            logger.info("Event filter passed {} events, suppressed {}".format(
+                self.passed, self.status()["suppressed"]))
+
+    def status(self):
+        return {"passed": self.passed,
+                "suppressed": {event_type: dict(reasons)
+                               for event_type, reasons in self.suppressed.items()}}
+
+    def process_frame(self, frame):
+        try:
+            with gva_event_meta.frame_events(frame) as events:
+                self.filter(events, frame)
+        except Exception as error:
+            logger.error(error)
+        return True
@@ -5,56 +5,144 @@
 '''
 
 import json
+from collections import OrderedDict
+from threading import Lock
 from server.common.utils import logging
 
 logger = logging.get_logger('gva_event_meta', is_static=True)
 '''
 The gva_event_meta module is a set of APIs for developers to add, remove, and get events.
 GVAJSONMeta (frame message) is utilized for storing events.
-To avoid multiple "events" entries, already existing events are retrieved,
-removed from frame, updated with the new event, and stored back to the frame.
+To avoid multiple "events" entries, events are kept in a single message.
+
+FrameEvents accumulates the events of a frame: the events message is
+parsed on first access, changed in memory and written back once when
+the accumulator is committed, typically at the end of an extension's
+process_frame:
+
+    with gva_event_meta.frame_events(frame) as events:
+        events.add(event_type, attributes)
+
+The events of recently committed messages are cached, so the next
+extension on the frame reuses them instead of parsing the message.
+Events are still written to the frame by each extension: buffers may
+be copied between elements and elements like gvametaconvert only see
+the frame's messages.
 '''
 
+EVENTS_KEY = '"events"'
+MAX_CACHED_MESSAGES = 256
+
+_cache_lock = Lock()
+_cached_events = OrderedDict()
+
+
+def _cache_events(message, events):
+    with _cache_lock:
+        _cached_events[message] = events
+        if len(_cached_events) > MAX_CACHED_MESSAGES:
+            _cached_events.popitem(last=False)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _get_cached_events(message):
+    with _cache_lock:
+        events = _cached_events.get(message)
+    # Extensions may change events in place, cached events are not shared
+    return _copy(events) if events is not None else None
+
+
+class FrameEvents:
+
+    def __init__(self, frame):
+        self._frame = frame
+        self._events = None
+        self._message = None
+        self._modified = False
+
+    def _load(self):
+        self._events = []
+        for message in self._frame.messages():
+            # Only messages naming events need to be parsed
+            if EVENTS_KEY not in message:
+                continue
+            events = _get_cached_events(message)
+            if events is not None:
+                self._events = events
+                self._message = message
+                return
+            try:
+                message_obj = json.loads(message)
+                if "events" in message_obj:
+                    self._events = message_obj["events"]
+                    self._message = message
+                    return
+            except Exception as error:
+                logger.error(error)
+
+    @property
+    def events(self):
+        if self._events is None:
+            self._load()
+        return self._events
+
+    def add(self, event_type, attributes):
+        event = {'event-type': event_type}
+        for key, value in attributes.items():
+            event[key] = value
+        self.events.append(event)
+        self._modified = True
+
+    def remove(self, event):
+        if event in self.events:
+            self._events.remove(event)
+            self._modified = True
+
+    def clear(self):
+        if self.events or self._message:
+            self._events = []
+            self._modified = True
+
+    def commit(self):
+        if not self._modified:
+            return
+        if self._message is not None:
+            self._frame.remove_message(self._message)
+            self._message = None
+        if self._events:
+            self._message = json.dumps({"events": self._events})
+            self._frame.add_message(self._message)
+            _cache_events(self._message, _copy(self._events))
+        self._modified = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.commit()
+
+
+def frame_events(frame):
+    return FrameEvents(frame)
+
 def add_event(frame, event_type, attributes):
-    event = {'event-type': event_type}
-    for key, value in attributes.items():
-        event[key] = value
-    existing_events = _get_events(frame)
-    existing_events.append(event)
-    remove_events(frame)
-    events_message = {"events": existing_events}
-    frame.add_message(json.dumps(events_message))
+    with FrameEvents(frame) as accumulator:
+        accumulator.add(event_type, attributes)
 
 def remove_event(frame, event):
-    events = _get_events(frame)
-    if events:
-        events.remove(event)
-        remove_events(frame)
-        events_message = {"events": events}
-        frame.add_message(json.dumps(events_message))
+    with FrameEvents(frame) as accumulator:
+        accumulator.remove(event)
 
 def events(frame):
-    return _get_events(frame)
-
-def _get_events(frame):
-    events = []
-    for message in frame.messages():
-        try:
-            message_obj = json.loads(message)
-            if "events" in message_obj:
-                events = message_obj["events"]
-                break
-        except Exception as error:
-            logger.error(error)
-    return events
+    return FrameEvents(frame).events
 
 def remove_events(frame):
-    messages = frame.messages()
-    for message in messages:
-        try:
-            message_obj = json.loads(message)
-            if "events" in message_obj.keys():
-                frame.remove_message(message)
-                return
-        except Exception as error:
-            logger.error(error)
+    with FrameEvents(frame) as accumulator:
+        accumulator.clear()
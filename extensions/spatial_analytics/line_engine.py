@@ -0,0 +1,92 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import numpy
+
+# Values of object_line_crossing.Direction
+CLOCKWISE = 0
+COUNTERCLOCKWISE = 1
+PARALLEL = 2
+
+
+def _get_orientations(start_x, start_y, end_x, end_y, point_x, point_y):
+    # Same operations as LineSegment.get_orientation
+    cross_product = ((end_y - start_y) * (point_x - end_x)) - ((point_y - end_y) * (end_x - start_x))
+    return numpy.where(cross_product > 0, COUNTERCLOCKWISE,
+                       numpy.where(cross_product < 0, CLOCKWISE, PARALLEL))
+
+
+def _on_segment(start_x, start_y, end_x, end_y, point_x, point_y):
+    return (point_x <= numpy.maximum(start_x, end_x)) & (point_x >= numpy.minimum(start_x, end_x)) & \
+        (point_y <= numpy.maximum(start_y, end_y)) & (point_y >= numpy.minimum(start_y, end_y))
+
+
+class LineEngine:
+    """Tests tracked objects against lines in one batched NumPy call.
+
+    Results match SpatialAnalysisCrossingLine.detect_line_crossing:
+    focus points of the previous and current positions of each object
+    form its movement segment, which crosses a line if it intersects
+    the line segment, and the direction is the orientation of the
+    current focus point to the line. Like the grid index of
+    ObjectLineCrossing, only lines whose bounds overlap the bounds of
+    the movement are tested. Line coordinates are stored once.
+
+    """
+
+    def __init__(self, lines):
+        segments = numpy.array([[line.line_segment.start_point, line.line_segment.end_point]
+                                for line in lines], dtype=numpy.float64)
+        self._start_x, self._start_y = segments[:, 0, 0], segments[:, 0, 1]
+        self._end_x, self._end_y = segments[:, 1, 0], segments[:, 1, 1]
+        self._bounds = numpy.array([line.get_bounds() for line in lines], dtype=numpy.float64)
+        self._center_focus = numpy.array([line.focus_point == line.FocusPoint.center
+                                          for line in lines])
+
+    def crossings(self, previous_rects, current_rects):
+        """Returns arrays of object indices, line indices and directions of
+        crossed lines in object order, rects are normalized
+        (left, top, width, height)"""
+        previous_rects = numpy.asarray(previous_rects, dtype=numpy.float64).reshape(-1, 4)
+        current_rects = numpy.asarray(current_rects, dtype=numpy.float64).reshape(-1, 4)
+        object_indices, line_indices = numpy.nonzero(self._get_candidates(previous_rects,
+                                                                          current_rects))
+        center_focus = self._center_focus[line_indices]
+        previous_x, previous_y = self._get_focus_points(previous_rects[object_indices], center_focus)
+        current_x, current_y = self._get_focus_points(current_rects[object_indices], center_focus)
+        start_x, start_y = self._start_x[line_indices], self._start_y[line_indices]
+        end_x, end_y = self._end_x[line_indices], self._end_y[line_indices]
+        line = (start_x, start_y, end_x, end_y)
+        movement = (previous_x, previous_y, current_x, current_y)
+        orientation1 = _get_orientations(*line, previous_x, previous_y)
+        orientation2 = _get_orientations(*line, current_x, current_y)
+        orientation3 = _get_orientations(*movement, start_x, start_y)
+        orientation4 = _get_orientations(*movement, end_x, end_y)
+        crossed = ((orientation1 != orientation2) & (orientation3 != orientation4)) | \
+            ((orientation1 == PARALLEL) & _on_segment(*line, previous_x, previous_y)) | \
+            ((orientation2 == PARALLEL) & _on_segment(*line, current_x, current_y)) | \
+            ((orientation3 == PARALLEL) & _on_segment(*movement, start_x, start_y)) | \
+            ((orientation4 == PARALLEL) & _on_segment(*movement, end_x, end_y))
+        return object_indices[crossed], line_indices[crossed], orientation2[crossed]
+
+    def _get_candidates(self, previous_rects, current_rects):
+        # (objects, lines) array of line bounds overlapping movement bounds
+        x_values = (previous_rects[:, 0], previous_rects[:, 0] + previous_rects[:, 2],
+                    current_rects[:, 0], current_rects[:, 0] + current_rects[:, 2])
+        y_values = (previous_rects[:, 1], previous_rects[:, 1] + previous_rects[:, 3],
+                    current_rects[:, 1], current_rects[:, 1] + current_rects[:, 3])
+        x_min, x_max = numpy.minimum.reduce(x_values)[:, None], numpy.maximum.reduce(x_values)[:, None]
+        y_min, y_max = numpy.minimum.reduce(y_values)[:, None], numpy.maximum.reduce(y_values)[:, None]
+        return (self._bounds[:, 0] <= x_max) & (self._bounds[:, 2] >= x_min) & \
+            (self._bounds[:, 1] <= y_max) & (self._bounds[:, 3] >= y_min)
+
+    @staticmethod
+    def _get_focus_points(rects, center_focus):
+        # Same operations as SpatialAnalysisCrossingLine._get_focus_point
+        focus_x = rects[:, 0] + (rects[:, 2] / 2.0)
+        focus_y = numpy.where(center_focus, rects[:, 1] + (rects[:, 3] / 2.0),
+                              rects[:, 1] + rects[:, 3])
+        return focus_x, focus_y
@@ -5,10 +5,17 @@
 '''
 
 import os
+import time
 from collections import namedtuple
 from enum import Enum
 from extensions.gva_event_meta import gva_event_meta
+from extensions.spatial_analytics.spatial_index import GridIndex
+from extensions.spatial_analytics.track_store import TrackStore
 from server.common.utils import logging
+try:
+    from extensions.spatial_analytics.line_engine import LineEngine
+except ImportError:
+    LineEngine = None
 
 Point = namedtuple('Point', ['x', 'y'])
 BoundingBox = namedtuple('BoundingBox', ['left', 'top', 'width', 'height'])
@@ -23,10 +30,21 @@ https://www.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
 logger = logging.get_logger('object_line_crossing', is_static=True)
 
 class ObjectLineCrossing: # pylint: disable=too-few-public-methods
+    DEFAULT_MAX_TRACKS = 10000
 
-    def __init__(self, lines=None, enable_watermark=False, log_level="INFO"):
-        self._detected_objects = {}
+    # engine "numpy" tests all tracked objects against all lines at once,
+    # "python" tests them one at a time.
+    # Positions of tracks not seen for track_max_age_frames frames or
+    # track_max_age_seconds seconds are forgotten, as are the least recently
+    # seen tracks beyond max_tracks.
+    def __init__(self, lines=None, enable_watermark=False, log_level="INFO", engine="numpy",
+                 track_max_age_frames=None, track_max_age_seconds=None,
+                 max_tracks=DEFAULT_MAX_TRACKS):
+        self._detected_objects = TrackStore(track_max_age_frames, track_max_age_seconds, max_tracks)
+        self._frame_index = 0
         self._lines = []
+        self._line_index = None
+        self._line_engine = None
         self._enable_watermark = enable_watermark
         logger.log_level = log_level
         if self._enable_watermark and os.getenv("ENABLE_RTSP") != "true":
@@ -42,33 +60,33 @@ class ObjectLineCrossing: # pylint: disable=too-few-public-methods
                 logger.error("Exception creating SpatialAnalysisCrossingLine: {}".format(line))
         if not self._lines:
             raise Exception('Empty line configuration. No lines to check against.')
+        self._line_index = GridIndex([line.get_bounds() for line in self._lines])
+        if engine == "numpy":
+            if LineEngine:
+                self._line_engine = LineEngine(self._lines)
+            else:
+                logger.warning("NumPy is not available, using python line engine.")
 
     def process_frame(self, frame):
         try:
-            for line in self._lines:
-                related_objects = []
-                crossed_directions = []
-                for object_index, detected_object in enumerate(frame.regions()):
-                    track_id = detected_object.object_id()
-                    if track_id in self._detected_objects:
-                        current_position = BoundingBox(*detected_object.normalized_rect())
-                        direction = line.detect_line_crossing(previous_position=self._detected_objects[track_id],
-                                                              current_position=current_position)
-                        if direction:
-                            direction = direction.lower()
-                            logger.debug('ID {} {} {}'.format(track_id, direction, line.name))
-                            related_objects.append(object_index)
-                            crossed_directions.append(direction)
-                if crossed_directions:
-                    attributes = {'line-name':line.name,
-                                  'related-objects':related_objects,
-                                  'directions':crossed_directions,
-                                  'clockwise-total': line.cross_totals[Direction.CLOCKWISE.value],
-                                  'counterclockwise-total': line.cross_totals[Direction.COUNTERCLOCKWISE.value],
-                                  'total': sum(line.cross_totals)}
-                    gva_event_meta.add_event(frame,
-                                                       event_type=line.event_type,
-                                                       attributes=attributes)
+            with gva_event_meta.frame_events(frame) as events:
+                if self._line_engine:
+                    results = self._get_line_results_batched(frame)
+                else:
+                    results = self._get_line_results(frame)
+                for line, (related_objects, crossed_directions) in zip(self._lines, results):
+                    if crossed_directions:
+                        attributes = {'line-name':line.name,
+                                      'related-objects':related_objects,
+                                      'directions':crossed_directions,
+                                      'clockwise-total': line.cross_totals[Direction.CLOCKWISE.value],
+                                      'counterclockwise-total': line.cross_totals[Direction.COUNTERCLOCKWISE.value],
+                                      'total': sum(line.cross_totals),
+                                      'tracks': len(self._detected_objects),
+                                      'expired-tracks': self._detected_objects.expired,
+                                      'evicted-tracks': self._detected_objects.evicted}
+                        events.add(event_type=line.event_type,
+                                   attributes=attributes)
             self._update_object_positions(frame)
 
             if self._enable_watermark:
@@ -78,11 +96,71 @@ class ObjectLineCrossing: # pylint: disable=too-few-public-methods
             logger.error(error)
         return True
 
+    def _get_candidates(self, frame):
+        # Tracked objects and the lines near their movement
+        for object_index, detected_object in enumerate(frame.regions()):
+            track_id = detected_object.object_id()
+            if track_id in self._detected_objects:
+                previous_position = self._detected_objects[track_id]
+                current_position = BoundingBox(*detected_object.normalized_rect())
+                bounds = self._get_movement_bounds(previous_position, current_position)
+                line_indices = self._line_index.query(*bounds)
+                if line_indices:
+                    yield object_index, track_id, previous_position, current_position, line_indices
+
+    def _add_result(self, results, line_index, object_index, track_id, direction):
+        direction = direction.lower()
+        logger.debug('ID {} {} {}'.format(track_id, direction, self._lines[line_index].name))
+        results[line_index][0].append(object_index)
+        results[line_index][1].append(direction)
+
+    def _get_line_results(self, frame):
+        results = [([], []) for _ in self._lines]
+        for object_index, track_id, previous_position, current_position, line_indices \
+                in self._get_candidates(frame):
+            for line_index in line_indices:
+                direction = self._lines[line_index].detect_line_crossing(previous_position=previous_position,
+                                                                         current_position=current_position)
+                if direction:
+                    self._add_result(results, line_index, object_index, track_id, direction)
+        return results
+
+    def _get_line_results_batched(self, frame):
+        results = [([], []) for _ in self._lines]
+        objects = []
+        previous_rects = []
+        current_rects = []
+        for object_index, detected_object in enumerate(frame.regions()):
+            track_id = detected_object.object_id()
+            if track_id in self._detected_objects:
+                objects.append((object_index, track_id))
+                previous_rects.append(self._detected_objects[track_id])
+                current_rects.append(tuple(detected_object.normalized_rect()))
+        if objects:
+            for pair_object, line_index, orientation in zip(
+                    *self._line_engine.crossings(previous_rects, current_rects)):
+                self._lines[line_index].cross_totals[orientation] += 1
+                self._add_result(results, line_index, *objects[pair_object],
+                                 Direction(orientation).name)
+        return results
+
+    # Focus points of both positions are within the bounds
+    @staticmethod
+    def _get_movement_bounds(previous_position, current_position):
+        x_values = [position.left + offset for position in (previous_position, current_position)
+                    for offset in (0, position.width)]
+        y_values = [position.top + offset for position in (previous_position, current_position)
+                    for offset in (0, position.height)]
+        return min(x_values), min(y_values), max(x_values), max(y_values)
+
     def _update_object_positions(self, frame):
+        now = time.time()
         for detected_object in frame.regions():
             track_id = detected_object.object_id()
             bounding_box = BoundingBox(*detected_object.normalized_rect())
-            self._detected_objects[track_id] = bounding_box
+            self._detected_objects.update(track_id, bounding_box, self._frame_index, now)
+        self._detected_objects.expire(self._frame_index, now)
+        self._frame_index += 1
 
     def _add_point(self, frame, point, label):
         region = frame.add_region(point.x, point.y, 0, 0, label=label, normalized=True)
@@ -132,6 +210,10 @@ class SpatialAnalysisCrossingLine:
             except Exception as exception:
                 raise ValueError('Got invalid focus point: {}'.format(line['focus'])) from exception
 
+    @property
+    def focus_point(self):
+        return self._focus_point
+
     def detect_line_crossing(self, previous_position, current_position):
         previous_position_point = self._get_focus_point(previous_position)
         current_position_point = self._get_focus_point(current_position)
@@ -154,6 +236,12 @@ class SpatialAnalysisCrossingLine:
     def get_segment_midpoint(self):
         return self.line_segment.get_midpoint()
 
+    # Orientation tests are not exact, points within rounding error of
+    # the segment can be reported as crossing
+    def get_bounds(self, margin=1e-9):
+        x_min, y_min, x_max, y_max = self.line_segment.get_bounds()
+        return x_min - margin, y_min - margin, x_max + margin, y_max + margin
+
 class LineSegment:
 
     def __init__(self, start_point, end_point):
@@ -205,6 +293,10 @@ class LineSegment:
 
         return False
 
+    def get_bounds(self):
+        return (min(self.start_point.x, self.end_point.x), min(self.start_point.y, self.end_point.y),
+                max(self.start_point.x, self.end_point.x), max(self.start_point.y, self.end_point.y))
+
     def get_midpoint(self):
         return Point((self.start_point.x + self.end_point.x) / 2.0,
                      (self.start_point.y + self.end_point.y) / 2.0)
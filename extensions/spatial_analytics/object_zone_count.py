@@ -6,7 +6,12 @@
 
 import traceback
 from extensions.gva_event_meta import gva_event_meta
+from extensions.spatial_analytics.spatial_index import GridIndex
 from server.common.utils import logging
+try:
+    from extensions.spatial_analytics.zone_engine import ZoneEngine, WITHIN
+except ImportError:
+    ZoneEngine = None
 
 def print_message(message):
     print("", flush=True)
@@ -20,8 +25,12 @@ class ObjectZoneCount:
     DEFAULT_DETECTION_CONFIDENCE_THRESHOLD = 0.0
 
     # Caller supplies one or more zones via request parameter
-    def __init__(self, zones=None, enable_watermark=False, log_level="INFO"):
+    # engine "numpy" tests all detections against all zones at once,
+    # "python" tests them one at a time
+    def __init__(self, zones=None, enable_watermark=False, log_level="INFO", engine="numpy"):
         self._zones = []
+        self._zone_index = None
+        self._zone_engine = None
         self._logger = logger
         self._logger.log_level = log_level
         self._enable_watermark = enable_watermark
@@ -31,6 +40,15 @@ class ObjectZoneCount:
         self._zones = self._assign_defaults(zones)
         if not self._zones:
             raise Exception('Empty zone configuration. No zones to check against.')
+        self._zone_index = GridIndex([self._get_zone_bounds(zone) for zone in self._zones])
+        if engine == "numpy":
+            if not ZoneEngine:
+                logger.warning("NumPy is not available, using python zone engine.")
+            elif not ZoneEngine.supports(self._zones):
+                logger.warning("Zones with less than four vertices, using python zone engine.")
+            else:
+                self._zone_engine = ZoneEngine(self._zones,
+                                               ObjectZoneCount.DEFAULT_TRIGGER_ON_INTERSECT)
 
     # Note that the pipeline already applies a pipeline-specific threshold value, but
     # this method serves as an example for handling optional zone-specific parameters.
@@ -43,28 +61,96 @@ class ObjectZoneCount:
 
     def process_frame(self, frame):
         try:
-            for zone in self._zones:
-                statuses = []
-                related_objects = []
-                for object_index, detected_object in enumerate(frame.regions()):
-                    if not self._is_watermark_region(detected_object):
-                        zone_status = self._detect_zone_count(frame, detected_object, zone)
-                        if zone_status:
-                            statuses.append(zone_status)
-                            related_objects.append(object_index)
-                if related_objects:
-                    gva_event_meta.add_event(frame,
-                                             event_type=ObjectZoneCount.DEFAULT_EVENT_TYPE,
-                                             attributes={'zone-name':zone['name'],
-                                                         'related-objects':related_objects,
-                                                         'status':statuses,
-                                                         'zone-count': len(related_objects)})
+            with gva_event_meta.frame_events(frame) as events:
+                for zone, related_objects, statuses in self._get_results(frame):
+                    if related_objects:
+                        events.add(event_type=ObjectZoneCount.DEFAULT_EVENT_TYPE,
+                                   attributes={'zone-name':zone['name'],
+                                               'related-objects':related_objects,
+                                               'status':statuses,
+                                               'zone-count': len(related_objects)})
             if self._enable_watermark:
                 self._add_watermark_regions(frame)
         except Exception:
             print_message("Error processing frame: {}".format(traceback.format_exc()))
         return True
 
+    # Region in which a detection can be within or intersect the zone.
+    # detection_within_zone omits the closing edge of the polygon, if that
+    # edge is not horizontal points left of the polygon can be within.
+    def _get_zone_bounds(self, zone):
+        polygon = zone["polygon"]
+        x_values = [vertex[0] for vertex in polygon]
+        y_values = [vertex[1] for vertex in polygon]
+        x_min = min(x_values) if polygon[0][1] == polygon[-1][1] else float("-inf")
+        bounds = [x_min, min(y_values), max(x_values), max(y_values)]
+        if len(polygon) >= 4:
+            # detection_intersects_zone uses vertices 0, 2 and 3
+            bounds[0] = min(bounds[0], polygon[0][0], polygon[2][0])
+            bounds[1] = min(bounds[1], polygon[2][1], polygon[3][1])
+            bounds[2] = max(bounds[2], polygon[0][0], polygon[2][0])
+            bounds[3] = max(bounds[3], polygon[2][1], polygon[3][1])
+        return bounds
+
+    def _get_candidates(self, frame):
+        # Detections that are not watermarks and the zones near each of them
+        for object_index, detected_object in enumerate(frame.regions()):
+            if not self._is_watermark_region(detected_object):
+                rect = detected_object.normalized_rect()
+                x_values = (rect.x, rect.x + rect.w)
+                y_values = (rect.y, rect.y + rect.h)
+                zone_indices = self._zone_index.query(min(x_values), min(y_values),
+                                                      max(x_values), max(y_values))
+                if zone_indices:
+                    yield object_index, detected_object, zone_indices
+
+    # Yields zone, related object indices and statuses for each zone
+    def _get_results(self, frame):
+        if not self._zones:
+            return []
+        if self._zone_engine:
+            return self._get_zone_results_batched(frame)
+        return self._get_zone_results(frame)
+
+    def _get_zone_results(self, frame):
+        results = [([], []) for _ in self._zones]
+        for object_index, detected_object, zone_indices in self._get_candidates(frame):
+            for zone_index in zone_indices:
+                zone_status = self._get_zone_status(detected_object, self._zones[zone_index])
+                if zone_status:
+                    results[zone_index][0].append(object_index)
+                    results[zone_index][1].append(zone_status)
+        return self._add_results_watermarks(frame, results)
+
+    def _get_zone_results_batched(self, frame):
+        results = [([], []) for _ in self._zones]
+        rects = []
+        confidences = []
+        object_indices = []
+        pair_zones = []
+        pair_detections = []
+        for object_index, detected_object, zone_indices in self._get_candidates(frame):
+            pair_zones.extend(zone_indices)
+            pair_detections.extend([len(rects)] * len(zone_indices))
+            object_indices.append(object_index)
+            rects.append(tuple(detected_object.normalized_rect()))
+            confidences.append(detected_object.confidence())
+        if pair_zones:
+            statuses = self._zone_engine.statuses(rects, confidences, pair_zones, pair_detections)
+            for zone_index, detection_index, status in zip(pair_zones, pair_detections, statuses):
+                if status:
+                    results[zone_index][0].append(object_indices[detection_index])
+                    results[zone_index][1].append("within" if status == WITHIN else "intersects")
+        return self._add_results_watermarks(frame, results)
+
+    def _add_results_watermarks(self, frame, results):
+        # Results are collected per detection, related objects of a zone are
+        # in detection order as zone_index.query returns zones in order.
+        for zone, (related_objects, statuses) in zip(self._zones, results):
+            for status in statuses:
+                self._add_status_watermark(frame, zone, status)
+            yield zone, related_objects, statuses
+
     def _is_watermark_region(self, region):
         for tensor in region.tensors():
             if tensor.name() == "watermark_region":
@@ -109,20 +195,14 @@ class ObjectZoneCount:
         detection_poly[3] = (x_max, y_min)
         return detection_poly
 
-    def _detect_zone_count(self, frame, detected_object, zone):
+    def _get_zone_status(self, detected_object, zone):
         object_poly = self._get_detection_poly(detected_object)
-        intersects_zone = False
-        within_zone = False
         if (detected_object.confidence() >= zone["threshold"]):  # applying optional confidence filter
-            within_zone = self.detection_within_zone(zone["polygon"], object_poly)
-            if (not within_zone) and (ObjectZoneCount.DEFAULT_TRIGGER_ON_INTERSECT):
-                intersects_zone = self.detection_intersects_zone(zone["polygon"], object_poly)
-                if intersects_zone:
-                    self._add_status_watermark(frame, zone, "intersects")
-                    return "intersects"
-            if within_zone:
-                self._add_status_watermark(frame, zone, "within")
+            if self.detection_within_zone(zone["polygon"], object_poly):
                 return "within"
+            if (ObjectZoneCount.DEFAULT_TRIGGER_ON_INTERSECT) and \
+                    self.detection_intersects_zone(zone["polygon"], object_poly):
+                return "intersects"
         return None
 
     def _add_status_watermark(self, frame, zone, status):
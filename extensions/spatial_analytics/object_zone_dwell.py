@@ -0,0 +1,129 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+import traceback
+from extensions.gva_event_meta import gva_event_meta
+from extensions.spatial_analytics.object_zone_count import ObjectZoneCount, print_message
+from extensions.spatial_analytics.track_store import TrackStore
+from server.common.utils import logging
+
+logger = logging.get_logger('object_zone_dwell', is_static=True)
+
+class ObjectZoneDwell(ObjectZoneCount):
+    ENTER_EVENT_TYPE = "object-zone-enter"
+    EXIT_EVENT_TYPE = "object-zone-exit"
+    DWELL_EVENT_TYPE = "object-zone-dwell"
+    DEFAULT_TRACK_MAX_AGE_FRAMES = 30
+    DEFAULT_MAX_TRACKS = 10000
+
+    # Zones are tested like ObjectZoneCount, tracked objects in a zone are
+    # remembered so events are only sent when they enter or exit it, or
+    # when they have been in it for dwell_threshold seconds.
+    # A track that is not seen for track_max_age_frames frames or
+    # track_max_age_seconds seconds exits all of its zones, as do the least
+    # recently seen tracks beyond max_tracks.
+    # Detections without a track id (0 or None), e.g. when the pipeline
+    # has no gvatrack element, are ignored.
+    def __init__(self, zones=None, enable_watermark=False, log_level="INFO", engine="numpy",
+                 include_intersects=True, dwell_threshold=None,
+                 track_max_age_frames=DEFAULT_TRACK_MAX_AGE_FRAMES, track_max_age_seconds=None,
+                 max_tracks=DEFAULT_MAX_TRACKS):
+        super().__init__(zones, enable_watermark, log_level, engine)
+        self._include_intersects = include_intersects
+        self._dwell_threshold = dwell_threshold
+        # track id -> {zone index: [entry time, dwell reported]}
+        self._tracks = TrackStore(track_max_age_frames, track_max_age_seconds, max_tracks)
+        self._occupancy = [0] * len(self._zones)
+        self._frame_index = 0
+        self._untracked_warned = False
+
+    def process_frame(self, frame):
+        try:
+            now = time.time()
+            with gva_event_meta.frame_events(frame) as events:
+                transitions = self._update_tracks(frame, now)
+                for zone_index, zone in enumerate(self._zones):
+                    self._add_events(events, zone, self._occupancy[zone_index],
+                                     transitions[zone_index])
+            if self._enable_watermark:
+                self._add_watermark_regions(frame)
+        except Exception:
+            print_message("Error processing frame: {}".format(traceback.format_exc()))
+        return True
+
+    def _get_track_zones(self, frame):
+        # Zones of each track in the frame, tracks are in detection order
+        track_ids = {}
+        for object_index, detected_object in enumerate(frame.regions()):
+            if not self._is_watermark_region(detected_object):
+                track_id = detected_object.object_id()
+                if track_id:
+                    track_ids[object_index] = track_id
+                elif not self._untracked_warned:
+                    logger.warning("Ignoring detections without track id, "
+                                   "ObjectZoneDwell requires gvatrack.")
+                    self._untracked_warned = True
+        track_zones = {track_id: {} for track_id in track_ids.values()}
+        for zone_index, (_, related_objects, statuses) in enumerate(self._get_results(frame)):
+            for object_index, status in zip(related_objects, statuses):
+                if (object_index in track_ids) and \
+                        ((status == "within") or (self._include_intersects)):
+                    track_zones[track_ids[object_index]][zone_index] = object_index
+        return track_zones
+
+    def _update_tracks(self, frame, now):
+        # Per zone lists of entered (object index, track id), dwelling
+        # (object index, track id, dwell time) and exited (track id, dwell time)
+        transitions = [([], [], []) for _ in self._zones]
+        for track_id, zones in self._get_track_zones(frame).items():
+            state = self._tracks.get(track_id, {})
+            for zone_index in [zone_index for zone_index in state if zone_index not in zones]:
+                entry_time, _ = state.pop(zone_index)
+                self._exit(transitions, zone_index, track_id, now - entry_time)
+            for zone_index, object_index in zones.items():
+                if zone_index not in state:
+                    state[zone_index] = [now, False]
+                    self._occupancy[zone_index] += 1
+                    transitions[zone_index][0].append((object_index, track_id))
+                elif (self._dwell_threshold is not None) and (not state[zone_index][1]) and \
+                        (now - state[zone_index][0] >= self._dwell_threshold):
+                    state[zone_index][1] = True
+                    transitions[zone_index][1].append((object_index, track_id,
+                                                       now - state[zone_index][0]))
+            self._tracks.update(track_id, state, self._frame_index, now)
+        for track_id, state in self._tracks.expire(self._frame_index, now):
+            for zone_index, (entry_time, _) in state.items():
+                self._exit(transitions, zone_index, track_id, now - entry_time)
+        self._frame_index += 1
+        return transitions
+
+    def _exit(self, transitions, zone_index, track_id, dwell_time):
+        self._occupancy[zone_index] -= 1
+        transitions[zone_index][2].append((track_id, dwell_time))
+
+    @staticmethod
+    def _add_events(events, zone, occupancy, transitions):
+        entered, dwelling, exited = transitions
+        if entered:
+            events.add(event_type=ObjectZoneDwell.ENTER_EVENT_TYPE,
+                       attributes={'zone-name': zone['name'],
+                                   'related-objects': [entry[0] for entry in entered],
+                                   'track-ids': [entry[1] for entry in entered],
+                                   'occupancy': occupancy})
+        if dwelling:
+            events.add(event_type=ObjectZoneDwell.DWELL_EVENT_TYPE,
+                       attributes={'zone-name': zone['name'],
+                                   'related-objects': [entry[0] for entry in dwelling],
+                                   'track-ids': [entry[1] for entry in dwelling],
+                                   'dwell-times': [entry[2] for entry in dwelling],
+                                   'occupancy': occupancy})
+        if exited:
+            events.add(event_type=ObjectZoneDwell.EXIT_EVENT_TYPE,
+                       attributes={'zone-name': zone['name'],
+                                   'track-ids': [entry[0] for entry in exited],
+                                   'dwell-times': [entry[1] for entry in exited],
+                                   'occupancy': occupancy})
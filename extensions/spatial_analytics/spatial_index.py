@@ -0,0 +1,57 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import math
+
+
+class GridIndex:
+    """Uniform grid over axis aligned bounding boxes.
+
+    Boxes are (x_min, y_min, x_max, y_max) tuples and may have infinite
+    bounds. The grid covers the finite extent of the boxes with about
+    one box per cell and is built once. query() returns the indices,
+    in ascending order, of the boxes that overlap or touch the query
+    box, so callers can test detections only against nearby shapes and
+    still report them in configuration order.
+
+    """
+
+    def __init__(self, boxes, cells_per_side=None):
+        self._boxes = [tuple(box) for box in boxes]
+        self._cells_per_side = cells_per_side or max(1, math.ceil(math.sqrt(len(self._boxes))))
+        finite_x = [value for box in self._boxes for value in (box[0], box[2])
+                    if math.isfinite(value)] or [0.0]
+        finite_y = [value for box in self._boxes for value in (box[1], box[3])
+                    if math.isfinite(value)] or [0.0]
+        self._x_origin, self._y_origin = min(finite_x), min(finite_y)
+        self._cell_width = (max(finite_x) - self._x_origin) / self._cells_per_side or 1.0
+        self._cell_height = (max(finite_y) - self._y_origin) / self._cells_per_side or 1.0
+        self._cells = [[] for _ in range(self._cells_per_side * self._cells_per_side)]
+        for index, box in enumerate(self._boxes):
+            for cell in self._get_cells(box):
+                self._cells[cell].append(index)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _get_cell_range(self, low, high, origin, size):
+        last = self._cells_per_side - 1
+        first_cell = min(max(low - origin, 0.0) / size, last)
+        last_cell = min(max(high - origin, 0.0) / size, last)
+        return range(int(first_cell), int(last_cell) + 1)
+
+    def _get_cells(self, box):
+        columns = self._get_cell_range(box[0], box[2], self._x_origin, self._cell_width)
+        rows = self._get_cell_range(box[1], box[3], self._y_origin, self._cell_height)
+        return [row * self._cells_per_side + column for row in rows for column in columns]
+
+    def query(self, x_min, y_min, x_max, y_max):
+        candidates = set()
+        for cell in self._get_cells((x_min, y_min, x_max, y_max)):
+            candidates.update(self._cells[cell])
+        return sorted(index for index in candidates
+                      if self._boxes[index][0] <= x_max and self._boxes[index][2] >= x_min
+                      and self._boxes[index][1] <= y_max and self._boxes[index][3] >= y_min)
@@ -0,0 +1,75 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from collections import OrderedDict
+
+
+class TrackStore:
+    """State of tracked objects keyed by track id with bounded size.
+
+    Each track keeps a value together with the frame index and time it
+    was last updated. Tracks are kept in least recently updated order so
+    expire() only looks at the oldest tracks: it removes tracks not
+    updated for more than max_age_frames frames or max_age_seconds
+    seconds and, if there are still more than max_tracks, the least
+    recently updated ones. Limits that are None are not applied.
+
+    """
+
+    def __init__(self, max_age_frames=None, max_age_seconds=None, max_tracks=None):
+        self._max_age_frames = max_age_frames
+        self._max_age_seconds = max_age_seconds
+        self._max_tracks = max_tracks
+        # track id -> (value, frame index, time)
+        self._tracks = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def __contains__(self, track_id):
+        return track_id in self._tracks
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __getitem__(self, track_id):
+        return self._tracks[track_id][0]
+
+    def get(self, track_id, default=None):
+        track = self._tracks.get(track_id)
+        return track[0] if track else default
+
+    def items(self):
+        return ((track_id, track[0]) for track_id, track in self._tracks.items())
+
+    def update(self, track_id, value, frame_index, now):
+        self._tracks[track_id] = (value, frame_index, now)
+        self._tracks.move_to_end(track_id)
+
+    def _is_expired(self, track, frame_index, now):
+        _, last_frame_index, last_time = track
+        return ((self._max_age_frames is not None) and
+                (frame_index - last_frame_index > self._max_age_frames)) or \
+            ((self._max_age_seconds is not None) and (now - last_time > self._max_age_seconds))
+
+    def expire(self, frame_index, now):
+        """Removes expired and evicted tracks, returns their (track id, value)"""
+        removed = []
+        while self._tracks:
+            track_id, track = next(iter(self._tracks.items()))
+            if self._is_expired(track, frame_index, now):
+                self.expired += 1
+            elif (self._max_tracks is not None) and (len(self._tracks) > self._max_tracks):
+                self.evicted += 1
+            else:
+                break
+            del self._tracks[track_id]
+            removed.append((track_id, track[0]))
+        return removed
+
+    def status(self):
+        return {"tracks": len(self._tracks),
+                "expired": self.expired,
+                "evicted": self.evicted}
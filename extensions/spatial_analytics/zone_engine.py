@@ -0,0 +1,93 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import numpy
+
+WITHIN = 1
+INTERSECTS = 2
+
+
+class ZoneEngine:
+    """Tests pairs of detections and zones in one batched NumPy call.
+
+    Results match ObjectZoneCount.detection_within_zone and
+    detection_intersects_zone, including their treatment of zone
+    polygons: edges are taken from the first vertex through the last
+    without the closing edge, and intersection uses vertices 0, 2 and 3
+    as the zone's bounding rectangle. Edge arrays are built once, zones
+    are padded to the same number of edges with horizontal edges that
+    never toggle.
+
+    """
+
+    def __init__(self, zones, trigger_on_intersect=True):
+        edge_count = max(len(zone["polygon"]) for zone in zones)
+        shape = (len(zones), edge_count)
+        x_1, y_1 = numpy.zeros(shape), numpy.zeros(shape)
+        x_2, y_2 = numpy.zeros(shape), numpy.zeros(shape)
+        for index, zone in enumerate(zones):
+            polygon = numpy.array(zone["polygon"], dtype=numpy.float64)
+            starts = numpy.concatenate((polygon[:1], polygon[:-1]))
+            x_1[index, :len(polygon)], y_1[index, :len(polygon)] = starts[:, 0], starts[:, 1]
+            x_2[index, :len(polygon)], y_2[index, :len(polygon)] = polygon[:, 0], polygon[:, 1]
+        self._x_1 = x_1
+        self._y_1 = y_1
+        self._x_delta = x_2 - x_1
+        self._y_delta = y_2 - y_1
+        self._y_min = numpy.minimum(y_1, y_2)
+        self._y_max = numpy.maximum(y_1, y_2)
+        self._x_max = numpy.maximum(x_1, x_2)
+        self._not_vertical = x_1 != x_2
+        corners = numpy.array([[zone["polygon"][vertex] for vertex in (0, 2, 3)]
+                               for zone in zones], dtype=numpy.float64)
+        self._zone_x0 = corners[:, 0, 0]
+        self._zone_x2 = corners[:, 1, 0]
+        self._zone_y2 = corners[:, 1, 1]
+        self._zone_y3 = corners[:, 2, 1]
+        self._thresholds = numpy.array([zone["threshold"] for zone in zones], dtype=numpy.float64)
+        self._trigger_on_intersect = trigger_on_intersect
+
+    @staticmethod
+    def supports(zones):
+        return all(len(zone["polygon"]) >= 4 for zone in zones)
+
+    def points_within(self, zone_indices, points_x, points_y):
+        """Returns a (pairs, points) array of the points of each pair
+        within its zone, points have shape (pairs, points)"""
+        # Shapes (pairs, edges, 1) to broadcast against (pairs, 1, points)
+        def edges(values):
+            return values[zone_indices][:, :, None]
+        points_x, points_y = points_x[:, None, :], points_y[:, None, :]
+        crosses = (edges(self._y_min) < points_y) & (points_y <= edges(self._y_max)) & \
+            (points_x <= edges(self._x_max))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            intersection = (points_y - edges(self._y_1)) * edges(self._x_delta) / \
+                edges(self._y_delta) + edges(self._x_1)
+        toggles = crosses & (edges(self._not_vertical) | (points_x <= intersection))
+        return numpy.count_nonzero(toggles, axis=1) % 2 == 1
+
+    def statuses(self, rects, confidences, zone_indices, detection_indices):
+        """Returns 0, WITHIN or INTERSECTS for each pair of zone and
+        detection index, rects are normalized (x, y, w, h)"""
+        zone_indices = numpy.asarray(zone_indices, dtype=numpy.intp)
+        detection_indices = numpy.asarray(detection_indices, dtype=numpy.intp)
+        rects = numpy.asarray(rects, dtype=numpy.float64).reshape(-1, 4)[detection_indices]
+        x_min, y_min = rects[:, 0], rects[:, 1]
+        x_max, y_max = x_min + rects[:, 2], y_min + rects[:, 3]
+        # Corners in the order of ObjectZoneCount._get_detection_poly
+        points_x = numpy.stack((x_min, x_min, x_max, x_max), axis=1)
+        points_y = numpy.stack((y_min, y_max, y_max, y_min), axis=1)
+        within = self.points_within(zone_indices, points_x, points_y).all(axis=1)
+        confidences = numpy.asarray(confidences, dtype=numpy.float64)[detection_indices]
+        eligible = confidences >= self._thresholds[zone_indices]
+        result = numpy.where(eligible & within, WITHIN, 0)
+        if self._trigger_on_intersect:
+            intersects = ~((self._zone_x0[zone_indices] >= x_max) |
+                           (self._zone_x2[zone_indices] <= x_min) |
+                           (self._zone_y2[zone_indices] <= y_min) |
+                           (self._zone_y3[zone_indices] >= y_max))
+            result = numpy.where(eligible & ~within & intersects, INTERSECTS, result)
+        return result
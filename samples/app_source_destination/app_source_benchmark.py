@@ -0,0 +1,85 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import time
+
+import gi
+import numpy
+
+gi.require_version('Gst', '1.0')
+gi.require_version('GstApp', '1.0')
+# pylint: disable=wrong-import-position
+from gi.repository import Gst
+from server.gstreamer_app_source import FramePool, wrap_buffer
+# pylint: enable=wrong-import-position
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+
+
+def parse_args(args=None, program_name="App Source Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--frames", action="store",
+                        dest="frames",
+                        type=int,
+                        required=False,
+                        default=500)
+
+    parser.add_argument("--resolution", action="append",
+                        dest="resolutions",
+                        required=False,
+                        choices=list(RESOLUTIONS),
+                        default=None)
+
+    return parser.parse_args(args)
+
+
+def copy_buffer(data):
+    # Frame creation used before buffer protocol support
+    data = bytes(data)
+    buffer = Gst.Buffer.new_allocate(None, len(data))
+    buffer.fill(0, data)
+    return buffer
+
+
+def run(create_buffer, width, height, frame_count):
+    pipeline = Gst.parse_launch(
+        "appsrc name=source format=time block=true max-bytes={} "
+        "caps=video/x-raw,format=BGR,width={},height={},framerate=30/1 "
+        "! fakesink sync=false".format(width * height * 3 * 4, width, height))
+    source = pipeline.get_by_name("source")
+    frames = [numpy.random.randint(0, 255, (height, width, 3), dtype=numpy.uint8)
+              for _ in range(4)]
+    pipeline.set_state(Gst.State.PLAYING)
+    start = time.perf_counter()
+    for index in range(frame_count):
+        buffer = create_buffer(frames[index % len(frames)])
+        buffer.pts = index * Gst.SECOND // 30
+        source.push_buffer(buffer)
+    source.end_of_stream()
+    pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE,
+                                          Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    elapsed = time.perf_counter() - start
+    pipeline.set_state(Gst.State.NULL)
+    return frame_count / elapsed
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    Gst.init(None)
+    for resolution in args.resolutions or list(RESOLUTIONS):
+        width, height = RESOLUTIONS[resolution]
+        frame_pool = FramePool()
+        for name, create_buffer in (("copy", copy_buffer),
+                                    ("wrapped", wrap_buffer),
+                                    ("pooled", frame_pool.buffer)):
+            fps = run(create_buffer, width, height, args.frames)
+            print("{:>6} {:>8}: {:8.1f} fps {:8.1f} MB/s".format(
+                resolution, name, fps, fps * width * height * 3 / 1e6))
+        frame_pool.stop()
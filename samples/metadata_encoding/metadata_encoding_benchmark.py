@@ -0,0 +1,157 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+# pylint: disable=wrong-import-position
+from server.metadata_sinks import frame_metadata
+
+
+def parse_args(args=None, program_name="Metadata Encoding Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--objects", action="store",
+                        dest="objects",
+                        type=int,
+                        required=False,
+                        default=150)
+
+    parser.add_argument("--frames", action="store",
+                        dest="frames",
+                        type=int,
+                        required=False,
+                        default=1000)
+
+    return parser.parse_args(args)
+
+
+Rect = namedtuple("Rect", ["x", "y", "w", "h"])
+VideoInfo = namedtuple("VideoInfo", ["width", "height"])
+
+
+class Tensor:
+    # Detection tensor with the accessors of gstgva.Tensor
+    def __init__(self, label, confidence):
+        self._label = label
+        self._confidence = confidence
+
+    def name(self):
+        return "detection"
+
+    def label(self):
+        return self._label
+
+    def label_id(self):
+        return 1
+
+    def confidence(self):
+        return self._confidence
+
+    @staticmethod
+    def is_detection():
+        return True
+
+
+class Region:
+    # Region with the accessors of gstgva.RegionOfInterest
+    def __init__(self, object_id, normalized, width, height):
+        self._object_id = object_id
+        self._normalized = normalized
+        self._rect = Rect(int(normalized.x * width), int(normalized.y * height),
+                          int(normalized.w * width), int(normalized.h * height))
+        self._detection = Tensor("person", random.random())
+
+    def rect(self):
+        return self._rect
+
+    def normalized_rect(self):
+        return self._normalized
+
+    def label(self):
+        return self._detection.label()
+
+    def confidence(self):
+        return self._detection.confidence()
+
+    def object_id(self):
+        return self._object_id
+
+    def tensors(self):
+        return [self._detection]
+
+
+class Frame:
+    # Frame with the accessors of gstgva.VideoFrame used by frame_metadata
+    def __init__(self, object_count, width=1920, height=1080):
+        self._video_info = VideoInfo(width, height)
+        self._regions = []
+        for index in range(object_count):
+            normalized = Rect(random.random() * 0.9, random.random() * 0.9,
+                              random.random() * 0.1, random.random() * 0.1)
+            self._regions.append(Region(index + 1, normalized, width, height))
+
+    def regions(self):
+        return self._regions
+
+    def video_info(self):
+        return self._video_info
+
+    @staticmethod
+    def messages():
+        return []
+
+
+def get_encoders():
+    # pylint: disable=import-outside-toplevel
+    encoders = {"json": lambda frame: json.dumps(frame, separators=(',', ':')).encode()}
+    try:
+        import msgpack
+        encoders["msgpack"] = msgpack.packb
+    except ImportError:
+        print("msgpack not installed, skipping")
+    try:
+        import cbor2
+        encoders["cbor"] = cbor2.dumps
+    except ImportError:
+        print("cbor2 not installed, skipping")
+    return encoders
+
+
+def measure(function, argument, count):
+    start = time.process_time()
+    for _ in range(count):
+        function(argument)
+    return (time.process_time() - start) / count
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    frame = Frame(args.objects)
+    metadata = frame_metadata(frame, 13916666666)
+    encoders = get_encoders()
+    print("{} objects per frame".format(args.objects))
+    print("{:>8} {:>8} {:>10} {:>12} {:>17}".format(
+        "format", "bytes", "gzip bytes", "encode (us)", "from regions (us)"))
+    for name, encode in encoders.items():
+        payload = encode(metadata)
+        encode_time = measure(encode, metadata, args.frames)
+        # The server publisher builds binary messages from the regions
+        # of a frame, JSON messages are produced by gvametaconvert
+        build_time = measure(lambda value, encode=encode: encode(frame_metadata(value, 0)),
+                             frame, args.frames)
+        print("{:>8} {:>8} {:>10} {:>12.1f} {:>17}".format(
+            name, len(payload), len(gzip.compress(payload)), encode_time * 1e6,
+            "-" if name == "json" else "{:.1f}".format(build_time * 1e6)))
@@ -0,0 +1,96 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from server import schema
+from server.pipeline_manager import PipelineManager
+
+
+def parse_args(args=None, program_name="Request Validator Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--pipeline", action="store",
+                        dest="pipeline",
+                        required=False,
+                        default=os.path.join("pipelines", "gstreamer", "object_detection",
+                                             "person_vehicle_bike", "pipeline.json"))
+
+    parser.add_argument("--requests", action="store",
+                        dest="requests",
+                        type=int,
+                        required=False,
+                        default=1000)
+
+    return parser.parse_args(args)
+
+
+def load_config(path):
+    with open(path) as config_file:
+        config = json.load(config_file)
+    # Sections PipelineManager.set_defaults adds to pipelines without them
+    config.setdefault("destination", schema.destination)
+    config.setdefault("source", schema.source)
+    config.setdefault("tags", schema.tags)
+    return config
+
+
+REQUEST = {"source": {"uri": "rtsp://camera/stream", "type": "uri"},
+           "destination": {"metadata": {"type": "mqtt", "host": "broker:1883",
+                                        "topic": "pipeline-server"}},
+           "parameters": {"detection-device": "CPU", "threshold": 0.5},
+           "tags": {"camera": "entrance"}}
+
+
+def validate(validators, request):
+    # Same sections and order as PipelineManager.create_instance
+    for section in ["parameters", "source", "tags"]:
+        if section in request and not validators[section].is_valid(request[section]):
+            return section
+    for destination, section in request.get("destination", {}).items():
+        validator = validators["destination"].get(destination)
+        if validator and not validator.is_valid(section):
+            return "destination"
+    return None
+
+
+def per_request(config, request):
+    return validate(PipelineManager._compile_validators(config), request)
+
+
+def cached(validators, request):
+    return validate(validators, request)
+
+
+def measure(function, argument, request, count):
+    start = time.process_time()
+    for _ in range(count):
+        function(argument, request)
+    return (time.process_time() - start) / count
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = load_config(args.pipeline)
+    validators = PipelineManager._compile_validators(config)
+    invalid_request = copy.deepcopy(REQUEST)
+    invalid_request["parameters"]["threshold"] = "high"
+    # Cached validators must accept and reject the same requests
+    for request in [REQUEST, invalid_request]:
+        if per_request(config, request) != cached(validators, request):
+            sys.exit("Validation results differ")
+    per_request_time = measure(per_request, config, REQUEST, args.requests)
+    cached_time = measure(cached, validators, REQUEST, args.requests)
+    print("{}, {} requests, results match".format(args.pipeline, args.requests))
+    print("{:>12} {:>14}".format("validators", "request (us)"))
+    print("{:>12} {:>14.1f}".format("per request", per_request_time * 1e6))
+    print("{:>12} {:>14.1f}".format("cached", cached_time * 1e6))
@@ -0,0 +1,101 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import random
+import sys
+import time
+from zone_count_benchmark import Frame, Rect, Region
+# pylint: disable=wrong-import-order
+from extensions.spatial_analytics.object_line_crossing import ObjectLineCrossing
+
+
+def parse_args(args=None, program_name="Line Crossing Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--lines", action="store",
+                        dest="lines",
+                        type=int,
+                        required=False,
+                        default=10)
+
+    parser.add_argument("--tracks", action="store",
+                        dest="tracks",
+                        type=int,
+                        required=False,
+                        default=200)
+
+    parser.add_argument("--frames", action="store",
+                        dest="frames",
+                        type=int,
+                        required=False,
+                        default=100)
+
+    parser.add_argument("--seed", action="store",
+                        dest="seed",
+                        type=int,
+                        required=False,
+                        default=0)
+
+    return parser.parse_args(args)
+
+
+def create_lines(line_count):
+    # Lines across the frame, as used for counting lanes or doorways
+    return [{"name": "Line{}".format(index),
+             "line": [[random.random() * 0.2, random.random()],
+                      [0.8 + random.random() * 0.2, random.random()]],
+             "focus": random.choice(["bottom_center", "center"])}
+            for index in range(line_count)]
+
+
+def create_frames(track_count, frame_count):
+    tracks = []
+    for _ in range(track_count):
+        size = 0.02 + random.random() * 0.06
+        tracks.append([random.random() * 0.9, random.random() * 0.9, size, size * 2,
+                       (random.random() - 0.5) * 0.02, (random.random() - 0.5) * 0.02])
+    frames = []
+    for _ in range(frame_count):
+        regions = []
+        for object_id, track in enumerate(tracks):
+            track[0] = min(max(track[0] + track[4], 0.0), 0.9)
+            track[1] = min(max(track[1] + track[5], 0.0), 0.9)
+            regions.append(Region(Rect(*track[:4]), 1.0, object_id))
+        frames.append(regions)
+    return frames
+
+
+def run(engine, lines, frames):
+    line_crossing = ObjectLineCrossing([dict(line) for line in lines], engine=engine)
+    messages = []
+    start = time.process_time()
+    for regions in frames:
+        frame = Frame(regions)
+        line_crossing.process_frame(frame)
+        messages.append(frame.messages())
+    elapsed = time.process_time() - start
+    cross_totals = [line.cross_totals for line in line_crossing._lines]
+    return elapsed / len(frames), messages, cross_totals
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    lines = create_lines(args.lines)
+    frames = create_frames(args.tracks, args.frames)
+    python_time, python_messages, python_totals = run("python", lines, frames)
+    numpy_time, numpy_messages, numpy_totals = run("numpy", lines, frames)
+    # Both engines must produce the same events and totals
+    if (numpy_messages != python_messages) or (numpy_totals != python_totals):
+        sys.exit("Line crossing results differ")
+    print("{} lines, {} tracks, {} crossings, results match".format(
+        args.lines, args.tracks, sum(sum(totals) for totals in python_totals)))
+    print("{:>8} {:>12}".format("engine", "frame (ms)"))
+    print("{:>8} {:>12.2f}".format("python", python_time * 1e3))
+    print("{:>8} {:>12.2f}".format("numpy", numpy_time * 1e3))
@@ -0,0 +1,119 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import math
+import random
+import sys
+from zone_count_benchmark import Frame, Rect, Region, get_results, measure
+# pylint: disable=wrong-import-order
+from extensions.spatial_analytics.object_zone_count import ObjectZoneCount
+
+
+class BruteForceIndex:
+    # Returns every zone, as ObjectZoneCount did before zones were indexed
+    def __init__(self, count):
+        self._indices = list(range(count))
+
+    def query(self, *unused_bounds):
+        return self._indices
+
+
+def parse_args(args=None, program_name="Spatial Index Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--zones", action="store",
+                        dest="zones",
+                        type=lambda value: [int(count) for count in value.split(',')],
+                        required=False,
+                        default="1,10,50,100,200,500")
+
+    parser.add_argument("--objects", action="store",
+                        dest="objects",
+                        type=int,
+                        required=False,
+                        default=80)
+
+    parser.add_argument("--frames", action="store",
+                        dest="frames",
+                        type=int,
+                        required=False,
+                        default=50)
+
+    parser.add_argument("--seed", action="store",
+                        dest="seed",
+                        type=int,
+                        required=False,
+                        default=0)
+
+    return parser.parse_args(args)
+
+
+def create_parking_lot(zone_count):
+    # Rows of slanted stalls covering the frame
+    columns = math.ceil(math.sqrt(zone_count))
+    rows = math.ceil(zone_count / columns)
+    width, height = 1.0 / columns, 1.0 / rows
+    zones = []
+    for index in range(zone_count):
+        x_min, y_min = (index % columns) * width, (index // columns) * height
+        x_max, y_max = x_min + width * 0.9, y_min + height * 0.9
+        zones.append({"name": "Stall{}".format(index),
+                      "polygon": [[x_min + width * 0.1, y_min], [x_min, y_max],
+                                  [x_max - width * 0.1, y_max], [x_max, y_min]]})
+    return zones
+
+
+def create_frame(object_count):
+    regions = []
+    for _ in range(object_count):
+        size = 0.02 + random.random() * 0.08
+        regions.append(Region(Rect(random.random() * (1 - size), random.random() * (1 - size),
+                                   size, size * 0.6), random.random()))
+    return Frame(regions)
+
+
+def get_methods(zones):
+    methods = {}
+    for engine in ("python", "numpy"):
+        for index in ("all", "grid"):
+            zone_count = ObjectZoneCount([dict(zone) for zone in zones], engine=engine)
+            if index == "all":
+                zone_count._zone_index = BruteForceIndex(len(zones))
+            results = zone_count._get_zone_results
+            if engine == "numpy":
+                results = zone_count._get_zone_results_batched
+            methods["{} {}".format(engine, index)] = \
+                lambda frame, results=results: get_results(results(frame))
+    return methods
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    frames = [create_frame(args.objects) for _ in range(args.frames)]
+    print("{} objects per frame, frame time in ms".format(args.objects))
+    print("{:>6} {:>12} {:>12} {:>12} {:>12} {:>11}".format(
+        "zones", "python all", "python grid", "numpy all", "numpy grid", "candidates"))
+    for count in args.zones:
+        zones = create_parking_lot(count)
+        methods = get_methods(zones)
+        # All methods must report the same events before timing them
+        for frame in frames:
+            results = [method(frame) for method in methods.values()]
+            if any(result != results[0] for result in results):
+                sys.exit("Zone results differ for {} zones".format(count))
+        zone_index = ObjectZoneCount(zones, engine="python")._zone_index
+        candidates = sum(len(zone_index.query(region.normalized_rect().x,
+                                              region.normalized_rect().y,
+                                              region.normalized_rect().x + region.normalized_rect().w,
+                                              region.normalized_rect().y + region.normalized_rect().h))
+                         for frame in frames for region in frame.regions())
+        times = [measure(method, frames) * 1e3 for method in methods.values()]
+        print("{:>6} {:>12.2f} {:>12.2f} {:>12.2f} {:>12.2f} {:>11.1f}".format(
+            count, *times, candidates / (len(frames) * args.objects)))
@@ -0,0 +1,149 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+# pylint: disable=wrong-import-position
+from extensions.spatial_analytics.object_zone_count import ObjectZoneCount
+# pylint: enable=wrong-import-position
+
+Rect = namedtuple("Rect", "x y w h")
+
+
+class Region:
+    # Subset of gstgva.RegionOfInterest used by the spatial analytics extensions
+    def __init__(self, rect, confidence, object_id=0):
+        self._rect = rect
+        self._confidence = confidence
+        self._object_id = object_id
+
+    def normalized_rect(self):
+        return self._rect
+
+    def confidence(self):
+        return self._confidence
+
+    def object_id(self):
+        return self._object_id
+
+    def tensors(self):
+        return []
+
+
+class Frame:
+    # Subset of gstgva.VideoFrame used by the spatial analytics extensions
+    def __init__(self, regions):
+        self._regions = regions
+        self._messages = []
+
+    def regions(self):
+        return self._regions
+
+    def messages(self):
+        return list(self._messages)
+
+    def add_message(self, message):
+        self._messages.append(message)
+
+    def remove_message(self, message):
+        self._messages.remove(message)
+
+
+def parse_args(args=None, program_name="Zone Count Benchmark"):
+
+    parser = argparse.ArgumentParser(prog=program_name, fromfile_prefix_chars='@',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--zones", action="store",
+                        dest="zones",
+                        type=int,
+                        required=False,
+                        default=20)
+
+    parser.add_argument("--objects", action="store",
+                        dest="objects",
+                        type=int,
+                        required=False,
+                        default=80)
+
+    parser.add_argument("--frames", action="store",
+                        dest="frames",
+                        type=int,
+                        required=False,
+                        default=100)
+
+    parser.add_argument("--seed", action="store",
+                        dest="seed",
+                        type=int,
+                        required=False,
+                        default=0)
+
+    return parser.parse_args(args)
+
+
+def create_zones(zone_count):
+    zones = []
+    for index in range(zone_count):
+        x_min, y_min = random.random() * 0.8, random.random() * 0.8
+        x_max, y_max = x_min + random.random() * 0.2, y_min + random.random() * 0.2
+        # Skewed quadrilaterals in the vertex order of the example configuration
+        zones.append({"name": "Zone{}".format(index),
+                      "polygon": [[x_min + random.random() * 0.02, y_min],
+                                  [x_min, y_max],
+                                  [x_max, y_max],
+                                  [x_max - random.random() * 0.02, y_min]],
+                      "threshold": random.choice([0.0, 0.5])})
+    return zones
+
+
+def create_frame(object_count):
+    regions = []
+    for _ in range(object_count):
+        x_min, y_min = random.random() * 0.9, random.random() * 0.9
+        regions.append(Region(Rect(x_min, y_min, random.random() * 0.1, random.random() * 0.1),
+                              random.random()))
+    return Frame(regions)
+
+
+def get_results(zone_results):
+    return [(zone["name"], related_objects, statuses)
+            for zone, related_objects, statuses in zone_results]
+
+
+def measure(function, frames):
+    start = time.process_time()
+    for frame in frames:
+        function(frame)
+    return (time.process_time() - start) / len(frames)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    zones = create_zones(args.zones)
+    frames = [create_frame(args.objects) for _ in range(args.frames)]
+    engines = {"python": ObjectZoneCount(zones, engine="python"),
+               "numpy": ObjectZoneCount(zones, engine="numpy")}
+    # Both engines must report the same events before timing them
+    for frame in frames:
+        expected = get_results(engines["python"]._get_zone_results(frame))
+        actual = get_results(engines["numpy"]._get_zone_results_batched(frame))
+        if actual != expected:
+            sys.exit("Zone results differ:\n{}\n{}".format(expected, actual))
+    print("{} zones, {} objects per frame, results match".format(args.zones, args.objects))
+    python_time = measure(lambda frame: get_results(engines["python"]._get_zone_results(frame)),
+                          frames)
+    numpy_time = measure(
+        lambda frame: get_results(engines["numpy"]._get_zone_results_batched(frame)), frames)
+    print("{:>8} {:>12}".format("engine", "frame (ms)"))
+    print("{:>8} {:>12.2f}".format("python", python_time * 1e3))
+    print("{:>8} {:>12.2f}".format("numpy", numpy_time * 1e3))
@@ -9,8 +9,13 @@ import sys
 import os
 import connexion
 from flask_cors import CORS
+import tornado.httpserver
+import tornado.ioloop
+import tornado.web
+import tornado.wsgi
 from server.common.utils import logging
 from server.pipeline_server import PipelineServer
+from server.rest_api.event_stream import InstanceEventsHandler
 
 logger = logging.get_logger('main', is_static=True)
 MAX_BODY_SIZE = int(os.getenv("MAX_BODY_SIZE", "10240"))
@@ -23,8 +28,16 @@ def main(options):
         # Ref: https://github.com/spec-first/connexion/blob/main/docs/cookbook.rst#cors-support
         # Enables CORS on all domains/routes/methods per https://flask-cors.readthedocs.io/en/latest/#usage
         CORS(app.app)
+        # Event stream is served natively by Tornado as it can't be
+        # held open by the synchronous WSGI container
+        application = tornado.web.Application([
+            (r"/pipelines/events", InstanceEventsHandler),
+            (r".*", tornado.web.FallbackHandler,
+             dict(fallback=tornado.wsgi.WSGIContainer(app.app)))])
         logger.info("Starting Tornado Server on port: %s", options.port)
-        app.run(port=options.port, server='tornado', max_body_size=MAX_BODY_SIZE)
+        http_server = tornado.httpserver.HTTPServer(application, max_body_size=MAX_BODY_SIZE)
+        http_server.listen(options.port)
+        tornado.ioloop.IOLoop.current().start()
     except (KeyboardInterrupt, SystemExit):
         logger.info("Keyboard Interrupt or System Exit")
     except Exception as error:
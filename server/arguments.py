@@ -27,6 +27,75 @@ def parse_options(args=None):
     parser.add_argument("--max_running_pipelines", action="store",
                         dest="max_running_pipelines",
                         type=int, default=int(os.getenv('MAX_RUNNING_PIPELINES', '-1')))
+    parser.add_argument("--scheduler", action="store",
+                        dest="scheduler",
+                        help="Order in which queued pipeline instances are started. 'fair' "
+                        "starts higher request priority first and shares running slots "
+                        "across tags.tenant values according to --tenant-weights",
+                        choices=['fair', 'fifo'], default=os.getenv('SCHEDULER', 'fair'))
+    parser.add_argument("--tenant-weights", action="store",
+                        dest="tenant_weights",
+                        help="JSON object mapping tags.tenant values to scheduling weights",
+                        type=str, default=os.getenv('TENANT_WEIGHTS', '{}'))
+    parser.add_argument("--cpu-budget", action="store", type=float,
+                        dest="cpu_budget",
+                        help="Number of CPU cores queued pipeline instances may use. Queued "
+                        "instances are started only while the measured usage plus their "
+                        "learned cost stays within budget. Set to 0 to disable",
+                        default=float(os.getenv('CPU_BUDGET', '0')))
+    parser.add_argument("--memory-budget", action="store", type=int,
+                        dest="memory_budget",
+                        help="Memory in MB pipeline instances may use. Set to 0 to disable",
+                        default=int(os.getenv('MEMORY_BUDGET', '0')))
+    parser.add_argument("--resource-sample-interval", action="store", type=float,
+                        dest="resource_sample_interval",
+                        help="Interval in seconds for sampling process CPU and memory usage "
+                        "to learn pipeline cost when a CPU or memory budget is set",
+                        default=float(os.getenv('RESOURCE_SAMPLE_INTERVAL', '2')))
+    parser.add_argument("--max-retained-instances", action="store", type=int,
+                        dest="max_retained_instances",
+                        help="Maximum number of finished pipeline instances kept in memory. "
+                        "Older instances are evicted to the instance history. "
+                        "Set to 0 to disable",
+                        default=int(os.getenv('MAX_RETAINED_INSTANCES', '0')))
+    parser.add_argument("--retention-max-age", action="store", type=float,
+                        dest="retention_max_age",
+                        help="Seconds a finished pipeline instance is kept in memory before "
+                        "being evicted to the instance history. Set to 0 to disable",
+                        default=float(os.getenv('RETENTION_MAX_AGE', '0')))
+    parser.add_argument("--retention-state-limits", action="store",
+                        dest="retention_state_limits",
+                        help="JSON object mapping final states (COMPLETED, ERROR, ABORTED) "
+                        "to the maximum number of finished instances kept in that state",
+                        type=str, default=os.getenv('RETENTION_STATE_LIMITS', '{}'))
+    parser.add_argument("--instance-history-size", action="store", type=int,
+                        dest="instance_history_size",
+                        help="Number of evicted instance summaries kept in memory. "
+                        "Set to -1 for no limit",
+                        default=int(os.getenv('INSTANCE_HISTORY_SIZE', '10000')))
+    parser.add_argument("--instance-history-file", action="store",
+                        dest="instance_history_file",
+                        help="SQLite file storing summaries of all evicted instances",
+                        type=str, default=os.getenv('INSTANCE_HISTORY_FILE', ''))
+    parser.add_argument("--event-sample-interval", action="store", type=float,
+                        dest="event_sample_interval",
+                        help="Interval in seconds for publishing fps and latency samples of "
+                        "running instances to /pipelines/events subscribers. "
+                        "Set to 0 to disable",
+                        default=float(os.getenv('EVENT_SAMPLE_INTERVAL', '1')))
+    parser.add_argument("--latency-sample-interval", action="store", type=int,
+                        dest="latency_sample_interval",
+                        help="Measure pipeline latency on every Nth source buffer",
+                        default=int(os.getenv('LATENCY_SAMPLE_INTERVAL', '1')))
+    parser.add_argument("--inference-batch-size", action="store", type=int,
+                        dest="inference_batch_size",
+                        help="Run frames of instances sharing a model-instance-id in batches "
+                        "of N frames through one shared inference element. Set to 0 to disable",
+                        default=int(os.getenv('INFERENCE_BATCH_SIZE', '0')))
+    parser.add_argument("--inference-batch-timeout", action="store", type=float,
+                        dest="inference_batch_timeout",
+                        help="Maximum time in milliseconds to wait for a batch to be collected",
+                        default=float(os.getenv('INFERENCE_BATCH_TIMEOUT', '10')))
     parser.add_argument("--log_level", action="store",
                         dest="log_level",
                         choices=['INFO', 'DEBUG'], default=os.getenv('LOG_LEVEL', 'INFO'))
@@ -61,6 +130,11 @@ def parse_options(args=None):
                         action="store",
                         type=lambda x: bool(util.strtobool(x)),
                         default=bool(util.strtobool(os.getenv('EMIT_SOURCE_AND_DESTINATION', 'false'))))
+    parser.add_argument("--reload-interval", action="store", type=float,
+                        dest="reload_interval",
+                        help="Interval in seconds for polling pipeline and model directories "
+                        "for changes. Set to 0 to disable automatic reload",
+                        default=float(os.getenv('RELOAD_INTERVAL', '0')))
 
     if (isinstance(args, dict)):
         args = ["--{}={}".format(key, value)
@@ -69,6 +143,8 @@ def parse_options(args=None):
     try:
         result = parser.parse_args(args)
         parse_network_preference(result)
+        parse_tenant_weights(result)
+        parse_retention_state_limits(result)
     except Exception:
         print("Unrecognized argument passed to PipelineServer")
         parser.print_help()
@@ -81,3 +157,21 @@ def parse_network_preference(options):
         options.network_preference = json.loads(options.network_preference)
     except Exception:
         options.network_preference = {}
+
+
+def parse_tenant_weights(options):
+    try:
+        options.tenant_weights = json.loads(options.tenant_weights)
+        if not isinstance(options.tenant_weights, dict):
+            options.tenant_weights = {}
+    except Exception:
+        options.tenant_weights = {}
+
+
+def parse_retention_state_limits(options):
+    try:
+        limits = json.loads(options.retention_state_limits)
+        options.retention_state_limits = {str(state).upper(): int(limit)
+                                          for state, limit in limits.items()}
+    except Exception:
+        options.retention_state_limits = {}
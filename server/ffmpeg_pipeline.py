@@ -21,7 +21,9 @@ import os
 from datetime import datetime, timedelta
 
 from server.pipeline import Pipeline
+from server.instance_events import InstanceEvents
 from server.common.utils import logging
+from server.metrics import WindowedStats
 
 
 if shutil.which('ffmpeg') is None:
@@ -62,6 +64,8 @@ class FFmpegPipeline(Pipeline):
         self.request = request
         self.state = Pipeline.State.QUEUED
         self.fps = 0
+        self.frame_count = 0
+        self.stats = WindowedStats()
         self._finished_callback = finished_callback
         self._logger = logging.get_logger('FFmpegPipeline', is_static=True)
         self._fps_regex = re.compile(
@@ -91,6 +95,8 @@ class FFmpegPipeline(Pipeline):
         with self._create_delete_lock:
             if (not self.state.stopped()):
                 self.state = Pipeline.State.ABORTED
+                if self.start_time is None:
+                    InstanceEvents.publish_state(self)
         return self.status()
 
     def params(self):
@@ -130,6 +136,7 @@ class FFmpegPipeline(Pipeline):
             "start_time": self.start_time,
             "elapsed_time": elapsed_time
         }
+        status_obj.update(self.stats.status())
 
         return status_obj
 
@@ -146,6 +153,9 @@ class FFmpegPipeline(Pipeline):
 
         matched = self._fps_regex.match(next_line)
         if (matched):
+            frame_count = int(matched.group("frame_count"))
+            self.stats.add_frames(max(0, frame_count - self.frame_count))
+            self.frame_count = frame_count
             fps = float(matched.group('fps'))
 
             if (fps > 0):
@@ -153,7 +163,6 @@ class FFmpegPipeline(Pipeline):
                 return
 
             speed = float(matched.group("speed"))
-            frame_count = int(matched.group("frame_count"))
             time_value = datetime.strptime(
                 matched.group("duration"), "%H:%M:%S.%f")
             duration = timedelta(
@@ -209,6 +218,10 @@ class FFmpegPipeline(Pipeline):
 
             os.rename(self._current_recording, filename)
 
+    def child_process_id(self):
+        process = self._process
+        return process.pid if process is not None else None
+
     def _spawn(self, args):
         self._logger.debug("Launching: %s ", ' '.join(args))
         with self._create_delete_lock:
@@ -221,8 +234,10 @@ class FFmpegPipeline(Pipeline):
                                                  universal_newlines=True)
                 self.state = Pipeline.State.RUNNING
             else:
+                InstanceEvents.publish_state(self)
                 self._finished_callback()
                 return
+        InstanceEvents.publish_state(self)
 
         self._process.poll()
         while self._process.returncode is None and not self.state is Pipeline.State.ABORTED:
@@ -243,6 +258,7 @@ class FFmpegPipeline(Pipeline):
                     self.state = Pipeline.State.ERROR
             self._process = None
 
+        InstanceEvents.publish_state(self)
         self._finished_callback()
 
     def _get_filter_properties(self, _filter):
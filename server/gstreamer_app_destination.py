@@ -4,15 +4,92 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 
+import queue
 from collections import namedtuple
+from contextlib import ExitStack
 from enum import Enum, auto
+import numpy
+import gi
+gi.require_version('Gst', '1.0')
+# pylint: disable=wrong-import-position
+from gi.repository import Gst
+from gstgva.util import gst_buffer_data
 from gstgva.video_frame import VideoFrame
 from server.app_destination import AppDestination
+from server.common.utils import logging
 from server.gstreamer_pipeline import GStreamerPipeline
+# pylint: enable=wrong-import-position
 
 GvaSample = namedtuple('GvaSample', ['sample', 'video_frame'])
 GvaSample.__new__.__defaults__ = (None, None)
 
+
+class GvaMappedFrame:
+    """Sample whose buffer is mapped read-only for zero copy access.
+
+    data is a read-only memoryview of the mapped buffer and numpy()
+    returns a read-only array sharing the same memory. The VideoFrame
+    and with it the inference meta is only created when video_frame is
+    first accessed.
+
+    The buffer stays mapped, and is not returned to its pool, until
+    release() is called or the frame is used as a context manager.
+    Views of the data must not be used after release.
+
+    """
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.caps = sample.get_caps()
+        self._video_frame = None
+        self._stack = ExitStack()
+        mapped = self._stack.enter_context(gst_buffer_data(sample.get_buffer(),
+                                                           Gst.MapFlags.READ))
+        self._data = memoryview(mapped).cast('B').toreadonly()
+
+    @property
+    def data(self):
+        if self._data is None:
+            raise ValueError("GvaMappedFrame has been released")
+        return self._data
+
+    def numpy(self):
+        return numpy.frombuffer(self.data, dtype=numpy.uint8)
+
+    @property
+    def video_frame(self):
+        if (self._video_frame is None) and (self.sample is not None):
+            try:
+                self._video_frame = VideoFrame(self.sample.get_buffer(),
+                                               caps=self.caps)
+            except Exception:
+                self._video_frame = None
+        return self._video_frame
+
+    def release(self):
+        """Unmaps the buffer. Raises BufferError if arrays or views
+        created from data are still referenced."""
+        if self._data is None:
+            return
+        self._data.release()
+        self._data = None
+        self._stack.close()
+        self._video_frame = None
+        self.sample = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
 class GStreamerAppDestination(AppDestination):
 
     class Mode(Enum):
@@ -20,22 +97,42 @@ class GStreamerAppDestination(AppDestination):
         REGIONS = auto()
         TENSORS = auto()
         MESSAGES = auto()
+        MAPPED = auto()
         @classmethod
         def _missing_(cls, name):
             return cls[name.upper()]
 
+    class QueuePolicy(Enum):
+        BLOCK = auto()
+        DROP_OLDEST = auto()
+        DROP_NEWEST = auto()
+        @classmethod
+        def _missing_(cls, name):
+            return cls[name.upper().replace('-', '_')]
+
     def __init__(self, request, pipeline):
         AppDestination.__init__(self, request, pipeline)
 
         request_config = request.get("destination", {})
         dest_config = request_config.get("metadata", {})
+        self._logger = logging.get_logger('GStreamerAppDestination', is_static=True)
         self._output_queue = dest_config.get("output", None)
         if (not isinstance(pipeline, GStreamerPipeline)) or (not self._output_queue):
             raise Exception("GStreamerAppDestination requires GStreamerPipeline and output queue")
         self._mode = GStreamerAppDestination.Mode(dest_config.get("mode", "frames"))
+        self._queue_policy = GStreamerAppDestination.QueuePolicy(
+            dest_config.get("queue-policy", "block"))
+        if ((self._queue_policy != GStreamerAppDestination.QueuePolicy.BLOCK)
+                and (not getattr(self._output_queue, "maxsize", 0))):
+            raise Exception("GStreamerAppDestination queue-policy {} requires an output "
+                            "queue with maxsize".format(dest_config["queue-policy"]))
+        self.dropped_frames = 0
 
     def _create_output_item(self, sample):
 
+        if (self._mode == GStreamerAppDestination.Mode.MAPPED):
+            return GvaMappedFrame(sample)
+
         try:
             video_frame = VideoFrame(sample.get_buffer(),
                                      caps=sample.get_caps())
@@ -62,8 +159,54 @@ class GStreamerAppDestination(AppDestination):
 
         return None
 
+    @staticmethod
+    def _release(item):
+        if isinstance(item, GvaMappedFrame):
+            try:
+                item.release()
+            except BufferError:
+                pass
+
+    def _drop(self, item):
+        self.dropped_frames += 1
+        self._release(item)
+        if self.dropped_frames == 1:
+            self._logger.warning("Output queue full, dropping frames")
+
+    def _put(self, item, drop_newest):
+        # Queues are only drained by the application so put_nowait can
+        # only fail once and the oldest item is dropped to make room
+        try:
+            self._output_queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if drop_newest:
+            self._drop(item)
+            return
+        try:
+            self._drop(self._output_queue.get_nowait())
+        except queue.Empty:
+            pass
+        self._output_queue.put(item)
+
     def process_frame(self, frame):
-        self._output_queue.put(self._create_output_item(frame))
+        if (self._queue_policy == GStreamerAppDestination.QueuePolicy.BLOCK):
+            self._output_queue.put(self._create_output_item(frame))
+            return
+        if ((self._queue_policy == GStreamerAppDestination.QueuePolicy.DROP_NEWEST)
+                and (self._output_queue.full())):
+            # Avoid mapping or decoding frames that will be dropped
+            self.dropped_frames += 1
+            return
+        self._put(self._create_output_item(frame),
+                  self._queue_policy == GStreamerAppDestination.QueuePolicy.DROP_NEWEST)
 
     def finish(self):
-        self._output_queue.put(None)
+        if (self._queue_policy == GStreamerAppDestination.QueuePolicy.BLOCK):
+            self._output_queue.put(None)
+            return
+        # End of stream is never dropped
+        self._put(None, False)
+        if self.dropped_frames:
+            self._logger.info("Dropped {} frames".format(self.dropped_frames))
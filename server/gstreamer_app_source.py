@@ -4,20 +4,25 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 
+import ctypes
+import itertools
 import json
+import queue
+import time
 from collections import namedtuple
 from enum import Enum, auto
-from threading import Event, Thread
+from threading import Event, Lock, Thread
 
 import gi
+import numpy
 
 gi.require_version('Gst', '1.0')
 gi.require_version('GstApp', '1.0')
 # pylint: disable=wrong-import-position
 from gi.repository import Gst
-from gstgva.util import GVAJSONMeta
+from gstgva.util import GVAJSONMeta, gst_buffer_data
 from server.app_source import AppSource
-from server.gstreamer_app_destination import GvaSample
+from server.gstreamer_app_destination import GvaSample, GvaMappedFrame
 from server.gstreamer_pipeline import GStreamerPipeline
 # pylint: enable=wrong-import-position
 
@@ -32,6 +37,106 @@ fields = ['data',
 GvaFrameData = namedtuple('GvaFrameData', fields)
 GvaFrameData.__new__.__defaults__ = (None,) * len(fields)
 
+_libgst = ctypes.CDLL("libgstreamer-1.0.so.0")
+_GDestroyNotify = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+_libgst.gst_memory_new_wrapped.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                                           ctypes.c_size_t, ctypes.c_size_t, ctypes.c_void_p,
+                                           _GDestroyNotify]
+_libgst.gst_memory_new_wrapped.restype = ctypes.c_void_p
+_libgst.gst_buffer_append_memory.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+_libgst.gst_buffer_append_memory.restype = None
+
+# Objects wrapped by Gst.Memory, released when GStreamer frees the memory
+_wrapped_objects = {}
+_wrapped_lock = Lock()
+_wrapped_keys = itertools.count(1)
+
+
+def _release_wrapped(key):
+    with _wrapped_lock:
+        _wrapped_objects.pop(key, None)
+
+
+_release_wrapped_callback = _GDestroyNotify(_release_wrapped)
+
+
+def _as_byte_array(data):
+    """Returns a contiguous uint8 view of a buffer protocol object,
+    copying only if the object is not contiguous."""
+    if not isinstance(data, numpy.ndarray):
+        data = numpy.asarray(memoryview(data))
+    return numpy.ascontiguousarray(data).reshape(-1).view(numpy.uint8)
+
+
+def wrap_buffer(data):
+    """Returns a Gst.Buffer sharing memory with a buffer protocol object
+    such as bytes, memoryview or a NumPy array.
+
+    The object is kept alive until GStreamer releases the buffer. The
+    memory is read-only for GStreamer, elements writing to the frame
+    receive a copy, so the object must not be modified by the
+    application until then.
+
+    """
+    array = _as_byte_array(data)
+    buffer = Gst.Buffer.new()
+    if not array.nbytes:
+        return buffer
+    key = next(_wrapped_keys)
+    with _wrapped_lock:
+        _wrapped_objects[key] = array
+    memory = _libgst.gst_memory_new_wrapped(int(Gst.MemoryFlags.READONLY),
+                                            array.ctypes.data, array.nbytes, 0, array.nbytes,
+                                            key, _release_wrapped_callback)
+    if not memory:
+        _release_wrapped(key)
+        raise Exception("Failed to wrap frame data")
+    _libgst.gst_buffer_append_memory(hash(buffer), memory)
+    return buffer
+
+
+class FramePool:
+    """Copies frames into buffers reused from a Gst.BufferPool.
+
+    Use when the application reuses its frame memory. Buffers return
+    to the pool when released by the pipeline. If max_buffers is not
+    0 and all buffers are in use, buffer() waits for one to return.
+
+    """
+    MIN_BUFFERS = 2
+
+    def __init__(self, max_buffers=0):
+        self._max_buffers = max_buffers
+        self._pool = None
+        self._size = None
+
+    def _create_pool(self, size):
+        self.stop()
+        pool = Gst.BufferPool.new()
+        config = pool.get_config()
+        Gst.BufferPool.config_set_params(config, None, size, self.MIN_BUFFERS,
+                                         self._max_buffers)
+        if (not pool.set_config(config)) or (not pool.set_active(True)):
+            raise Exception("Failed to create buffer pool")
+        self._pool = pool
+        self._size = size
+
+    def buffer(self, data):
+        array = _as_byte_array(data)
+        if (not self._pool) or (array.nbytes != self._size):
+            self._create_pool(array.nbytes)
+        result, buffer = self._pool.acquire_buffer(None)
+        if result != Gst.FlowReturn.OK:
+            raise Exception("Failed to acquire buffer from pool: {}".format(result))
+        with gst_buffer_data(buffer, Gst.MapFlags.WRITE) as mapped:
+            ctypes.memmove(mapped, array.ctypes.data, array.nbytes)
+        return buffer
+
+    def stop(self):
+        if self._pool:
+            self._pool.set_active(False)
+            self._pool = None
+
 class GStreamerAppSource(AppSource, Thread):
 
     class Mode(Enum):
@@ -41,6 +146,13 @@ class GStreamerAppSource(AppSource, Thread):
         def _missing_(cls, name):
             return cls[name.upper()]
 
+    class Allocation(Enum):
+        WRAPPED = auto()
+        POOLED = auto()
+        @classmethod
+        def _missing_(cls, name):
+            return cls[name.upper()]
+
     def __init__(self, request, pipeline, *args, **kwargs):
         AppSource.__init__(self, request, pipeline)
         self._mode = GStreamerAppSource.Mode.PULL
@@ -55,6 +167,15 @@ class GStreamerAppSource(AppSource, Thread):
             raise Exception("GStreamerAppSource requires GStreamerPipeline "\
                             "appsrc element and input queue")
         self._mode = GStreamerAppSource.Mode(request_config.get("mode", "pull"))
+        self._allocation = GStreamerAppSource.Allocation(
+            request_config.get("allocation", "wrapped"))
+        self._frame_pool = None
+        if (self._allocation == GStreamerAppSource.Allocation.POOLED):
+            self._frame_pool = FramePool(request_config.get("pool-size", 0))
+
+        self._batch_size = request_config.get("batch-size", 1)
+        self._batch_timeout = request_config.get("batch-timeout", 0) / 1000
+        self._set_watermarks(request_config)
 
         if (self._mode == GStreamerAppSource.Mode.PUSH):
             Thread.__init__(self, daemon=True, *args, **kwargs)
@@ -62,14 +183,42 @@ class GStreamerAppSource(AppSource, Thread):
             self._push_frames = Event()
             self.start()
 
+    def _set_watermarks(self, request_config):
+        # appsrc emits enough-data above max-bytes or max-time and
+        # need-data once the queued data drops below min-percent of them
+        min_percent = None
+        for unit, property_name, scale in (("bytes", "max-bytes", 1),
+                                           ("time", "max-time", Gst.MSECOND)):
+            high = request_config.get("high-watermark-{}".format(unit))
+            low = request_config.get("low-watermark-{}".format(unit))
+            if (not high):
+                if (low is not None):
+                    raise Exception("low-watermark-{unit} requires "
+                                    "high-watermark-{unit}".format(unit=unit))
+                continue
+            if (not self._src.find_property(property_name)):
+                raise Exception("high-watermark-{} is not supported by appsrc".format(unit))
+            self._src.set_property(property_name, int(high * scale))
+            if (low is not None):
+                if not 0 <= low < high:
+                    raise Exception("low-watermark-{unit} must be less than "
+                                    "high-watermark-{unit}".format(unit=unit))
+                min_percent = max(min_percent or 0, int(100 * low / high))
+        if (min_percent is not None):
+            self._src.set_property("min-percent", min_percent)
+
     def _create_input_frame(self, item):
         if (isinstance(item, GvaFrameData)):
             gst_buffer = None
-            if (item.data):
-                if (not isinstance(item.data, bytes)):
-                    raise Exception("GvaFrameData must contain bytes")
-                gst_buffer = Gst.Buffer.new_allocate(None, len(item.data))
-                gst_buffer.fill(0, item.data)
+            if (item.data is not None):
+                try:
+                    if (self._frame_pool):
+                        gst_buffer = self._frame_pool.buffer(item.data)
+                    else:
+                        gst_buffer = wrap_buffer(item.data)
+                except TypeError as error:
+                    raise Exception("GvaFrameData data must support the buffer protocol") \
+                        from error
                 if (item.pts):
                     gst_buffer.pts = item.pts
                     gst_buffer.dts = item.pts
@@ -91,7 +240,7 @@ class GStreamerAppSource(AppSource, Thread):
             return item
         if isinstance(item, Gst.Buffer):
             return item
-        if isinstance(item, GvaSample):
+        if isinstance(item, (GvaSample, GvaMappedFrame)):
             return item.sample
         return None
 
@@ -107,6 +256,60 @@ class GStreamerAppSource(AppSource, Thread):
             self._src.push_sample(frame)
 
 
+    def _get_batch(self):
+        items = [self._input_queue.get()]
+        deadline = time.monotonic() + self._batch_timeout
+        while (len(items) < self._batch_size) and (items[-1]):
+            try:
+                timeout = deadline - time.monotonic()
+                if (timeout > 0):
+                    items.append(self._input_queue.get(timeout=timeout))
+                else:
+                    items.append(self._input_queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _get_batch_buffer(self, frame):
+        # Buffers can be pushed in a list if they need no caps change
+        # and are timestamped, appsrc only timestamps the first buffer
+        # of a list
+        buffer = frame
+        if isinstance(frame, Gst.Sample):
+            caps = frame.get_caps()
+            if (caps) and (not caps.is_equal(self._src.get_caps())):
+                return None
+            buffer = frame.get_buffer()
+        if (not buffer) or (buffer.pts == Gst.CLOCK_TIME_NONE):
+            return None
+        return buffer
+
+    def _push_buffer_list(self, buffer_list):
+        if (buffer_list.length() == 1):
+            self._src.push_buffer(buffer_list.get(0))
+        elif (buffer_list.length()):
+            self._src.push_buffer_list(buffer_list)
+
+    def _get_and_push_batch(self):
+        buffer_list = Gst.BufferList.new()
+        for item in self._get_batch():
+            if (not item):
+                self._push_buffer_list(buffer_list)
+                self._src.end_of_stream()
+                return
+            frame = self._create_input_frame(item)
+            buffer = self._get_batch_buffer(frame)
+            if (buffer):
+                buffer_list.add(buffer)
+                continue
+            self._push_buffer_list(buffer_list)
+            buffer_list = Gst.BufferList.new()
+            if isinstance(frame, Gst.Buffer):
+                self._src.push_buffer(frame)
+            elif isinstance(frame, Gst.Sample):
+                self._src.push_sample(frame)
+        self._push_buffer_list(buffer_list)
+
     def start_frames(self):
         if (self._mode == GStreamerAppSource.Mode.PUSH):
             self._push_frames.set()
@@ -122,9 +325,15 @@ class GStreamerAppSource(AppSource, Thread):
         self._stop = True
         if (self._mode == GStreamerAppSource.Mode.PUSH):
             self._push_frames.set()
+        if (self._frame_pool):
+            self._frame_pool.stop()
 
     def run(self):
         while (not self._stop):
             self._push_frames.wait()
-            if (not self._stop):
+            if (self._stop):
+                break
+            if (self._batch_size > 1):
+                self._get_and_push_batch()
+            else:
                 self._get_and_push()
@@ -0,0 +1,50 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from gstgva.video_frame import VideoFrame
+from server.app_destination import AppDestination
+from server.metadata_sinks import frame_metadata
+
+
+class GStreamerMetadataSinkDestination(AppDestination):
+    """Publishes the metadata of frames reaching the appsink through
+    the server's pooled metadata sinks instead of the pipeline's
+    metapublish element.
+
+    JSON messages of gvametaconvert are published as is. Binary
+    formats are encoded from the frame's regions and events.
+
+    """
+
+    def __init__(self, request, pipeline):
+        AppDestination.__init__(self, request, pipeline)
+        self._metadata_sinks = getattr(pipeline, "metadata_sinks", None)
+        if not self._metadata_sinks:
+            raise Exception("GStreamerMetadataSinkDestination requires GStreamerPipeline")
+        self._sink, self._queue = self._metadata_sinks.open(
+            request["destination"]["metadata"])
+        self._binary = self._queue.encoding != "json"
+        self._tags = request.get("tags")
+
+    def process_frame(self, frame):
+        buffer = frame.get_buffer()
+        try:
+            video_frame = VideoFrame(buffer, caps=frame.get_caps())
+            if self._binary:
+                messages = [frame_metadata(video_frame, buffer.pts, self._tags)]
+            else:
+                messages = video_frame.messages()
+        except Exception:
+            return
+        for message in messages:
+            if message is not None:
+                self._sink.put(self._queue, message)
+
+    def status(self):
+        return self._queue.status()
+
+    def finish(self):
+        self._metadata_sinks.close(self._sink, self._queue)
@@ -19,9 +19,17 @@ from gi.repository import GLib, Gst, GstApp
 from server.app_destination import AppDestination
 from server.app_source import AppSource
 from server.common.utils import logging
+from server.gstreamer_metadata_sink_destination import GStreamerMetadataSinkDestination
+from server.gstreamer_profiler import GStreamerProfiler
+from server.gstreamer_shared_inference import GStreamerBatchedElement, GStreamerInferenceExecutor
+from server.instance_events import InstanceEvents
+from server.metadata_sinks import MetadataSinks
+from server.metrics import Histogram, LatencyTracker, WindowedStats
 from server.pipeline import Pipeline
 from server.rtsp.gstreamer_rtsp_destination import GStreamerRtspDestination
 from server.rtsp.gstreamer_rtsp_server import GStreamerRtspServer
+from server.shared_inference import SharedInference
+from server.shm.gstreamer_shm_destination import GStreamerShmDestination
 from server.webrtc.gstreamer_webrtc_destination import GStreamerWebRTCDestination
 from server.webrtc.gstreamer_webrtc_manager import GStreamerWebRTCManager
 # pylint: enable=wrong-import-position
@@ -54,7 +62,9 @@ class GStreamerPipeline(Pipeline):
     _mainloop = None
     _mainloop_thread = None
     _rtsp_server = None
+    _metadata_sinks = None
     _webrtc_manager = None
+    _shared_inference = None
     CachedElement = namedtuple("CachedElement", ["element", "pipelines"])
 
     @staticmethod
@@ -82,9 +92,12 @@ class GStreamerPipeline(Pipeline):
         self.stop_time = None
         self._avg_fps = 0
         self._gst_launch_string = None
-        self.latency_times = dict()
+        self.latency_tracker = LatencyTracker(
+            getattr(options, "latency_sample_interval", 1))
         self.sum_pipeline_latency = 0
         self.count_pipeline_latency = 0
+        self.latency_histogram = Histogram()
+        self.stats = WindowedStats()
         self._real_base = None
         self._stream_base = None
         self._year_base = None
@@ -104,6 +117,12 @@ class GStreamerPipeline(Pipeline):
         self.rtsp_path = None
         self._debug_message = ""
         self._options = options
+        self._profiler = None
+        self._profile = None
+        self._metadata_destination = None
+        self._elements_to_batch = []
+        self._batched_elements = []
+        self._inference_batching = None
 
 
         if (not GStreamerPipeline._mainloop):
@@ -117,8 +136,16 @@ class GStreamerPipeline(Pipeline):
                 GStreamerPipeline._rtsp_server.start()
             if (options.enable_webrtc and not GStreamerPipeline._webrtc_manager):
                 GStreamerPipeline._webrtc_manager = GStreamerWebRTCManager(options.webrtc_signaling_server)
+            batch_size = getattr(options, "inference_batch_size", 0)
+            if (batch_size > 1 and not GStreamerPipeline._shared_inference):
+                GStreamerPipeline._shared_inference = SharedInference(
+                    batch_size, getattr(options, "inference_batch_timeout", 10) / 1000,
+                    GStreamerInferenceExecutor)
+        if (not GStreamerPipeline._metadata_sinks):
+            GStreamerPipeline._metadata_sinks = MetadataSinks()
         self.rtsp_server = GStreamerPipeline._rtsp_server
         self.webrtc_manager = GStreamerPipeline._webrtc_manager
+        self.metadata_sinks = GStreamerPipeline._metadata_sinks
 
     @staticmethod
     def mainloop_quit():
@@ -131,6 +158,12 @@ class GStreamerPipeline(Pipeline):
         if (GStreamerPipeline._webrtc_manager):
             GStreamerPipeline._webrtc_manager.stop()
             GStreamerPipeline._webrtc_manager = None
+        if (GStreamerPipeline._metadata_sinks):
+            GStreamerPipeline._metadata_sinks.stop()
+            GStreamerPipeline._metadata_sinks = None
+        if (GStreamerPipeline._shared_inference):
+            GStreamerPipeline._shared_inference.stop()
+            GStreamerPipeline._shared_inference = None
         if (GStreamerPipeline._mainloop):
             GStreamerPipeline._mainloop.quit()
             GStreamerPipeline._mainloop = None
@@ -164,6 +197,14 @@ class GStreamerPipeline(Pipeline):
             if not webrtc_destination:
                 raise Exception("Unsupported Frame Destination: {}".format(frame_destination["class"]))
             self._app_destinations.append(webrtc_destination)
+        if frame_destination_type == "shm":
+            if (not self.appsink_element):
+                raise Exception("Pipeline does not support Frame Destination")
+            frame_destination["class"] = GStreamerShmDestination.__name__
+            shm_destination = AppDestination.create_app_destination(self.request, self, "frame")
+            if not shm_destination:
+                raise Exception("Unsupported Frame Destination: {}".format(frame_destination["class"]))
+            self._app_destinations.append(shm_destination)
 
     def _delete_pipeline(self, new_state):
         self._cal_avg_fps()
@@ -172,6 +213,14 @@ class GStreamerPipeline(Pipeline):
         self._logger.debug("Setting Pipeline {id}"
                            " State to {next_state}".format(id=self.identifier,
                                                            next_state=new_state.name))
+        if self._profiler:
+            self._profile = self._profiler.report()
+            self._profiler.detach()
+            self._profiler = None
+
+        # Peers no longer wait for frames of this instance
+        self._detach_batched_elements()
+
         if self.pipeline:
             bus = self.pipeline.get_bus()
             if self._bus_connection_id:
@@ -206,7 +255,14 @@ class GStreamerPipeline(Pipeline):
                     if (self != pipeline):
                         pipeline.stop()
                 del GStreamerPipeline._inference_element_cache[key]
+        else:
+            # Release references so finished instances can be evicted
+            for key in self._cached_element_keys:
+                cached_element = GStreamerPipeline._inference_element_cache.get(key)
+                if cached_element and self in cached_element.pipelines:
+                    cached_element.pipelines.remove(self)
 
+        InstanceEvents.publish_state(self)
         self._finished_callback()
 
     def _delete_pipeline_with_lock(self, new_state):
@@ -223,6 +279,7 @@ class GStreamerPipeline(Pipeline):
                     self.pipeline.get_bus().post(message)
                 else:
                     self.state = Pipeline.State.ABORTED
+                    InstanceEvents.publish_state(self)
         return self.status()
 
     def params(self):
@@ -271,9 +328,28 @@ class GStreamerPipeline(Pipeline):
         if self.count_pipeline_latency != 0:
             status_obj["avg_pipeline_latency"] = self.sum_pipeline_latency / \
                 self.count_pipeline_latency
+            status_obj["unmatched_latency_samples"] = self.latency_tracker.unmatched
+        status_obj.update(self.stats.status())
+        if self._metadata_destination:
+            status_obj["metadata_destination"] = self._metadata_destination.status()
+        inference_batching = self._get_inference_batching()
+        if inference_batching:
+            status_obj["inference_batching"] = inference_batching
 
         return status_obj
 
+    def profile(self):
+        profiler = self._profiler
+        if profiler:
+            elements = profiler.report()
+        elif self._profile is not None:
+            elements = self._profile
+        else:
+            return None
+        return {"id": self.identifier,
+                "state": self.state,
+                "elements": elements}
+
     def get_avg_fps(self):
         self._cal_avg_fps()
         return self._avg_fps
@@ -366,6 +442,32 @@ class GStreamerPipeline(Pipeline):
                     element, [])
             self._cached_element_keys.append(key)
             GStreamerPipeline._inference_element_cache[key].pipelines.append(self)
+            if GStreamerPipeline._shared_inference:
+                self._elements_to_batch.append((element, key))
+
+    # Inference elements with a model-instance-id are bridged by an
+    # appsink and appsrc to one inference element shared by all
+    # instances using the model-instance-id, which runs their frames in
+    # batches, see SharedInference
+    def _batch_inference_elements(self):
+        for element, key in self._elements_to_batch:
+            self._batched_elements.append(GStreamerBatchedElement(
+                element, key, GStreamerPipeline._shared_inference))
+        self._elements_to_batch.clear()
+
+    def _get_inference_batching(self):
+        if self._batched_elements:
+            # Elements are batched once their first frame arrives
+            statuses = [(element.key, element.status()) for element in self._batched_elements]
+            return {key: status for key, status in statuses if status} or None
+        return self._inference_batching
+
+    def _detach_batched_elements(self):
+        if self._batched_elements:
+            self._inference_batching = self._get_inference_batching()
+        for element in self._batched_elements:
+            element.detach()
+        self._batched_elements.clear()
 
     def _set_default_models(self):
         model_device_pairing = [("model", "device"),
@@ -490,7 +592,9 @@ class GStreamerPipeline(Pipeline):
                                      ["parameters", "properties"])
         self._set_section_properties(["destination", "metadata"],
                                      ["destination", "properties"])
-        if "destination" in self.request and \
+        if self._uses_metadata_sinks():
+            self._remove_metadata_elements()
+        elif "destination" in self.request and \
                 "metadata" in self.request["destination"] and \
                     "type" in self.request["destination"]["metadata"]:
             self._set_section_properties(["destination", "metadata"],
@@ -505,6 +609,35 @@ class GStreamerPipeline(Pipeline):
                                          ["source", self.request["source"]["type"], "properties"])
         self._set_section_properties([], [])
 
+    def _uses_metadata_sinks(self):
+        return MetadataSinks.uses_server_publisher(
+            self.request.get("destination", {}).get("metadata", {}))
+
+    def _remove_metadata_elements(self):
+        # Messages are published from the appsink by the server. Binary
+        # formats are encoded from the frame's regions so JSON messages
+        # of metaconvert are not needed either.
+        self._remove_element("destination", "gvametapublish")
+        if self.request["destination"]["metadata"].get("format", "json") != "json":
+            self._remove_element("metaconvert", "gvametaconvert")
+
+    def _remove_element(self, name, factory_name):
+        # Unlinks the element and links its neighbours directly
+        element = self.pipeline.get_by_name(name)
+        if (not element) or (element.get_factory().get_name() != factory_name):
+            return
+        sink_pad = element.get_static_pad("sink")
+        src_pad = element.get_static_pad("src")
+        upstream = sink_pad.get_peer() if sink_pad else None
+        downstream = src_pad.get_peer() if src_pad else None
+        if upstream:
+            upstream.unlink(sink_pad)
+        if downstream:
+            src_pad.unlink(downstream)
+        self.pipeline.remove(element)
+        if upstream and downstream and (upstream.link(downstream) != Gst.PadLinkReturn.OK):
+            raise Exception("Failed to remove {} element".format(name))
+
     def _set_auto_source(self):
         element = self.request["source"].get("element")
         capsfilter = self.request["source"].get("capsfilter", None)
@@ -546,8 +679,8 @@ class GStreamerPipeline(Pipeline):
         if src and sink:
             src_pad = src.get_static_pad("src")
             if (src_pad):
-                src_pad.add_probe(Gst.PadProbeType.BUFFER,
-                                    GStreamerPipeline.source_probe_callback, self)
+                src_pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST,
+                                  GStreamerPipeline.source_probe_callback, self)
             else:
                 src.connect(
                     "pad-added", GStreamerPipeline.source_pad_added_callback, self)
@@ -598,8 +731,12 @@ class GStreamerPipeline(Pipeline):
 
                 self._set_application_source()
                 self._set_application_destination()
+                self._batch_inference_elements()
                 self._log_launch_string()
 
+                if self.request.get("profile"):
+                    self._profiler = GStreamerProfiler(self.pipeline)
+
                 if "prepare-pads" in self.config:
                     self.config["prepare-pads"](self.pipeline)
 
@@ -664,7 +801,17 @@ class GStreamerPipeline(Pipeline):
         self._verify_and_set_frame_destinations()
 
         destination = self.request.get("destination", None)
-        if destination and "metadata" in destination and destination["metadata"]["type"] == "application":
+        if self._uses_metadata_sinks():
+            if (not self.appsink_element):
+                raise Exception("Pipeline does not support server metadata publisher")
+            destination["metadata"]["class"] = GStreamerMetadataSinkDestination.__name__
+            self._metadata_destination = AppDestination.create_app_destination(
+                self.request, self, "metadata")
+            if not self._metadata_destination:
+                raise Exception("Unsupported Metadata Destination: {}".format(
+                    destination["metadata"]["class"]))
+            self._app_destinations.append(self._metadata_destination)
+        elif destination and "metadata" in destination and destination["metadata"]["type"] == "application":
             app_destination = AppDestination.create_app_destination(
                 self.request, self, "metadata")
             if ((not app_destination) or (not self.appsink_element)
@@ -728,15 +875,19 @@ class GStreamerPipeline(Pipeline):
 
     @staticmethod
     def source_pad_added_callback(unused_element, pad, self):
-        pad.add_probe(Gst.PadProbeType.BUFFER,
+        pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST,
                       GStreamerPipeline.source_probe_callback, self)
         return Gst.FlowReturn.OK
 
     @staticmethod
     def source_probe_callback(unused_pad, info, self):
+        if (info.type & Gst.PadProbeType.BUFFER_LIST):
+            buffer_list = info.get_buffer_list()
+            for index in range(buffer_list.length()):
+                self.latency_tracker.add(buffer_list.get(index).pts)
+            return Gst.PadProbeReturn.OK
         buffer = info.get_buffer()
-        pts = buffer.pts
-        self.latency_times[pts] = time.time()
+        self.latency_tracker.add(buffer.pts)
         return Gst.PadProbeReturn.OK
 
     def source_setup_callback(self, unused_bin, src_element, unused_udata):
@@ -747,11 +898,12 @@ class GStreamerPipeline(Pipeline):
     @staticmethod
     def appsink_probe_callback(unused_pad, info, self):
         buffer = info.get_buffer()
-        pts = buffer.pts
-        source_time = self.latency_times.pop(pts, -1)
-        if source_time != -1:
-            self.sum_pipeline_latency += time.time() - source_time
+        latency = self.latency_tracker.match(buffer.pts)
+        if latency is not None:
+            self.sum_pipeline_latency += latency
             self.count_pipeline_latency += 1
+            self.latency_histogram.observe(latency)
+            self.stats.add_latency(latency)
         return Gst.PadProbeReturn.OK
 
     def on_sample_app_destination(self, sink):
@@ -768,12 +920,14 @@ class GStreamerPipeline(Pipeline):
             return Gst.FlowReturn.ERROR
 
         self.frame_count += 1
+        self.stats.add_frames()
         return Gst.FlowReturn.OK
 
     def on_sample(self, sink):
         _ = sink.emit("pull-sample")
 
         self.frame_count += 1
+        self.stats.add_frames()
         return Gst.FlowReturn.OK
 
     def bus_call(self, unused_bus, message, unused_data=None):
@@ -802,6 +956,7 @@ class GStreamerPipeline(Pipeline):
                             "Setting Pipeline {id} State to RUNNING".format(id=self.identifier))
                         self.state = Pipeline.State.RUNNING
                         self.start_time = time.time()
+                        InstanceEvents.publish_state(self)
         else:
             if self._bus_messages:
                 structure = Gst.Message.get_structure(message)
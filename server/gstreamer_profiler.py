@@ -0,0 +1,139 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+import gi
+gi.require_version('Gst', '1.0')
+# pylint: disable=wrong-import-position
+from gi.repository import Gst
+from server.metrics import LatencyTracker, WindowedStats
+# pylint: enable=wrong-import-position
+
+
+class GStreamerProfiler:
+    """Measures per element latency and throughput of a GStreamer pipeline.
+
+    Buffer probes on the sink and src pads of every element record when
+    a buffer enters and leaves the element. The difference, matched by
+    presentation timestamp, is the time spent in the element including
+    any internal queuing. Buffers leaving an element are counted for
+    its frame rate. Fill levels of queue elements are read when a
+    report is requested.
+
+    Probes are only attached when profiling is requested so pipelines
+    without profiling are unaffected.
+
+    """
+    LATENCY_CAPACITY = 256
+    TRACKER_CAPACITY = 64
+    TRACKER_MAX_AGE = 5
+    QUEUE_PROPERTIES = ("current-level-buffers", "current-level-bytes", "current-level-time",
+                        "max-size-buffers", "max-size-bytes", "max-size-time")
+
+    class ElementProfile:
+        def __init__(self, element):
+            self.element = element
+            self.name = element.get_name()
+            self.type = element.__gtype__.name
+            self.tracker = LatencyTracker(capacity=GStreamerProfiler.TRACKER_CAPACITY,
+                                          max_age=GStreamerProfiler.TRACKER_MAX_AGE)
+            self.stats = WindowedStats(GStreamerProfiler.LATENCY_CAPACITY)
+            self.buffers = 0
+            self.sum_latency = 0.0
+            self.count_latency = 0
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+        self._profiles = []
+        self._probes = []
+        self._signals = []
+        for element in pipeline.iterate_recurse():
+            self._add_element(element)
+        # Elements created while the pipeline starts, for example by decodebin
+        self._signals.append((pipeline, pipeline.connect("deep-element-added",
+                                                         self._on_element_added)))
+
+    def _add_element(self, element):
+        profile = GStreamerProfiler.ElementProfile(element)
+        self._profiles.append(profile)
+        for pad in element.iterate_pads():
+            self._add_pad(pad, profile)
+        self._signals.append((element, element.connect("pad-added", self._on_pad_added,
+                                                       profile)))
+
+    def _add_pad(self, pad, profile):
+        if pad.get_direction() == Gst.PadDirection.SINK:
+            callback = GStreamerProfiler._sink_probe_callback
+        else:
+            callback = GStreamerProfiler._src_probe_callback
+        self._probes.append((pad, pad.add_probe(
+            Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, callback, profile)))
+
+    def _on_element_added(self, unused_bin, unused_sub_bin, element):
+        self._add_element(element)
+
+    def _on_pad_added(self, unused_element, pad, profile):
+        self._add_pad(pad, profile)
+
+    @staticmethod
+    def _get_buffers(info):
+        if (info.type & Gst.PadProbeType.BUFFER_LIST):
+            buffer_list = info.get_buffer_list()
+            return [buffer_list.get(index) for index in range(buffer_list.length())]
+        buffer = info.get_buffer()
+        return [buffer] if buffer else []
+
+    @staticmethod
+    def _sink_probe_callback(unused_pad, info, profile):
+        for buffer in GStreamerProfiler._get_buffers(info):
+            profile.tracker.add(buffer.pts)
+        return Gst.PadProbeReturn.OK
+
+    @staticmethod
+    def _src_probe_callback(unused_pad, info, profile):
+        now = time.time()
+        for buffer in GStreamerProfiler._get_buffers(info):
+            profile.buffers += 1
+            profile.stats.add_frames(1, now)
+            latency = profile.tracker.match(buffer.pts, now)
+            if latency is not None:
+                profile.sum_latency += latency
+                profile.count_latency += 1
+                profile.stats.add_latency(latency, now)
+        return Gst.PadProbeReturn.OK
+
+    def _get_queue_levels(self, element):
+        properties = [spec.name for spec in element.list_properties()]
+        if not all(name in properties for name in self.QUEUE_PROPERTIES):
+            return None
+        return {name.replace('-', '_'): element.get_property(name)
+                for name in self.QUEUE_PROPERTIES}
+
+    def report(self):
+        elements = []
+        for profile in list(self._profiles):
+            result = {"name": profile.name,
+                      "type": profile.type,
+                      "buffers": profile.buffers,
+                      "avg_latency": None}
+            if profile.count_latency:
+                result["avg_latency"] = profile.sum_latency / profile.count_latency
+            result.update(profile.stats.status())
+            queue_levels = self._get_queue_levels(profile.element)
+            if queue_levels:
+                result["queue"] = queue_levels
+            elements.append(result)
+        return elements
+
+    def detach(self):
+        for pad, probe_id in self._probes:
+            pad.remove_probe(probe_id)
+        for element, handler_id in self._signals:
+            element.disconnect(handler_id)
+        self._probes.clear()
+        self._signals.clear()
+        self._profiles.clear()
+        self._pipeline = None
@@ -0,0 +1,214 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from threading import Lock
+import gi
+gi.require_version('Gst', '1.0')
+# pylint: disable=wrong-import-position
+from gi.repository import GLib, GObject, Gst
+from server.common.utils import logging
+# pylint: enable=wrong-import-position
+
+
+class GStreamerInferenceExecutor:
+    """Runs the batches of an InferenceBatcher through one inference
+    element in a pipeline of its own:
+
+        appsrc ! <inference element> ! appsink
+
+    The element is created from the factory of the first instance's
+    inference element with a copy of its properties and batch-size set
+    to the batch size. Frames leave the element in the order they enter
+    it and are returned to the batcher as they arrive at the appsink.
+
+    """
+
+    def __init__(self, element, batch_size, batcher):
+        self._batcher = batcher
+        self._logger = logging.get_logger('GStreamerInferenceExecutor', is_static=True)
+        self.pipeline = Gst.Pipeline.new("shared_inference_{}".format(batcher.key))
+        self._source = Gst.ElementFactory.make("appsrc", "source")
+        self._source.set_property("format", Gst.Format.TIME)
+        # Frames are bounded by the batcher
+        self._source.set_property("max-bytes", 0)
+        self._inference = self._copy_element(element)
+        if self._inference.find_property("batch-size"):
+            self._inference.set_property("batch-size", batch_size)
+        self._sink = Gst.ElementFactory.make("appsink", "sink")
+        self._sink.set_property("emit-signals", True)
+        self._sink.set_property("sync", False)
+        for pipeline_element in (self._source, self._inference, self._sink):
+            self.pipeline.add(pipeline_element)
+        if not (self._source.link(self._inference) and self._inference.link(self._sink)):
+            raise Exception("Failed to link shared inference element {}".format(batcher.key))
+        self._sink.connect("new-sample", self._on_sample)
+        self.pipeline.get_bus().set_sync_handler(self._on_message)
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            self.pipeline.set_state(Gst.State.NULL)
+            raise Exception("Failed to start shared inference element {}".format(batcher.key))
+        self._logger.info("Started shared inference element {} with batch-size {}".format(
+            batcher.key, batch_size))
+
+    def _copy_element(self, element):
+        copy = Gst.ElementFactory.make(element.get_factory().get_name(), "inference")
+        for prop in element.list_properties():
+            if (prop.name in ("name", "parent")
+                    or not prop.flags & GObject.ParamFlags.READABLE
+                    or not prop.flags & GObject.ParamFlags.WRITABLE
+                    or prop.flags & GObject.ParamFlags.CONSTRUCT_ONLY):
+                continue
+            try:
+                copy.set_property(prop.name, element.get_property(prop.name))
+            except Exception as error:
+                self._logger.debug("Property {} of {} not copied: {}".format(
+                    prop.name, self._batcher.key, error))
+        return copy
+
+    def submit(self, frames):
+        for sample in frames:
+            result = self._source.emit("push-sample", sample)
+            if result != Gst.FlowReturn.OK:
+                raise Exception("Failed to push frame: {}".format(result.value_nick))
+
+    def _on_sample(self, sink):
+        self._batcher.complete(sink.emit("pull-sample"))
+        return Gst.FlowReturn.OK
+
+    def _on_message(self, unused_bus, message):
+        if message.type == Gst.MessageType.ERROR:
+            error_message, debug_message = message.parse_error()
+            self._logger.error("Error on shared inference element {}: {}: {}".format(
+                self._batcher.key, error_message, debug_message))
+            self._batcher.fail("Shared inference {}: {}".format(self._batcher.key,
+                                                                error_message))
+        return Gst.BusSyncReply.DROP
+
+    def stop(self):
+        self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline.get_bus().set_sync_handler(None)
+        self._logger.info("Stopped shared inference element {}".format(self._batcher.key))
+
+
+class GStreamerBatchedElement:
+    """Bridges an inference element of a pipeline instance to the shared
+    inference element of its key with an appsink and appsrc.
+
+    The appsink takes the place of the element's upstream link and the
+    appsrc of its downstream link. Elements such as decodebin link their
+    src pads only once the stream is typed, in which case the upstream
+    side is moved to the appsink when it links. The element stays in the
+    pipeline with its state locked in NULL, so its model is never loaded
+    and delayed links made by gst_parse_launch still find it.
+
+    Frames reaching the appsink are submitted to the batcher of the
+    element's key and the caps of the first frame, so instances with
+    different video formats do not share batches. Inferred frames are
+    pushed into the appsrc, followed by end of stream once all frames of
+    the instance are inferred.
+
+    """
+
+    def __init__(self, element, key, shared_inference):
+        self.key = key
+        self._element = element
+        self._shared_inference = shared_inference
+        self._lock = Lock()
+        self._member = None
+        self._detached = False
+        self._linked_id = None
+        name = element.get_name()
+        self._sink = Gst.ElementFactory.make("appsink", "{}_batch_sink".format(name))
+        self._sink.set_property("emit-signals", True)
+        self._sink.set_property("sync", False)
+        # Frames are only returned once the shared inference element runs
+        # them, the instance must not wait for them to preroll
+        self._sink.set_property("async", False)
+        self._source = Gst.ElementFactory.make("appsrc", "{}_batch_src".format(name))
+        self._source.set_property("format", Gst.Format.TIME)
+        self._source.set_property("is-live", True)
+        self._replace(element)
+        self._sink.connect("new-sample", self._on_sample)
+        self._sink.connect("eos", self._on_eos)
+
+    def _replace(self, element):
+        parent = element.get_parent()
+        sink_pad = element.get_static_pad("sink")
+        src_pad = element.get_static_pad("src")
+        downstream = src_pad.get_peer() if src_pad else None
+        if not sink_pad or not downstream:
+            raise Exception("Inference element {} must be linked downstream to be "
+                            "batched".format(element.get_name()))
+        element.set_locked_state(True)
+        parent.add(self._sink)
+        parent.add(self._source)
+        src_pad.unlink(downstream)
+        if self._source.get_static_pad("src").link(downstream) != Gst.PadLinkReturn.OK:
+            raise Exception("Failed to link batched inference element {}".format(
+                element.get_name()))
+        upstream = sink_pad.get_peer()
+        if upstream:
+            self._link_upstream(sink_pad, upstream)
+        else:
+            self._linked_id = sink_pad.connect("linked", self._link_upstream)
+
+    def _link_upstream(self, sink_pad, upstream):
+        if self._linked_id is not None:
+            sink_pad.disconnect(self._linked_id)
+            self._linked_id = None
+        upstream.unlink(sink_pad)
+        if upstream.link(self._sink.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+            self._error("Failed to link batched inference element {}".format(
+                self._element.get_name()))
+
+    def _attach(self, caps):
+        self._member = self._shared_inference.attach(
+            self.key, self._element, self._deliver, self._end, self._error,
+            caps=caps.to_string() if caps else None)
+
+    def _on_sample(self, sink):
+        sample = sink.emit("pull-sample")
+        with self._lock:
+            if self._detached:
+                return Gst.FlowReturn.FLUSHING
+            if not self._member:
+                try:
+                    self._attach(sample.get_caps())
+                except Exception as error:
+                    self._error("Failed to start shared inference element {}: {}".format(
+                        self.key, error))
+                    return Gst.FlowReturn.ERROR
+            member = self._member
+        member.batcher.submit(member, sample)
+        return Gst.FlowReturn.OK
+
+    def _on_eos(self, unused_sink):
+        with self._lock:
+            member = self._member
+        if member:
+            member.batcher.finish(member)
+        else:
+            self._end()
+
+    def _deliver(self, sample):
+        self._source.emit("push-sample", sample)
+
+    def _end(self):
+        self._source.emit("end-of-stream")
+
+    def _error(self, message):
+        self._source.post_message(Gst.Message.new_error(self._source, GLib.GError(), message))
+
+    def status(self):
+        with self._lock:
+            member = self._member
+        return member.batcher.status() if member else None
+
+    def detach(self):
+        with self._lock:
+            self._detached = True
+            member = self._member
+        if member:
+            self._shared_inference.detach(member)
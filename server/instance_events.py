@@ -0,0 +1,88 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import itertools
+import time
+from threading import Lock
+from server.common.utils import logging
+
+# Allow non-PascalCase class name for __InstanceEvents
+#pylint: disable=invalid-name
+
+class __InstanceEvents:
+    """Publishes pipeline instance events to subscribers.
+
+    Pipelines publish a state event on every state transition and the
+    PipelineServer periodically publishes sample events with the
+    current fps and latency of running instances. Subscriber callbacks
+    are called on the publishing thread and must not block.
+
+    Events are dictionaries with the keys type, id, timestamp and,
+    for state events, state, name and version.
+
+    """
+    STATE = "state"
+    SAMPLE = "sample"
+
+    def __init__(self):
+        self._logger = logging.get_logger('InstanceEvents', is_static=True)
+        self._lock = Lock()
+        self._subscribers = {}
+        self._tokens = itertools.count()
+
+    def subscribe(self, callback, instance_ids=None, samples=False):
+        """Calls callback for events of instance_ids (all instances if
+        None). Sample events are only delivered if samples is True.
+        Returns a token for unsubscribe."""
+        token = next(self._tokens)
+        instance_ids = set(instance_ids) if instance_ids else None
+        with self._lock:
+            self._subscribers[token] = (callback, instance_ids, samples)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def has_subscribers(self, samples=False):
+        with self._lock:
+            return any(subscriber[2] for subscriber in self._subscribers.values()) \
+                if samples else bool(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, instance_ids, samples in subscribers:
+            if (instance_ids) and (event["id"] not in instance_ids):
+                continue
+            if (event["type"] == self.SAMPLE) and (not samples):
+                continue
+            try:
+                callback(event)
+            except Exception as error:
+                self._logger.error("Error in instance event subscriber: %s", error)
+
+    def publish_state(self, pipeline_instance):
+        if not self._subscribers:
+            return
+        pipeline = pipeline_instance.request["pipeline"]
+        self.publish({"type": self.STATE,
+                      "id": pipeline_instance.identifier,
+                      "state": pipeline_instance.state.name,
+                      "name": pipeline["name"],
+                      "version": pipeline["version"],
+                      "timestamp": time.time()})
+
+    def publish_sample(self, status):
+        sample = {key: status[key]
+                  for key in ("id", "avg_fps", "avg_pipeline_latency", "elapsed_time")
+                  if key in status}
+        sample["type"] = self.SAMPLE
+        sample["timestamp"] = time.time()
+        self.publish(sample)
+
+
+InstanceEvents = __InstanceEvents()
@@ -0,0 +1,89 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import json
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from server.common.utils import logging
+
+
+class InstanceHistory:
+    """Summaries of pipeline instances evicted by the PipelineManager.
+
+    A summary is a small dictionary holding the final status and the
+    parameters of an instance. The most recently evicted summaries are
+    kept in memory in least recently used order. When a history file
+    is given, every summary is also written to a SQLite database so
+    that evicted instances remain available beyond the in-memory limit
+    and across server restarts.
+
+    """
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, path=None):
+        self._logger = logging.get_logger('InstanceHistory', is_static=True)
+        self._max_size = max_size
+        self._summaries = OrderedDict()
+        self._lock = Lock()
+        self._connection = None
+        if path:
+            try:
+                self._connection = sqlite3.connect(path, check_same_thread=False)
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS instances "
+                    "(id TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+                self._connection.commit()
+            except sqlite3.Error as error:
+                self._logger.error("Failed to open instance history file %s: %s",
+                                   path, error)
+                self._connection = None
+
+    def add(self, summary):
+        instance_id = summary["status"]["id"]
+        with self._lock:
+            self._remember(instance_id, summary)
+            if self._connection:
+                try:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO instances (id, summary) VALUES (?, ?)",
+                        (instance_id, json.dumps(summary)))
+                    self._connection.commit()
+                except (sqlite3.Error, TypeError, ValueError) as error:
+                    self._logger.error("Failed to store instance %s in history: %s",
+                                       instance_id, error)
+
+    def get(self, instance_id):
+        with self._lock:
+            if instance_id in self._summaries:
+                self._summaries.move_to_end(instance_id)
+                return self._summaries[instance_id]
+            if not self._connection:
+                return None
+            try:
+                row = self._connection.execute(
+                    "SELECT summary FROM instances WHERE id = ?",
+                    (instance_id,)).fetchone()
+            except sqlite3.Error as error:
+                self._logger.error("Failed to read instance %s from history: %s",
+                                   instance_id, error)
+                return None
+            if not row:
+                return None
+            summary = json.loads(row[0])
+            self._remember(instance_id, summary)
+            return summary
+
+    def _remember(self, instance_id, summary):
+        if self._max_size == 0:
+            return
+        self._summaries[instance_id] = summary
+        self._summaries.move_to_end(instance_id)
+        while (self._max_size > 0) and (len(self._summaries) > self._max_size):
+            self._summaries.popitem(last=False)
+
+    def __contains__(self, instance_id):
+        return self.get(instance_id) is not None
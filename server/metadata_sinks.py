@@ -0,0 +1,396 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import abc
+import functools
+import gzip
+import json
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+from server.common.utils import logging
+
+
+EVENTS_KEY = '"events"'
+
+
+def _encode_json(messages):
+    return "\n".join(messages).encode()
+
+
+def _get_encoder(encoding):
+    """Returns a function encoding a batch of messages. JSON messages
+    are strings joined by newlines. Binary formats encode the dicts
+    created by frame_metadata and concatenate the encoded messages."""
+    # pylint: disable=import-outside-toplevel
+    if encoding in (None, "json"):
+        return _encode_json
+    try:
+        if encoding == "msgpack":
+            import msgpack
+            return lambda messages: b"".join(msgpack.packb(message) for message in messages)
+        if encoding == "cbor":
+            import cbor2
+            return lambda messages: b"".join(cbor2.dumps(message) for message in messages)
+    except ImportError as error:
+        raise Exception("Metadata format {} is not available: {}".format(encoding,
+                                                                        error)) from error
+    raise Exception("Unsupported metadata format {}".format(encoding))
+
+
+def _tensor_metadata(tensor):
+    return {"name": tensor.name(),
+            "label": tensor.label(),
+            "label_id": tensor.label_id(),
+            "confidence": tensor.confidence()}
+
+
+def _region_metadata(region):
+    rect = region.rect()
+    normalized = region.normalized_rect()
+    tensors = []
+    detection = None
+    for tensor in region.tensors():
+        if tensor.is_detection():
+            detection = tensor
+        else:
+            tensors.append(_tensor_metadata(tensor))
+    return {"id": region.object_id() or None,
+            "x": rect.x, "y": rect.y, "w": rect.w, "h": rect.h,
+            "roi_type": region.label(),
+            "detection": {
+                "label": region.label(),
+                "label_id": detection.label_id() if detection else None,
+                "confidence": region.confidence(),
+                "bounding_box": {"x_min": normalized.x,
+                                 "y_min": normalized.y,
+                                 "x_max": normalized.x + normalized.w,
+                                 "y_max": normalized.y + normalized.h}},
+            "tensors": tensors}
+
+
+def frame_metadata(frame, timestamp, tags=None):
+    """Returns the metadata of a gstgva VideoFrame for binary formats,
+    built from its regions instead of gvametaconvert messages.
+
+    Every message has the same fields: timestamp, resolution, objects,
+    events and tags. Objects have id (None if not tracked), x, y, w,
+    h, roi_type, detection and tensors, a list of the region's
+    classification results. Returns None for frames without objects
+    or events.
+
+    """
+    objects = [_region_metadata(region) for region in frame.regions()]
+    events = []
+    for message in frame.messages():
+        # Only events messages of gva_event_meta are parsed
+        if EVENTS_KEY in message:
+            events.extend(json.loads(message).get("events", []))
+    if (not objects) and (not events):
+        return None
+    video_info = frame.video_info()
+    return {"timestamp": timestamp,
+            "resolution": {"width": video_info.width, "height": video_info.height},
+            "objects": objects,
+            "events": events,
+            "tags": tags or {}}
+
+
+class SinkQueue:
+    """Messages of one metadata destination waiting to be sent.
+
+    Messages are sent in batches of batch_size or when the oldest
+    message has waited batch_timeout seconds. A batch is sent as one
+    payload of newline separated JSON messages or of concatenated
+    MessagePack or CBOR messages, gzip compressed if requested. When
+    more than max_size messages are waiting the oldest is dropped.
+
+    Messages are JSON strings, or dicts for binary encodings.
+
+    """
+
+    def __init__(self, topic, batch_size=1, batch_timeout=0, compression=None,
+                 max_size=1000, encoding=None):
+        self.topic = topic
+        self.encoding = encoding or "json"
+        self._encode = _get_encoder(encoding)
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.compression = compression
+        self.max_size = max_size
+        self.closed = False
+        self.dropped = 0
+        self.sent = 0
+        self._messages = deque()
+        self._times = deque()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def append(self, message, now):
+        if len(self._messages) >= self.max_size:
+            self._messages.popleft()
+            self._times.popleft()
+            self.dropped += 1
+        self._messages.append(message)
+        self._times.append(now)
+
+    def get_delay(self, now):
+        """Returns seconds until a batch is due, 0 if due now or None if
+        there is nothing to send."""
+        if not self._messages:
+            return None
+        if (len(self._messages) >= self.batch_size) or (self.closed):
+            return 0
+        return max(0, self._times[0] + self.batch_timeout - now)
+
+    def take_batch(self):
+        count = min(len(self._messages), self.batch_size)
+        batch = [self._messages.popleft() for _ in range(count)]
+        for _ in range(count):
+            self._times.popleft()
+        return batch
+
+    def encode(self, batch):
+        payload = self._encode(batch)
+        if self.compression == "gzip":
+            payload = gzip.compress(payload)
+        return payload
+
+    def status(self):
+        return {"queue_depth": len(self._messages),
+                "sent": self.sent,
+                "dropped": self.dropped}
+
+
+class MetadataSink(Thread, metaclass=abc.ABCMeta):
+    """Connection to a broker endpoint shared by the metadata
+    destinations of all pipeline instances publishing to it.
+
+    A single thread sends the batches of all queues of the sink so
+    streaming threads only append messages.
+
+    """
+    RECONNECT_INTERVAL = 5
+
+    def __init__(self, host):
+        Thread.__init__(self, daemon=True)
+        self.host = host
+        self._logger = logging.get_logger(type(self).__name__, is_static=True)
+        self._condition = Condition()
+        self._queues = []
+        self._stopping = False
+        self._connected = False
+        self._connect_time = None
+        self.key = None
+
+    @abc.abstractmethod
+    def _connect(self):
+        """Connects to the broker, raises on failure"""
+
+    @abc.abstractmethod
+    def _send(self, topic, payload, done):
+        """Sends payload and calls done(sent) once it is known whether
+        it was sent, which may be after _send returns"""
+
+    @abc.abstractmethod
+    def _disconnect(self):
+        """Flushes pending messages and disconnects"""
+
+    def add_queue(self, sink_queue):
+        with self._condition:
+            self._queues.append(sink_queue)
+
+    def close_queue(self, sink_queue):
+        with self._condition:
+            sink_queue.closed = True
+            self._condition.notify()
+
+    def put(self, sink_queue, message):
+        with self._condition:
+            sink_queue.append(message, time.monotonic())
+            if len(sink_queue) >= sink_queue.batch_size:
+                self._condition.notify()
+
+    def stop(self):
+        """Stops the sink once closed queues are sent"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+
+    def _get_batches(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                batches = []
+                wait = None
+                for sink_queue in list(self._queues):
+                    delay = sink_queue.get_delay(now)
+                    if delay == 0:
+                        batches.append((sink_queue, sink_queue.take_batch()))
+                    elif delay is not None:
+                        wait = delay if wait is None else min(wait, delay)
+                    elif sink_queue.closed:
+                        self._queues.remove(sink_queue)
+                if batches:
+                    return batches
+                if (self._stopping) and (not self._queues):
+                    return None
+                self._condition.wait(wait)
+
+    def _ensure_connected(self):
+        if self._connected:
+            return True
+        now = time.monotonic()
+        if (self._connect_time is not None) and (now - self._connect_time <
+                                                 self.RECONNECT_INTERVAL):
+            return False
+        self._connect_time = now
+        try:
+            self._connect()
+            self._connected = True
+            self._logger.info("Connected to {}".format(self.host))
+        except Exception as error:
+            self._logger.warning("Failed to connect to {}: {}".format(self.host, error))
+        return self._connected
+
+    def _count(self, sink_queue, count, sent):
+        with self._condition:
+            if sent:
+                sink_queue.sent += count
+            else:
+                sink_queue.dropped += count
+
+    def run(self):
+        batches = self._get_batches()
+        while batches is not None:
+            for sink_queue, batch in batches:
+                done = functools.partial(self._count, sink_queue, len(batch))
+                if not self._ensure_connected():
+                    done(False)
+                    continue
+                try:
+                    self._send(sink_queue.topic, sink_queue.encode(batch), done)
+                except Exception as error:
+                    self._logger.warning("Failed to send to {}: {}".format(self.host, error))
+                    done(False)
+            batches = self._get_batches()
+        if self._connected:
+            try:
+                self._disconnect()
+            except Exception as error:
+                self._logger.warning("Failed to disconnect from {}: {}".format(self.host,
+                                                                             error))
+
+
+class MqttSink(MetadataSink):
+    DEFAULT_PORT = 1883
+
+    def __init__(self, host):
+        MetadataSink.__init__(self, host)
+        self._client = None
+
+    def _connect(self):
+        # pylint: disable=import-outside-toplevel
+        import paho.mqtt.client as mqtt
+        address = self.host.split(':')
+        port = int(address[1]) if len(address) == 2 else self.DEFAULT_PORT
+        self._client = mqtt.Client()
+        self._client.connect(address[0], port)
+        self._client.loop_start()
+
+    def _send(self, topic, payload, done):
+        # pylint: disable=import-outside-toplevel
+        import paho.mqtt.client as mqtt
+        done(self._client.publish(topic, payload).rc == mqtt.MQTT_ERR_SUCCESS)
+
+    def _disconnect(self):
+        self._client.disconnect()
+        self._client.loop_stop()
+
+
+class KafkaSink(MetadataSink):
+
+    def __init__(self, host):
+        MetadataSink.__init__(self, host)
+        self._producer = None
+
+    def _connect(self):
+        # pylint: disable=import-outside-toplevel
+        from kafka import KafkaProducer
+        self._producer = KafkaProducer(bootstrap_servers=self.host.split(','))
+
+    def _send(self, topic, payload, done):
+        # The result is known once the broker acknowledges the batch
+        future = self._producer.send(topic, payload)
+        future.add_callback(lambda unused_metadata: done(True))
+        future.add_errback(self._on_send_error, done)
+
+    def _on_send_error(self, done, error):
+        self._logger.warning("Failed to send to {}: {}".format(self.host, error))
+        done(False)
+
+    def _disconnect(self):
+        self._producer.flush()
+        self._producer.close()
+
+
+class MetadataSinks:
+    """Pool of metadata sinks, one per broker endpoint."""
+    SINK_TYPES = {"mqtt": MqttSink, "kafka": KafkaSink}
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sinks = {}
+        self._users = {}
+
+    @staticmethod
+    def uses_server_publisher(destination):
+        """Returns True if a metadata destination request is published
+        by the server instead of the pipeline's metapublish element"""
+        return (destination.get("type") in MetadataSinks.SINK_TYPES) and \
+            (destination.get("publisher") == "server")
+
+    def open(self, destination):
+        """Returns (sink, queue) for a metadata destination request"""
+        key = (destination["type"], destination["host"])
+        sink_queue = SinkQueue(destination["topic"],
+                               destination.get("batch-size", 1),
+                               destination.get("batch-timeout", 0) / 1000,
+                               destination.get("compression"),
+                               destination.get("max-queue-size", 1000),
+                               destination.get("format"))
+        with self._lock:
+            sink = self._sinks.get(key)
+            if not sink:
+                sink = self.SINK_TYPES[destination["type"]](destination["host"])
+                sink.key = key
+                sink.start()
+                self._sinks[key] = sink
+                self._users[key] = 0
+            self._users[key] += 1
+            sink.add_queue(sink_queue)
+        return sink, sink_queue
+
+    def close(self, sink, sink_queue):
+        """Sends remaining messages of the queue and stops the sink
+        when it has no other users"""
+        sink.close_queue(sink_queue)
+        with self._lock:
+            if self._sinks.get(sink.key) is not sink:
+                return
+            self._users[sink.key] -= 1
+            if not self._users[sink.key]:
+                del self._sinks[sink.key]
+                del self._users[sink.key]
+                sink.stop()
+
+    def stop(self):
+        with self._lock:
+            for sink in self._sinks.values():
+                sink.stop()
+            self._sinks.clear()
+            self._users.clear()
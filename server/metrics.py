@@ -0,0 +1,372 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import bisect
+import time
+from collections import Counter
+from collections import OrderedDict
+from collections import deque
+from collections import defaultdict
+from threading import Lock
+
+
+class Histogram:
+    """Histogram with fixed upper bounds in seconds.
+
+    observe() takes no lock. Each pipeline instance histogram is only
+    written by its streaming thread, readers copy the counts and may
+    see a sample in the bucket counts but not yet in the sum, which is
+    acceptable for monitoring.
+
+    """
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+    def copy(self):
+        result = Histogram(self.buckets)
+        result.merge(self)
+        return result
+
+
+class LatencyTracker:
+    """Matches buffers entering a pipeline with buffers leaving it by
+    presentation timestamp to measure end to end latency.
+
+    Only every sample_interval-th source buffer is tracked. Tracked
+    entries are kept in insertion order and evicted when there are
+    more than capacity or when older than max_age seconds, for example
+    because the buffer was dropped or its timestamp changed inside the
+    pipeline. Evicted entries are counted as unmatched.
+
+    The source and sink probes run on different streaming threads and
+    take no lock. Entries are only written by add(). match() only reads
+    them and appends matched timestamps to a deque, which add() drains
+    to remove matched entries. Both are atomic operations in CPython.
+    A buffer leaving the pipeline more than once before the next add()
+    is matched each time, and an entry matched while add() evicts it
+    may be counted as unmatched.
+
+    """
+    DEFAULT_CAPACITY = 1000
+    DEFAULT_MAX_AGE = 10
+
+    def __init__(self, sample_interval=1, capacity=DEFAULT_CAPACITY,
+                 max_age=DEFAULT_MAX_AGE):
+        self._sample_interval = max(1, sample_interval)
+        self._capacity = capacity
+        self._max_age = max_age
+        self._entries = OrderedDict()
+        self._matched = deque()
+        self._buffer_count = 0
+        self.unmatched = 0
+
+    def add(self, pts, now=None):
+        self._buffer_count += 1
+        if self._buffer_count % self._sample_interval:
+            return
+        now = now if now is not None else time.time()
+        entries = self._entries
+        while self._matched:
+            entries.pop(self._matched.popleft(), None)
+        entries.pop(pts, None)
+        entries[pts] = now
+        while entries:
+            oldest = next(iter(entries.values()))
+            if (len(entries) <= self._capacity) and (now - oldest <= self._max_age):
+                break
+            entries.popitem(last=False)
+            self.unmatched += 1
+
+    def match(self, pts, now=None):
+        """Returns latency of the buffer with pts or None if not tracked"""
+        source_time = self._entries.get(pts)
+        if source_time is None:
+            return None
+        self._matched.append(pts)
+        return (now if now is not None else time.time()) - source_time
+
+    def __len__(self):
+        return max(0, len(self._entries) - len(self._matched))
+
+
+class WindowedStats:
+    """Frame rate and latency over recent time windows in fixed memory.
+
+    Frames are counted in a ring of one second slots covering the
+    longest window. Latency samples are kept in a ring of the most
+    recent samples together with their arrival time. Like Histogram,
+    the stats are written by a single streaming thread without locks.
+
+    """
+    FPS_WINDOWS = (1, 10, 60)
+    LATENCY_WINDOW = 60
+    LATENCY_PERCENTILES = (50, 95, 99)
+    LATENCY_CAPACITY = 1024
+
+    def __init__(self, latency_capacity=LATENCY_CAPACITY):
+        slots = max(self.FPS_WINDOWS) + 1
+        self._frames = [0] * slots
+        self._seconds = [-1] * slots
+        self._first_second = None
+        self._latency_capacity = latency_capacity
+        self._latencies = [0.0] * latency_capacity
+        self._latency_times = [0.0] * latency_capacity
+        self._latency_count = 0
+
+    def add_frames(self, count=1, now=None):
+        second = int(now if now is not None else time.time())
+        index = second % len(self._frames)
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._frames[index] = 0
+        self._frames[index] += count
+        if self._first_second is None:
+            self._first_second = second
+
+    def add_latency(self, latency, now=None):
+        index = self._latency_count % self._latency_capacity
+        self._latencies[index] = latency
+        self._latency_times[index] = now if now is not None else time.time()
+        self._latency_count += 1
+
+    def fps(self, window, now=None):
+        # Only complete seconds are counted
+        second = int(now if now is not None else time.time())
+        if self._first_second is None:
+            return 0.0
+        window = min(window, second - self._first_second)
+        if window <= 0:
+            return 0.0
+        frames = sum(self._frames[index] for index in range(len(self._frames))
+                     if second - window <= self._seconds[index] < second)
+        return frames / window
+
+    def latency_percentiles(self, now=None):
+        start = (now if now is not None else time.time()) - self.LATENCY_WINDOW
+        count = min(self._latency_count, self._latency_capacity)
+        samples = sorted(self._latencies[index] for index in range(count)
+                         if self._latency_times[index] >= start)
+        if not samples:
+            return {"p{}".format(percentile): None for percentile in self.LATENCY_PERCENTILES}
+        return {"p{}".format(percentile):
+                samples[min(len(samples) - 1, (len(samples) * percentile) // 100)]
+                for percentile in self.LATENCY_PERCENTILES}
+
+    def status(self):
+        now = time.time()
+        return {"window_fps": {"{}s".format(window): self.fps(window, now)
+                               for window in self.FPS_WINDOWS},
+                "latency_percentiles": self.latency_percentiles(now)}
+
+
+class PipelineMetrics:
+    """Collects pipeline server metrics and renders them in the
+    Prometheus text exposition format.
+
+    Counters of finished instances are folded into per pipeline totals
+    so per instance series only exist while an instance is running.
+    Running instances started with profiling also export the latency
+    and queue levels of each of their elements.
+
+    """
+    PREFIX = "pipeline_server_"
+    # Profile queue levels, times are in nanoseconds
+    QUEUE_LEVELS = (("current_level_buffers", "queue_level_buffers", 1,
+                     "Buffers in a queue element"),
+                    ("current_level_bytes", "queue_level_bytes", 1,
+                     "Bytes in a queue element"),
+                    ("current_level_time", "queue_level_seconds", 1e-9,
+                     "Duration of the buffers in a queue element"),
+                    ("max_size_buffers", "queue_max_size_buffers", 1,
+                     "Maximum buffers in a queue element, 0 is unlimited"),
+                    ("max_size_bytes", "queue_max_size_bytes", 1,
+                     "Maximum bytes in a queue element, 0 is unlimited"),
+                    ("max_size_time", "queue_max_size_seconds", 1e-9,
+                     "Maximum duration of the buffers in a queue element, 0 is unlimited"))
+
+    def __init__(self):
+        self._lock = Lock()
+        self._frames = Counter()
+        self._latency = defaultdict(Histogram)
+        self._scheduler_wait = defaultdict(Histogram)
+        self._start_latency = defaultdict(Histogram)
+        self._finished = Counter()
+
+    @staticmethod
+    def get_labels(pipeline_instance):
+        pipeline = pipeline_instance.request["pipeline"]
+        return (str(pipeline["name"]), str(pipeline["version"]))
+
+    def observe_scheduler_wait(self, labels, seconds):
+        with self._lock:
+            self._scheduler_wait[labels].observe(seconds)
+
+    def observe_start_latency(self, labels, seconds):
+        with self._lock:
+            self._start_latency[labels].observe(seconds)
+
+    def instance_finished(self, pipeline_instance):
+        labels = self.get_labels(pipeline_instance)
+        latency = getattr(pipeline_instance, "latency_histogram", None)
+        with self._lock:
+            self._frames[labels] += getattr(pipeline_instance, "frame_count", 0)
+            if latency:
+                self._latency[labels].merge(latency)
+            self._finished[labels + (pipeline_instance.state.name,)] += 1
+
+    def collect(self, running_instances, queue_depth):
+        """Returns a snapshot for render(). running_instances is a list of
+        (instance_id, pipeline_instance)."""
+        instances = []
+        for instance_id, pipeline_instance in running_instances:
+            latency = getattr(pipeline_instance, "latency_histogram", None)
+            profile = getattr(pipeline_instance, "profile", None)
+            profile = profile() if profile else None
+            instances.append((self.get_labels(pipeline_instance) + (instance_id,),
+                              getattr(pipeline_instance, "frame_count", 0),
+                              latency.copy() if latency else None,
+                              profile["elements"] if profile else []))
+        with self._lock:
+            frames = Counter(self._frames)
+            latency = {labels: histogram.copy() for labels, histogram in self._latency.items()}
+            return {"instances": instances,
+                    "frames": frames,
+                    "latency": latency,
+                    "scheduler_wait": {labels: histogram.copy() for labels, histogram
+                                       in self._scheduler_wait.items()},
+                    "start_latency": {labels: histogram.copy() for labels, histogram
+                                      in self._start_latency.items()},
+                    "finished": Counter(self._finished),
+                    "queue_depth": queue_depth,
+                    "running": len(running_instances)}
+
+    @staticmethod
+    def _format_labels(names, values):
+        escaped = [str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                   for value in values]
+        return ",".join('{}="{}"'.format(name, value) for name, value in zip(names, escaped))
+
+    def _add_family(self, lines, name, metric_type, description):
+        lines.append("# HELP {}{} {}".format(self.PREFIX, name, description))
+        lines.append("# TYPE {}{} {}".format(self.PREFIX, name, metric_type))
+
+    def _add_sample(self, lines, name, names, values, value):
+        labels = self._format_labels(names, values)
+        lines.append("{}{}{} {}".format(self.PREFIX, name,
+                                        "{" + labels + "}" if labels else "", value))
+
+    def _add_histogram(self, lines, name, names, values, histogram):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            self._add_sample(lines, name + "_bucket", names + ("le",), values + (le,),
+                             cumulative)
+        self._add_sample(lines, name + "_sum", names, values, histogram.sum)
+        self._add_sample(lines, name + "_count", names, values, cumulative)
+
+    def _add_elements(self, lines, instances):
+        element_labels = ("name", "version", "instance_id", "element")
+        elements = [(labels + (element["name"],), element)
+                    for labels, _, _, profile in instances for element in profile]
+        self._add_family(lines, "element_frames_total", "counter",
+                         "Buffers pushed by an element of a profiled pipeline instance")
+        for labels, element in elements:
+            self._add_sample(lines, "element_frames_total", element_labels, labels,
+                             element["buffers"])
+        self._add_family(lines, "element_avg_latency_seconds", "gauge",
+                         "Average time buffers spent in an element of a profiled "
+                         "pipeline instance")
+        for labels, element in elements:
+            if element["avg_latency"] is not None:
+                self._add_sample(lines, "element_avg_latency_seconds", element_labels, labels,
+                                 element["avg_latency"])
+        self._add_family(lines, "element_latency_seconds", "gauge",
+                         "Percentiles of the time buffers spent in an element of a profiled "
+                         "pipeline instance over the last {} seconds".format(
+                             WindowedStats.LATENCY_WINDOW))
+        for labels, element in elements:
+            for percentile in WindowedStats.LATENCY_PERCENTILES:
+                value = element["latency_percentiles"]["p{}".format(percentile)]
+                if value is not None:
+                    self._add_sample(lines, "element_latency_seconds",
+                                     element_labels + ("quantile",),
+                                     labels + (repr(percentile / 100),), value)
+        for key, name, scale, description in self.QUEUE_LEVELS:
+            self._add_family(lines, "element_" + name, "gauge", description)
+            for labels, element in elements:
+                if "queue" in element:
+                    self._add_sample(lines, "element_" + name, element_labels, labels,
+                                     element["queue"][key] * scale)
+
+    def render(self, snapshot):
+        pipeline_labels = ("name", "version")
+        instance_labels = ("name", "version", "instance_id")
+        lines = []
+        self._add_family(lines, "queue_depth", "gauge",
+                         "Number of queued pipeline instances")
+        self._add_sample(lines, "queue_depth", (), (), snapshot["queue_depth"])
+        self._add_family(lines, "running_instances", "gauge",
+                         "Number of started pipeline instances")
+        self._add_sample(lines, "running_instances", (), (), snapshot["running"])
+
+        frames = Counter(snapshot["frames"])
+        latency = dict(snapshot["latency"])
+        for labels, frame_count, histogram, _ in snapshot["instances"]:
+            frames[labels[:2]] += frame_count
+            if histogram:
+                total = latency.setdefault(labels[:2], Histogram(histogram.buckets))
+                total.merge(histogram)
+
+        self._add_family(lines, "instance_frames_total", "counter",
+                         "Frames processed by a running pipeline instance")
+        for labels, frame_count, _, _ in snapshot["instances"]:
+            self._add_sample(lines, "instance_frames_total", instance_labels, labels,
+                             frame_count)
+        self._add_family(lines, "instance_latency_seconds", "histogram",
+                         "End to end latency of frames of a running pipeline instance")
+        for labels, _, histogram, _ in snapshot["instances"]:
+            if histogram:
+                self._add_histogram(lines, "instance_latency_seconds", instance_labels,
+                                    labels, histogram)
+        self._add_elements(lines, snapshot["instances"])
+        self._add_family(lines, "frames_total", "counter",
+                         "Frames processed by all instances of a pipeline")
+        for labels, frame_count in sorted(frames.items()):
+            self._add_sample(lines, "frames_total", pipeline_labels, labels, frame_count)
+        self._add_family(lines, "latency_seconds", "histogram",
+                         "End to end latency of frames of all instances of a pipeline")
+        for labels, histogram in sorted(latency.items()):
+            self._add_histogram(lines, "latency_seconds", pipeline_labels, labels, histogram)
+        self._add_family(lines, "scheduler_wait_seconds", "histogram",
+                         "Time pipeline instances were queued before being started")
+        for labels, histogram in sorted(snapshot["scheduler_wait"].items()):
+            self._add_histogram(lines, "scheduler_wait_seconds", pipeline_labels, labels,
+                                histogram)
+        self._add_family(lines, "start_latency_seconds", "histogram",
+                         "Time from starting a pipeline instance until it is running")
+        for labels, histogram in sorted(snapshot["start_latency"].items()):
+            self._add_histogram(lines, "start_latency_seconds", pipeline_labels, labels,
+                                histogram)
+        self._add_family(lines, "instances_finished_total", "counter",
+                         "Pipeline instances that finished, by final state")
+        for labels, count in sorted(snapshot["finished"].items()):
+            self._add_sample(lines, "instances_finished_total",
+                             pipeline_labels + ("state",), labels, count)
+        return "\n".join(lines) + "\n"
@@ -9,6 +9,7 @@ from collections import defaultdict
 import os
 import fnmatch
 import string
+from threading import Lock
 from server.common.utils import logging
 
 
@@ -49,6 +50,8 @@ class ModelManager:
         self.network_preference = network_preference
         self.models = defaultdict(dict)
         self.model_properties = defaultdict(dict)
+        self._model_versions = {}
+        self._reload_lock = Lock()
 
         if not self.network_preference:
             self.network_preference = {'CPU': ["FP32"],
@@ -140,11 +143,7 @@ class ModelManager:
         return version
 
     def load_models(self, model_dir, network_preference):
-        #TODO: refactor
-        #pylint: disable=too-many-nested-blocks
-
         self.log_banner("Loading Models")
-        error_occurred = False
 
         self.logger.info("Loading Models from Path {path}".format(
             path=os.path.abspath(self.model_dir)))
@@ -152,71 +151,129 @@ class ModelManager:
             self.logger.warning("Models directory is symbolic link")
         if os.path.ismount(self.model_dir):
             self.logger.warning("Models directory is mount point")
-        models = defaultdict(dict)
         if (network_preference):
             for key in network_preference:
                 if (isinstance(network_preference[key], str)):
                     network_preference[key] = network_preference[key].split(
                         ',')
             self.network_preference.update(network_preference)
+        self.models = defaultdict(dict)
+        self._model_versions = {}
+        changes = self._update_models(model_dir)
+        self.log_banner("Completed Loading Models")
+        return not changes["errors"]
+
+    def reload_models(self):
+        with self._reload_lock:
+            changes = self._update_models(self.model_dir)
+        if any(changes.values()):
+            self.logger.info("Reloaded Models: {}".format(changes))
+        return changes
+
+    def _find_model_versions(self, model_dir):
+        # Signature of a model version is the list of files below
+        # the version directory together with their modification times
+        model_versions = {}
         for model_name in os.listdir(model_dir):
-            try:
-                model_path = os.path.join(model_dir, model_name)
-
-                if (not os.path.isdir(model_path)):
+            model_path = os.path.join(model_dir, model_name)
+            if (not os.path.isdir(model_path)):
+                continue
+            for version in os.listdir(model_path):
+                version_path = os.path.join(model_path, version)
+                if (not os.path.isdir(version_path)):
                     continue
-
-                for version in os.listdir(model_path):
-                    version_path = os.path.join(model_path, version)
-                    if (os.path.isdir(version_path)):
-                        version = self.convert_version(version)
-                        proc = self._get_model_property(
-                            version_path, "model-proc", "json")
-                        labels = self._get_model_property(
-                            version_path, "labels", "txt")
-                        if proc is None:
-                            self.logger.info("Model {model}/{ver} is missing Model-Proc".format(
-                                model=model_name, ver=version))
-                        networks = self._get_model_networks(
-                            version_path)
-                        if (networks):
-                            for key in networks:
-                                networks[key].update({"proc": proc,
-                                                      "labels": labels,
-                                                      "version": version,
-                                                      "type": "IntelDLDT",
-                                                      "description": model_name})
-                                self.model_properties["model-proc"][networks[key]["network"]] = proc
-                                self.model_properties["labels"][networks[key]["network"]] = labels
-
-                            models[model_name][version] = ModelsDict(model_name,
-                                                                     version,
-                                                                     {"networks": networks,
-                                                                      "proc": proc,
-                                                                      "labels" : labels,
-                                                                      "version": version,
-                                                                      "type": "IntelDLDT",
-                                                                      "description": model_name
-                                                                      })
-                            network_paths = {
-                                key: value["network"] for key, value in networks.items()}
-                            network_paths["model-proc"] = proc
-                            network_paths["labels"] = labels
-                            self.logger.info("Loading Model: {} version: {} "
-                                             "type: {} from {}".format(
-                                                 model_name, version, "IntelDLDT", network_paths))
-                        else:
-                            raise Exception("{model}/{ver} is missing Network"
-                                            .format(model=model_name, ver=version))
-
+                signature = []
+                for root, _, files in os.walk(version_path):
+                    for file in files:
+                        path = os.path.join(root, file)
+                        try:
+                            signature.append((path, os.path.getmtime(path)))
+                        except OSError:
+                            continue
+                model_versions[(model_name, version)] = (version_path, sorted(signature))
+        return model_versions
+
+    def _update_models(self, model_dir):
+        # Only model versions whose files changed since the last load
+        # are reloaded. The models dictionary is rebuilt as a copy and
+        # swapped in at the end.
+        changes = {"added": [], "updated": [], "removed": [], "errors": []}
+        model_versions = self._find_model_versions(model_dir)
+        models = defaultdict(dict, {model_name: dict(versions)
+                                    for model_name, versions in self.models.items()})
+
+        for (model_name, version) in self._model_versions:
+            if (model_name, version) not in model_versions:
+                if models[model_name].pop(self.convert_version(version), None):
+                    changes["removed"].append("{}/{}".format(model_name, version))
+
+        for (model_name, version), (version_path, signature) in model_versions.items():
+            previous = self._model_versions.get((model_name, version))
+            if (previous) and (previous[1] == signature):
+                continue
+            existed = self.convert_version(version) in models[model_name]
+            try:
+                model = self._load_model_version(model_name, version, version_path)
+                models[model_name][self.convert_version(version)] = model
+                changes["updated" if existed else "added"].append(
+                    "{}/{}".format(model_name, version))
             except Exception as error:
-                error_occurred = True
+                models[model_name].pop(self.convert_version(version), None)
+                changes["errors"].append("{}/{}".format(model_name, version))
                 self.logger.error("Error Loading Model {model_name}"
                                   " from: {model_dir}: {err}".format(
                                       err=error, model_name=model_name, model_dir=model_dir))
+
+        models = defaultdict(dict, {model_name: versions
+                                    for model_name, versions in models.items() if versions})
+        model_properties = defaultdict(dict)
+        for versions in models.values():
+            for model in versions.values():
+                for network in model["networks"].values():
+                    model_properties["model-proc"][network["network"]] = network["proc"]
+                    model_properties["labels"][network["network"]] = network["labels"]
+        self.model_properties = model_properties
         self.models = models
-        self.log_banner("Completed Loading Models")
-        return not error_occurred
+        self._model_versions = model_versions
+        return changes
+
+    def _load_model_version(self, model_name, version, version_path):
+        version = self.convert_version(version)
+        proc = self._get_model_property(
+            version_path, "model-proc", "json")
+        labels = self._get_model_property(
+            version_path, "labels", "txt")
+        if proc is None:
+            self.logger.info("Model {model}/{ver} is missing Model-Proc".format(
+                model=model_name, ver=version))
+        networks = self._get_model_networks(
+            version_path)
+        if (not networks):
+            raise Exception("{model}/{ver} is missing Network"
+                            .format(model=model_name, ver=version))
+        for key in networks:
+            networks[key].update({"proc": proc,
+                                  "labels": labels,
+                                  "version": version,
+                                  "type": "IntelDLDT",
+                                  "description": model_name})
+
+        network_paths = {
+            key: value["network"] for key, value in networks.items()}
+        network_paths["model-proc"] = proc
+        network_paths["labels"] = labels
+        self.logger.info("Loading Model: {} version: {} "
+                         "type: {} from {}".format(
+                             model_name, version, "IntelDLDT", network_paths))
+        return ModelsDict(model_name,
+                          version,
+                          {"networks": networks,
+                           "proc": proc,
+                           "labels" : labels,
+                           "version": version,
+                           "type": "IntelDLDT",
+                           "description": model_name
+                           })
 
     def log_banner(self, heading):
         banner = "="*len(heading)
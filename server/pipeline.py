@@ -28,6 +28,11 @@ class Pipeline:
     def params(self):
         pass
 
+    def child_process_id(self):
+        """Returns the process id of a child process running the
+        pipeline or None if it runs in the server process."""
+        return None
+
     @staticmethod
     def validate_config(config, request):
         pass
@@ -5,36 +5,91 @@
 '''
 
 import os
+import copy
 import json
 import string
+import math
+import time
+import itertools
 import traceback
+from functools import partial
 from threading import Lock
-from collections import deque
+from collections import Counter
+from collections import OrderedDict
 from collections import defaultdict
 import uuid
 import jsonschema
 from server.common.utils import logging
 from server.pipeline import Pipeline
+from server.pipeline_scheduler import PipelineScheduler
+from server.resource_monitor import ResourceMonitor
+from server.instance_history import InstanceHistory
+from server.instance_events import InstanceEvents
+from server.metrics import PipelineMetrics
 from server import schema
 
 class PipelineManager:
+    MAX_RUNNING_INSTANCES = "max-running-instances"
+    DURATION_SMOOTHING = 0.2
 
     def __init__(self, model_manager, pipeline_dir, max_running_pipelines,
-                 ignore_init_errors=False):
+                 ignore_init_errors=False, scheduler="fair", tenant_weights=None,
+                 cpu_budget=0, memory_budget=0, resource_sample_interval=0,
+                 retention=None, history=None):
         self.max_running_pipelines = max_running_pipelines
         self.model_manager = model_manager
         self.running_pipelines = 0
+        self._running_by_pipeline = Counter()
+        self._running_instances = {}
+        self._cpu_budget = cpu_budget
+        self._memory_budget = memory_budget
+        self._pending_cpu = 0
+        self._pending_memory = 0
+        self._avg_duration = None
         self.pipeline_types = {}
         self.pipeline_instances = {}
         self.pipeline_state = {}
+        retention = retention or {}
+        self._max_retained_instances = retention.get("max_instances", 0)
+        self._retention_max_age = retention.get("max_age", 0)
+        self._retention_state_limits = retention.get("state_limits", {})
+        # state name -> instance id -> finish time, oldest first
+        self._finished_instances = defaultdict(OrderedDict)
+        self._history = history or InstanceHistory()
+        # Secondary indexes for status queries: instance id -> creation
+        # sequence and pipeline name -> version -> instance ids
+        self._sequence = itertools.count()
+        self._instance_sequence = {}
+        self._instances_by_pipeline = defaultdict(lambda: defaultdict(set))
+        self.metrics = PipelineMetrics()
+        self._created_times = {}
+        self._dispatch_times = {}
         self.pipelines = {}
-        self.pipeline_queue = deque()
+        self._validators = {}
+        self.scheduler = PipelineScheduler.create_scheduler(scheduler, tenant_weights)
         self.pipeline_dir = pipeline_dir
         self.logger = logging.get_logger('PipelineManager', is_static=True)
         self._run_counter_lock = Lock()
+        self._reload_lock = Lock()
+        self._pipeline_files = {}
         success = self._load_pipelines()
         if (not ignore_init_errors) and (not success):
             raise Exception("Error Initializing Pipelines")
+        self.resource_monitor = ResourceMonitor(resource_sample_interval,
+                                                self._get_running_instances,
+                                                self._resources_sampled)
+        # Costs are only learned when they are used for admission
+        if (cpu_budget > 0) or (memory_budget > 0):
+            self.resource_monitor.start()
+        self._event_subscription = InstanceEvents.subscribe(self._on_instance_event)
+
+    def stop(self):
+        """Stops resource sampling and unsubscribes from instance events.
+        Instances are stopped by the caller."""
+        self.resource_monitor.stop()
+        if self._event_subscription is not None:
+            InstanceEvents.unsubscribe(self._event_subscription)
+            self._event_subscription = None
 
 
     def _import_pipeline_types(self):
@@ -69,81 +124,122 @@ class PipelineManager:
         self.pipeline_types[config['type']].validate_config(config, default_request)
 
     def _load_pipelines(self):
-        # TODO: refactor
-        # pylint: disable=too-many-branches,too-many-nested-blocks,too-many-statements
         self.log_banner("Loading Pipelines")
-        error_occurred = False
         self.pipeline_types = self._import_pipeline_types()
         self.logger.info("Loading Pipelines from Config Path {path}".format(
             path=self.pipeline_dir))
         self.warn_if_mounted()
-        pipelines = defaultdict(dict)
-        for root, subdirs, files in os.walk(self.pipeline_dir):
+        self.pipelines = {}
+        self._validators = {}
+        self._pipeline_files = {}
+        changes = self._update_pipelines()
+        self.log_banner("Completed Loading Pipelines")
+        return not changes["errors"]
+
+    def reload_pipelines(self):
+        with self._reload_lock:
+            changes = self._update_pipelines()
+        if any(changes.values()):
+            self.logger.info("Reloaded Pipelines: {}".format(changes))
+        return changes
+
+    def _find_pipeline_files(self):
+        pipeline_files = {}
+        for root, _, files in os.walk(self.pipeline_dir):
             if os.path.abspath(root) == os.path.abspath(self.pipeline_dir):
-                for subdir in subdirs:
-                    pipelines[subdir] = {}
+                continue
+            pipeline = os.path.basename(os.path.dirname(root))
+            version = os.path.basename(root)
+            for file in files:
+                path = os.path.join(root, file)
+                if path.endswith(".json"):
+                    try:
+                        pipeline_files[path] = (pipeline, version, os.path.getmtime(path))
+                    except OSError:
+                        continue
+        return pipeline_files
+
+    def _update_pipelines(self):
+        # Only files that are new, modified or removed since the last
+        # load are parsed. Updated dictionaries are built as copies and
+        # swapped in at the end so running instances, which hold their
+        # own config reference, are not affected.
+        changes = {"added": [], "updated": [], "removed": [], "errors": []}
+        pipeline_files = self._find_pipeline_files()
+        pipelines = defaultdict(dict, {pipeline: dict(versions)
+                                       for pipeline, versions in self.pipelines.items()})
+        validators = defaultdict(dict, {pipeline: dict(versions)
+                                        for pipeline, versions in self._validators.items()})
+        loaded_keys = {(pipeline, version)
+                       for pipeline, version, _ in pipeline_files.values()}
+
+        for path, (pipeline, version, _) in self._pipeline_files.items():
+            if (path not in pipeline_files) and ((pipeline, version) not in loaded_keys):
+                if pipelines[pipeline].pop(version, None):
+                    changes["removed"].append("{}/{}".format(pipeline, version))
+                validators[pipeline].pop(version, None)
+
+        for path, (pipeline, version, mtime) in pipeline_files.items():
+            previous = self._pipeline_files.get(path)
+            if (previous) and (previous[2] == mtime):
+                continue
+            existed = version in pipelines[pipeline]
+            config = self._load_pipeline_file(path, pipeline, version)
+            if config:
+                pipelines[pipeline][version] = config
+                validators[pipeline][version] = self._compile_validators(config)
+                changes["updated" if existed else "added"].append(
+                    "{}/{}".format(pipeline, version))
             else:
-                if len(files) == 0:
-                    pipeline = os.path.basename(root)
-                    pipelines[pipeline] = {}
-                    for subdir in subdirs:
-                        pipelines[pipeline][subdir] = {}
-                else:
-                    pipeline = os.path.basename(os.path.dirname(root))
-                    version = os.path.basename(root)
-                    for file in files:
-                        path = os.path.join(root, file)
-                        if path.endswith(".json"):
-                            try:
-                                with open(path, 'r') as jsonfile:
-                                    config = json.load(jsonfile)
-                                    if ('type' not in config) or ('description' not in config):
-                                        del pipelines[pipeline][version]
-                                        self.logger.error(
-                                            "Pipeline %s"
-                                            " is missing type or description", pipeline)
-                                        error_occurred = True
-                                        continue
-                                    if "template" in config:
-                                        if isinstance(config["template"], list):
-                                            config["template"] = "".join(
-                                                config["template"])
-                                    if config['type'] in self.pipeline_types:
-                                        pipelines[pipeline][version] = config
-                                        config['name'] = pipeline
-                                        config['version'] = version
-                                        # validate_config will throw warning of
-                                        # missing elements but continue execution
-                                        self._validate_config(config)
-                                        self.logger.info("Loading Pipeline: {} version: "
-                                                         "{} type: {} from {}".format(
-                                                             pipeline,
-                                                             version,
-                                                             config['type'],
-                                                             path))
-                                        self._update_defaults_from_env(pipelines[pipeline][version])
-                                    else:
-                                        del pipelines[pipeline][version]
-                                        self.logger.error("Pipeline %s with type %s not supported",
-                                                          pipeline, config['type'])
-                                        error_occurred = True
-
-                            except Exception as error:
-                                if (pipeline in pipelines) and (version in pipelines[pipeline]):
-                                    del pipelines[pipeline][version]
-                                self.logger.error(
-                                    "Failed to Load Pipeline from: {}".format(path))
-                                self.logger.error(
-                                    "Exception: {}".format(error))
-                                self.logger.error(traceback.format_exc())
-                                error_occurred = True
+                # The last valid config is kept, for example while an
+                # editor is writing the file
+                changes["errors"].append(path)
 
         # Remove pipelines with no valid versions
         pipelines = {pipeline: versions for pipeline,
                      versions in pipelines.items() if len(versions) > 0}
+        self._validators = {pipeline: validators[pipeline] for pipeline in pipelines}
         self.pipelines = pipelines
-        self.log_banner("Completed Loading Pipelines")
-        return not error_occurred
+        self._pipeline_files = pipeline_files
+        return changes
+
+    def _load_pipeline_file(self, path, pipeline, version):
+        try:
+            with open(path, 'r') as jsonfile:
+                config = json.load(jsonfile)
+            if ('type' not in config) or ('description' not in config):
+                self.logger.error(
+                    "Pipeline %s"
+                    " is missing type or description", pipeline)
+                return None
+            if "template" in config:
+                if isinstance(config["template"], list):
+                    config["template"] = "".join(
+                        config["template"])
+            if config['type'] not in self.pipeline_types:
+                self.logger.error("Pipeline %s with type %s not supported",
+                                  pipeline, config['type'])
+                return None
+            config['name'] = pipeline
+            config['version'] = version
+            # validate_config will throw warning of
+            # missing elements but continue execution
+            self._validate_config(config)
+            self.logger.info("Loading Pipeline: {} version: "
+                             "{} type: {} from {}".format(
+                                 pipeline,
+                                 version,
+                                 config['type'],
+                                 path))
+            self._update_defaults_from_env(config)
+            return config
+        except Exception as error:
+            self.logger.error(
+                "Failed to Load Pipeline from: {}".format(path))
+            self.logger.error(
+                "Exception: {}".format(error))
+            self.logger.error(traceback.format_exc())
+        return None
 
     def _update_defaults_from_env(self, config):
         config = Pipeline.get_config_section(
@@ -212,13 +308,36 @@ class PipelineManager:
             params_obj["parameters"] = self.pipelines[name][version]["parameters"]
         return params_obj
 
-    def is_input_valid(self, request, pipeline_config, section):
-        config = pipeline_config.get(section, {})
+    @staticmethod
+    def _create_validator(config):
+        return jsonschema.Draft4Validator(
+            schema=config, format_checker=jsonschema.draft4_format_checker)
+
+    @staticmethod
+    def _compile_validators(pipeline_config):
+        # Validators are compiled once per pipeline version and reused
+        # for every request. Destination validators are keyed by
+        # destination section (e.g. metadata, frame).
+        validators = {section: PipelineManager._create_validator(pipeline_config.get(section, {}))
+                      for section in ["parameters", "source", "tags"]}
+        destination_config = pipeline_config.get("destination", {})
+        validators["destination"] = {
+            section: PipelineManager._create_validator(config)
+            for section, config in destination_config.items()
+            if isinstance(config, dict)}
+        return validators
+
+    def _get_validators(self, name, version, pipeline_config):
+        validators = self._validators.get(name, {}).get(version)
+        if validators is None:
+            validators = self._compile_validators(pipeline_config)
+            self._validators.setdefault(name, {})[version] = validators
+        return validators
+
+    def is_input_valid(self, request, validator, section):
         try:
-            if (section in request):
-                input_validator = jsonschema.Draft4Validator(
-                    schema=config, format_checker=jsonschema.draft4_format_checker)
-                input_validator.validate(request.get(section, {}))
+            if (section in request) and (validator is not None):
+                validator.validate(request.get(section, {}))
                 self.logger.debug(
                     "{} Validation successful".format(section))
             return True
@@ -284,19 +403,22 @@ class PipelineManager:
         request = request_original.copy()
 
         self.set_defaults(request, pipeline_config)
+        validators = self._get_validators(name, str(version), pipeline_config)
 
-        if not self.is_input_valid(request, pipeline_config, "parameters"):
+        if not self.is_input_valid(request, validators["parameters"], "parameters"):
             return None, "Invalid Parameters"
         if "destination" in request:
             destination_section = request.get("destination")
-            destination_config = pipeline_config.get("destination", {})
+            destination_validators = validators["destination"]
             for destination in destination_section:
-                if not self.is_input_valid(destination_section, destination_config, destination) or \
+                if not self.is_input_valid(destination_section,
+                                           destination_validators.get(destination),
+                                           destination) or \
                         not isinstance(destination_section[destination], dict):
                     return None, "Invalid Destination"
-        if not self.is_input_valid(request, pipeline_config, "source"):
+        if not self.is_input_valid(request, validators["source"], "source"):
             return None, "Invalid Source"
-        if not self.is_input_valid(request, pipeline_config, "tags"):
+        if not self.is_input_valid(request, validators["tags"], "tags"):
             return None, "Invalid Tags"
 
         instance_id = uuid.uuid1().hex
@@ -309,77 +431,352 @@ class PipelineManager:
             pipeline_config,
             self.model_manager,
             request,
-            self._pipeline_finished,
+            partial(self._pipeline_finished, instance_id),
             options)
-        self.pipeline_queue.append(instance_id)
+        InstanceEvents.publish_state(self.pipeline_instances[instance_id])
+        with self._run_counter_lock:
+            self._created_times[instance_id] = time.time()
+            self._instance_sequence[instance_id] = next(self._sequence)
+            self._instances_by_pipeline[name][str(version)].add(instance_id)
+            self.scheduler.add(instance_id, request)
         self._start()
+        self._evict_instances()
         return instance_id, None
 
+    @staticmethod
+    def _get_pipeline_key(pipeline_instance):
+        pipeline = pipeline_instance.request["pipeline"]
+        return "{}/{}".format(pipeline["name"], pipeline["version"])
+
+    def _can_start(self, instance_id):
+        pipeline_instance = self.pipeline_instances[instance_id]
+        max_running_instances = pipeline_instance.config.get(self.MAX_RUNNING_INSTANCES, -1)
+        if (isinstance(max_running_instances, int)) and (max_running_instances > 0):
+            key = self._get_pipeline_key(pipeline_instance)
+            if (self._running_by_pipeline[key] >= max_running_instances):
+                return False
+        return self._within_budget(pipeline_instance)
+
+    def _within_budget(self, pipeline_instance):
+        # Admits an instance only while measured usage, plus the expected
+        # cost of instances started since the last sample and of this
+        # instance, stays within budget. Pipelines that have not run yet
+        # are admitted so their cost can be learned.
+        if (self._cpu_budget <= 0) and (self._memory_budget <= 0):
+            return True
+        if (not self.resource_monitor.enabled) or (not self._running_instances):
+            return True
+        cost = self.resource_monitor.get_cost(self._get_pipeline_key(pipeline_instance))
+        if cost is None:
+            return True
+        cpu, memory = cost
+        if (self._cpu_budget > 0) and (self.resource_monitor.cpu_utilization is not None):
+            if self.resource_monitor.cpu_utilization + self._pending_cpu + cpu > self._cpu_budget:
+                return False
+        if (self._memory_budget > 0) and (self.resource_monitor.memory_usage is not None):
+            if self.resource_monitor.memory_usage + self._pending_memory + memory > \
+                    self._memory_budget:
+                return False
+        return True
+
+    def _get_running_instances(self):
+        with self._run_counter_lock:
+            return [(self._get_pipeline_key(pipeline_instance), pipeline_instance)
+                    for pipeline_instance in self._running_instances.values()
+                    if pipeline_instance.state is Pipeline.State.RUNNING]
+
+    def _resources_sampled(self):
+        with self._run_counter_lock:
+            self._pending_cpu = 0
+            self._pending_memory = 0
+        self._start()
+
     def _get_next_pipeline_identifier(self):
         if (self.max_running_pipelines > 0):
             if (self.running_pipelines >= self.max_running_pipelines):
                 return None
 
-        try:
-            if (self.pipeline_queue):
-                return self.pipeline_queue.popleft()
-        except Exception:
-            pass
-
-        return None
+        return self.scheduler.next(self._can_start)
 
     def _start(self):
-        pipeline_identifier = self._get_next_pipeline_identifier()
-        if (pipeline_identifier):
-            pipeline_to_start = self.pipeline_instances[pipeline_identifier]
+        while True:
             with self._run_counter_lock:
+                pipeline_identifier = self._get_next_pipeline_identifier()
+                if (not pipeline_identifier):
+                    return
+                pipeline_to_start = self.pipeline_instances[pipeline_identifier]
+                key = self._get_pipeline_key(pipeline_to_start)
                 self.running_pipelines += 1
+                self._running_by_pipeline[key] += 1
+                self._running_instances[pipeline_identifier] = pipeline_to_start
+                now = time.time()
+                self.metrics.observe_scheduler_wait(
+                    PipelineMetrics.get_labels(pipeline_to_start),
+                    now - self._created_times.pop(pipeline_identifier, now))
+                self._dispatch_times[pipeline_identifier] = now
+                cost = self.resource_monitor.get_cost(key)
+                if cost:
+                    self._pending_cpu += cost[0]
+                    self._pending_memory += cost[1]
             pipeline_to_start.start()
 
-    def _pipeline_finished(self):
+    def _pipeline_finished(self, instance_id):
         with self._run_counter_lock:
             self.running_pipelines -= 1
+            pipeline_instance = self.pipeline_instances[instance_id]
+            self._running_instances.pop(instance_id, None)
+            key = self._get_pipeline_key(pipeline_instance)
+            self._running_by_pipeline[key] -= 1
+            if self._running_by_pipeline[key] <= 0:
+                del self._running_by_pipeline[key]
+            self._update_avg_duration(pipeline_instance)
+            self._dispatch_times.pop(instance_id, None)
+            self.metrics.instance_finished(pipeline_instance)
+            self._retire(instance_id, pipeline_instance)
         self._start()
+        self._evict_instances()
 
-    def get_instance_summary(self, instance_id):
-        if self.instance_exists(instance_id):
-            return self.pipeline_instances[instance_id].params()
+    def _on_instance_event(self, event):
+        if (event["type"] == InstanceEvents.STATE) and (event["state"] == "RUNNING"):
+            with self._run_counter_lock:
+                dispatch_time = self._dispatch_times.pop(event["id"], None)
+                pipeline_instance = self.pipeline_instances.get(event["id"])
+            if (dispatch_time is not None) and (pipeline_instance):
+                self.metrics.observe_start_latency(PipelineMetrics.get_labels(pipeline_instance),
+                                                   time.time() - dispatch_time)
+
+    def get_metrics(self):
+        with self._run_counter_lock:
+            running_instances = list(self._running_instances.items())
+            queue_depth = len(self.scheduler)
+        # Profiles read element properties, collected outside the lock
+        return self.metrics.render(self.metrics.collect(running_instances, queue_depth))
+
+    def _update_avg_duration(self, pipeline_instance):
+        if (pipeline_instance.start_time is None):
+            return
+        stop_time = pipeline_instance.stop_time or time.time()
+        duration = max(0, stop_time - pipeline_instance.start_time)
+        if self._avg_duration is None:
+            self._avg_duration = duration
+        else:
+            self._avg_duration += self.DURATION_SMOOTHING * (duration - self._avg_duration)
+
+    def _retire(self, instance_id, pipeline_instance):
+        self._finished_instances[pipeline_instance.state.name][instance_id] = time.time()
+
+    def _get_eviction_candidates(self):
+        evicted = []
+        now = time.time()
+        for state, finished in self._finished_instances.items():
+            limit = self._retention_state_limits.get(state)
+            while finished:
+                finish_time = next(iter(finished.values()))
+                if ((limit is None) or (len(finished) <= limit)) and \
+                        ((self._retention_max_age <= 0) or
+                         (now - finish_time <= self._retention_max_age)):
+                    break
+                evicted.append(finished.popitem(last=False)[0])
+        if self._max_retained_instances > 0:
+            retained = sum(len(finished) for finished in self._finished_instances.values())
+            for _ in range(retained - self._max_retained_instances):
+                _, oldest = min((next(iter(finished.values())), state)
+                                for state, finished in self._finished_instances.items()
+                                if finished)
+                evicted.append(self._finished_instances[oldest].popitem(last=False)[0])
+        return evicted
+
+    def _evict_instances(self):
+        # Finished instances beyond the retention limits are replaced by
+        # a summary in the instance history. The summary is stored before
+        # the instance is removed so lookups never miss it.
+        with self._run_counter_lock:
+            evicted = self._get_eviction_candidates()
+        for instance_id in evicted:
+            pipeline_instance = self.pipeline_instances[instance_id]
+            status = pipeline_instance.status()
+            status["state"] = status["state"].name
+            self._history.add({"status": status, "params": pipeline_instance.params()})
+        with self._run_counter_lock:
+            for instance_id in evicted:
+                pipeline = self.pipeline_instances.pop(instance_id).request["pipeline"]
+                del self._instance_sequence[instance_id]
+                versions = self._instances_by_pipeline[pipeline["name"]]
+                versions[str(pipeline["version"])].discard(instance_id)
+                if not versions[str(pipeline["version"])]:
+                    del versions[str(pipeline["version"])]
+                if not versions:
+                    del self._instances_by_pipeline[pipeline["name"]]
+        if evicted:
+            self.logger.debug("Evicted {} finished pipeline instances".format(len(evicted)))
+
+    def _get_instance(self, instance_id, name=None, version=None):
+        pipeline_instance = self.pipeline_instances.get(instance_id)
+        if (pipeline_instance) and \
+                self._pipeline_matches(pipeline_instance.request["pipeline"], name, version):
+            return pipeline_instance
+        return None
+
+    def _get_evicted_instance(self, instance_id, name=None, version=None):
+        summary = self._history.get(instance_id)
+        if (summary) and \
+                self._pipeline_matches(summary["params"]["request"]["pipeline"], name, version):
+            summary = copy.deepcopy(summary)
+            summary["status"]["state"] = Pipeline.State[summary["status"]["state"]]
+            return summary
         return None
 
+    @staticmethod
+    def _pipeline_matches(pipeline, name, version):
+        if name and version:
+            return name == pipeline["name"] and version == pipeline["version"]
+        return True
+
+    def _update_status(self, instance_id, status):
+        if status["state"] is Pipeline.State.RUNNING:
+            cost = self.resource_monitor.get_instance_cost(
+                self._get_pipeline_key(self.pipeline_instances[instance_id]),
+                status.get("avg_fps", 0))
+            if cost:
+                status["measured_cost"] = cost
+        with self._run_counter_lock:
+            position = self.scheduler.position(instance_id)
+        if position is None:
+            return status
+        status["queue_position"] = position
+        status["estimated_wait"] = None
+        if self._avg_duration is not None:
+            slots = self.max_running_pipelines
+            if slots <= 0:
+                slots = max(1, self.running_pipelines)
+            status["estimated_wait"] = math.ceil(position / slots) * self._avg_duration
+        return status
+
+    def get_instance_summary(self, instance_id):
+        return self.get_instance_parameters(None, None, instance_id)
+
     def get_instance_parameters(self, name, version, instance_id):
-        if self.instance_exists(instance_id, name, version):
-            return self.pipeline_instances[instance_id].params()
+        pipeline_instance = self._get_instance(instance_id, name, version)
+        if pipeline_instance:
+            return pipeline_instance.params()
+        summary = self._get_evicted_instance(instance_id, name, version)
+        if summary:
+            return summary["params"]
+        self.logger.warning("Invalid Instance ID")
         return None
 
     def get_all_instance_status(self):
+        return self.query_instance_status()[0]
+
+    def _get_query_candidates(self, states, name, version):
+        # Uses the narrowest index available. Instances that have been
+        # started may not have reported their new state yet so they are
+        # candidates for every state.
+        with self._run_counter_lock:
+            if states:
+                candidates = set(self._running_instances)
+                for state in states:
+                    if state is Pipeline.State.QUEUED:
+                        candidates.update(self.scheduler)
+                    elif state is not Pipeline.State.RUNNING:
+                        candidates.update(self._finished_instances.get(state.name, ()))
+            elif name:
+                versions = self._instances_by_pipeline.get(name, {})
+                if version:
+                    candidates = set(versions.get(str(version), ()))
+                else:
+                    candidates = set().union(*versions.values())
+            else:
+                candidates = self._instance_sequence.keys()
+            sequence = self._instance_sequence
+            return sorted(((sequence[instance_id], instance_id)
+                           for instance_id in candidates if instance_id in sequence))
+
+    @staticmethod
+    def _instance_matches(pipeline_instance, states, name, version, tags):
+        if (states) and (pipeline_instance.state not in states):
+            return False
+        pipeline = pipeline_instance.request["pipeline"]
+        if (name) and (name != pipeline["name"]):
+            return False
+        if (version) and (str(version) != str(pipeline["version"])):
+            return False
+        if tags:
+            request_tags = pipeline_instance.request.get("tags", {})
+            for key, value in tags.items():
+                if (key not in request_tags) or (str(request_tags[key]) != value):
+                    return False
+        return True
+
+    def query_instance_status(self, states=None, name=None, version=None, tags=None,
+                              limit=None, cursor=None, fields=None):
+        """Returns status of retained instances in creation order and the
+        cursor of the next page, or None if there are no more results.
+
+        states is a list of Pipeline.State, tags a dictionary of tag values
+        and fields a list of status fields to return. cursor is the value
+        returned for the previous page. Raises ValueError for an invalid
+        cursor."""
+        self._evict_instances()
+        after = int(cursor) if cursor else -1
         results = []
-        for pipeline_instance in self.pipeline_instances.values():
-            results.append(pipeline_instance.status())
-        return results
+        next_cursor = None
+        last_sequence = after
+        for sequence, instance_id in self._get_query_candidates(states, name, version):
+            if sequence <= after:
+                continue
+            pipeline_instance = self.pipeline_instances.get(instance_id)
+            if (not pipeline_instance) or \
+                    (not self._instance_matches(pipeline_instance, states, name, version, tags)):
+                continue
+            if (limit) and (len(results) >= limit):
+                next_cursor = str(last_sequence)
+                break
+            status = self._update_status(instance_id, pipeline_instance.status())
+            if fields:
+                status = {field: value for field, value in status.items()
+                          if field == "id" or field in fields}
+            results.append(status)
+            last_sequence = sequence
+        return results, next_cursor
 
     def get_instance_status(self, instance_id, name=None, version=None):
-        if self.instance_exists(instance_id, name, version):
-            status = self.pipeline_instances[instance_id].status()
-            return status
+        pipeline_instance = self._get_instance(instance_id, name, version)
+        if pipeline_instance:
+            return self._update_status(instance_id, pipeline_instance.status())
+        summary = self._get_evicted_instance(instance_id, name, version)
+        if summary:
+            return summary["status"]
+        self.logger.warning("Invalid Instance ID")
         return None
 
+    def get_instance_profile(self, instance_id):
+        pipeline_instance = self._get_instance(instance_id)
+        if (not pipeline_instance) or (not hasattr(pipeline_instance, "profile")):
+            return None
+        return pipeline_instance.profile()
+
     def stop_instance(self, instance_id, name=None, version=None):
-        if self.instance_exists(instance_id, name, version):
-            try:
-                self.pipeline_queue.remove(instance_id)
-            except Exception:
-                pass
-            return self.pipeline_instances[instance_id].stop()
-        return None
+        pipeline_instance = self._get_instance(instance_id, name, version)
+        if pipeline_instance:
+            with self._run_counter_lock:
+                queued = self.scheduler.remove(instance_id)
+            status = pipeline_instance.stop()
+            if queued:
+                # Instances stopped before starting never report finished
+                with self._run_counter_lock:
+                    self._created_times.pop(instance_id, None)
+                    self.metrics.instance_finished(pipeline_instance)
+                    self._retire(instance_id, pipeline_instance)
+                self._evict_instances()
+            return status
+        # Evicted instances have already stopped
+        return self.get_instance_status(instance_id, name, version)
 
     def instance_exists(self, instance_id, name=None, version=None):
-        if instance_id in self.pipeline_instances:
-            if name and version:
-                pipeline = self.pipeline_instances[instance_id].request["pipeline"]
-                if name == pipeline["name"] and version == pipeline["version"]:
-                    return True
-            else:
-                return True
+        if (self._get_instance(instance_id, name, version)) or \
+                (self._get_evicted_instance(instance_id, name, version)):
+            return True
         self.logger.warning("Invalid Instance ID")
         return False
 
@@ -0,0 +1,227 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import abc
+import bisect
+import itertools
+from collections import deque
+
+
+class PipelineScheduler(metaclass=abc.ABCMeta):
+    """Abstract class representing the queue of pipeline instances
+    waiting to be started.
+
+    The PipelineManager adds every new instance to the scheduler and
+    asks it for the next instance to start whenever a running slot may
+    be available. The can_start callable passed to next() returns
+    False for instances that must stay queued (for example because
+    their pipeline has reached its concurrency cap). Schedulers skip
+    those and return the next eligible instance instead.
+
+    """
+
+    @abc.abstractmethod
+    def add(self, instance_id, request):
+        """Adds a queued instance created from request."""
+
+    @abc.abstractmethod
+    def remove(self, instance_id):
+        """Removes a queued instance. Returns True if it was queued."""
+
+    @abc.abstractmethod
+    def next(self, can_start):
+        """Removes and returns the next instance to start or None."""
+
+    @abc.abstractmethod
+    def position(self, instance_id):
+        """Returns 1-based queue position of instance or None."""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Returns the number of queued instances."""
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """Iterates over the ids of queued instances."""
+
+    def __contains__(self, instance_id):
+        return self.position(instance_id) is not None
+
+    @staticmethod
+    def get_priority(request):
+        priority = request.get("priority", 0)
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            return 0
+        return priority
+
+    @staticmethod
+    def create_scheduler(name, tenant_weights=None):
+        """Factory method for creating a scheduler by name"""
+        if name == "fair":
+            return FairScheduler(tenant_weights)
+        if name == "fifo":
+            return FifoScheduler()
+        raise Exception("Unsupported scheduler: {}".format(name))
+
+
+class FifoScheduler(PipelineScheduler):
+    """Starts instances in the order they were created."""
+
+    def __init__(self):
+        self._queue = deque()
+
+    def add(self, instance_id, request):
+        self._queue.append(instance_id)
+
+    def remove(self, instance_id):
+        try:
+            self._queue.remove(instance_id)
+            return True
+        except ValueError:
+            return False
+
+    def next(self, can_start):
+        for instance_id in self._queue:
+            if can_start(instance_id):
+                self._queue.remove(instance_id)
+                return instance_id
+        return None
+
+    def position(self, instance_id):
+        try:
+            return self._queue.index(instance_id) + 1
+        except ValueError:
+            return None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __iter__(self):
+        return iter(list(self._queue))
+
+
+class FairScheduler(PipelineScheduler):
+    """Priority scheduler with weighted fair queuing across tenants.
+
+    Instances with a higher request priority always start first. Among
+    instances of equal priority, tenants (request tags.tenant) are
+    served in proportion to their weight using start-time fair
+    queuing: every instance started advances the virtual time of its
+    tenant by 1/weight, and the tenant with the lowest virtual time is
+    served next. Within a tenant, instances start in creation order.
+
+    """
+    TENANT_TAG = "tenant"
+    DEFAULT_TENANT = ""
+    MAX_INACTIVE_TENANTS = 1024
+
+    def __init__(self, tenant_weights=None):
+        self._tenant_weights = tenant_weights or {}
+        self._sequence = itertools.count()
+        # tenant -> sorted list of (-priority, sequence, instance_id)
+        self._queues = {}
+        self._entries = {}
+        self._virtual_times = {}
+        self._virtual_time = 0.0
+
+    def _get_tenant(self, request):
+        tenant = request.get("tags", {}).get(FairScheduler.TENANT_TAG,
+                                             FairScheduler.DEFAULT_TENANT)
+        return str(tenant)
+
+    def _get_weight(self, tenant):
+        try:
+            weight = float(self._tenant_weights.get(tenant, 1))
+        except (TypeError, ValueError):
+            weight = 1.0
+        return weight if weight > 0 else 1.0
+
+    def add(self, instance_id, request):
+        tenant = self._get_tenant(request)
+        entry = (-PipelineScheduler.get_priority(request), next(self._sequence), instance_id)
+        if tenant not in self._queues:
+            self._queues[tenant] = []
+            # A tenant becoming active does not get credit for time it was idle
+            self._virtual_times[tenant] = max(self._virtual_times.get(tenant, 0.0),
+                                              self._virtual_time)
+        bisect.insort(self._queues[tenant], entry)
+        self._entries[instance_id] = (tenant, entry)
+
+    def remove(self, instance_id):
+        if instance_id not in self._entries:
+            return False
+        tenant, entry = self._entries.pop(instance_id)
+        queue = self._queues[tenant]
+        queue.pop(bisect.bisect_left(queue, entry))
+        if not queue:
+            del self._queues[tenant]
+            if self._virtual_times[tenant] <= self._virtual_time:
+                del self._virtual_times[tenant]
+        return True
+
+    def next(self, can_start):
+        selected = None
+        for tenant, queue in self._queues.items():
+            for entry in queue:
+                if can_start(entry[2]):
+                    key = (entry[0], self._virtual_times[tenant], entry[1])
+                    if (selected is None) or (key < selected[0]):
+                        selected = (key, tenant, entry)
+                    break
+        if selected is None:
+            return None
+        _, tenant, entry = selected
+        self._virtual_time = self._virtual_times[tenant]
+        self._virtual_times[tenant] += 1.0 / self._get_weight(tenant)
+        self.remove(entry[2])
+        self._prune_virtual_times()
+        return entry[2]
+
+    def _prune_virtual_times(self):
+        # Tenants are user supplied tags, so the virtual time of an
+        # inactive tenant is only kept while it is ahead of the global
+        # virtual time. Once dropped the tenant restarts at the global
+        # virtual time, which is the time it would be assigned anyway.
+        # When no instances are queued the global virtual time advances
+        # to the latest tenant's, ending the busy period. At most
+        # MAX_INACTIVE_TENANTS are kept, those closest to the global
+        # virtual time are dropped first.
+        if (not self._queues) and (self._virtual_times):
+            self._virtual_time = max(self._virtual_times.values())
+        inactive = [(virtual_time, tenant) for tenant, virtual_time in self._virtual_times.items()
+                    if tenant not in self._queues]
+        if len(inactive) > self.MAX_INACTIVE_TENANTS:
+            inactive.sort()
+            dropped = inactive[:len(inactive) - (self.MAX_INACTIVE_TENANTS // 2)]
+        else:
+            dropped = [(virtual_time, tenant) for virtual_time, tenant in inactive
+                       if virtual_time <= self._virtual_time]
+        for _, tenant in dropped:
+            del self._virtual_times[tenant]
+
+    def position(self, instance_id):
+        # Approximates the service order by merging tenant queues on
+        # priority and projected virtual start time
+        if instance_id not in self._entries:
+            return None
+        tenant, entry = self._entries[instance_id]
+        target = None
+        keys = []
+        for queue_tenant, queue in self._queues.items():
+            virtual_time = self._virtual_times[queue_tenant]
+            step = 1.0 / self._get_weight(queue_tenant)
+            for index, queue_entry in enumerate(queue):
+                key = (queue_entry[0], virtual_time + (index * step), queue_entry[1])
+                keys.append(key)
+                if (queue_tenant == tenant) and (queue_entry == entry):
+                    target = key
+        return sum(1 for key in keys if key < target) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
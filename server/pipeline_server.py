@@ -4,11 +4,14 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 import os
-import time
+from threading import Event, Thread
 from collections import defaultdict
 from collections import namedtuple
 from server.arguments import parse_options
 from server.pipeline_manager import PipelineManager
+from server.instance_history import InstanceHistory
+from server.instance_events import InstanceEvents
+from server.pipeline import Pipeline
 from server.model_manager import ModelManager
 from server.common.utils import logging
 
@@ -51,16 +54,22 @@ class __PipelineServer:
             return self._pipeline_server.pipeline_manager.stop_instance(self._instance)
 
         def wait(self, timeout=None):
-            status = self.status()
-            start_time = time.time()
-            end_time = None
-            if (timeout):
-                end_time = start_time + timeout
-            while (status) and (not status.state.stopped()):
-                time.sleep(1)
+            stopped = Event()
+
+            def on_event(event):
+                if Pipeline.State[event["state"]].stopped():
+                    stopped.set()
+
+            token = InstanceEvents.subscribe(on_event, [self._instance]) \
+                if (self._instance) else None
+            try:
                 status = self.status()
-                if (end_time) and (time.time() > end_time):
-                    break
+                if (status) and (not status.state.stopped()):
+                    stopped.wait(timeout)
+                    status = self.status()
+            finally:
+                if token is not None:
+                    InstanceEvents.unsubscribe(token)
             return status
 
         def status(self):
@@ -71,9 +80,12 @@ class __PipelineServer:
                 if 'avg_pipeline_latency' not in result:
                     result['avg_pipeline_latency'] = None
 
-                if (not self._status_named_tuple):
+                # Optional fields such as queue_position come and go
+                fields = tuple(sorted(result))
+                if (not self._status_named_tuple) or \
+                        (self._status_named_tuple._fields != fields):
                     self._status_named_tuple = namedtuple(
-                        "PipelineStatus", sorted(result))
+                        "PipelineStatus", fields)
 
                 return self._status_named_tuple(**result)
 
@@ -111,6 +123,9 @@ class __PipelineServer:
         self.model_manager = None
         self.pipeline_manager = None
         self._stopped = True
+        self._reload_thread = None
+        self._sample_thread = None
+        self._stop_threads = Event()
 
     def _log_options(self):
         heading = "Options for {}".format(os.path.basename(__file__))
@@ -139,8 +154,48 @@ class __PipelineServer:
                 os.path.abspath(os.path.join(self.options.config_path,
                                              self.options.pipeline_dir)),
                 max_running_pipelines=self.options.max_running_pipelines,
-                ignore_init_errors=self.options.ignore_init_errors)
+                ignore_init_errors=self.options.ignore_init_errors,
+                scheduler=self.options.scheduler,
+                tenant_weights=self.options.tenant_weights,
+                cpu_budget=self.options.cpu_budget,
+                memory_budget=self.options.memory_budget * 1024 * 1024,
+                resource_sample_interval=self.options.resource_sample_interval,
+                retention={"max_instances": self.options.max_retained_instances,
+                           "max_age": self.options.retention_max_age,
+                           "state_limits": self.options.retention_state_limits},
+                history=InstanceHistory(self.options.instance_history_size,
+                                        self.options.instance_history_file))
             self._stopped = False
+            self._stop_threads.clear()
+            if (self.options.reload_interval > 0):
+                self._reload_thread = Thread(target=self._reload_loop, daemon=True)
+                self._reload_thread.start()
+            if (self.options.event_sample_interval > 0):
+                self._sample_thread = Thread(target=self._sample_loop, daemon=True)
+                self._sample_thread.start()
+
+    def _sample_loop(self):
+        while not self._stop_threads.wait(self.options.event_sample_interval):
+            if not InstanceEvents.has_subscribers(samples=True):
+                continue
+            try:
+                for status in self.pipeline_manager.query_instance_status(
+                        states=[Pipeline.State.RUNNING])[0]:
+                    InstanceEvents.publish_sample(status)
+            except Exception as error:
+                self._logger.error("Error publishing instance samples: %s", error)
+
+    def _reload_loop(self):
+        while not self._stop_threads.wait(self.options.reload_interval):
+            try:
+                self.reload()
+            except Exception as error:
+                self._logger.error("Error reloading pipelines and models: %s", error)
+
+    def reload(self):
+        models = self.model_manager.reload_models()
+        pipelines = self.pipeline_manager.reload_pipelines()
+        return {"models": models, "pipelines": pipelines}
 
     def __del__(self):
         try:
@@ -150,18 +205,17 @@ class __PipelineServer:
 
     def wait(self):
         for instance in self.pipeline_instances():
-            status = instance.status()
-            while (not status.state.stopped()):
-                time.sleep(1)
-                status = instance.status()
+            instance.wait()
 
     def stop(self):
 
+        self._stop_threads.set()
         for instance in self.pipeline_instances():
             if (not instance.status().state.stopped()):
                 instance.stop()
-                while (not instance.status().state.stopped()):
-                    time.sleep(1)
+                instance.wait()
+        if (self.pipeline_manager):
+            self.pipeline_manager.stop()
 
         if (self.options) and (self.options.framework == "gstreamer") and (not self._stopped):
             try:
@@ -178,7 +232,8 @@ class __PipelineServer:
                                        pipeline.config,
                                        self._logger,
                                        instance_id)
-                    for instance_id, pipeline in self.pipeline_manager.pipeline_instances.items()]
+                    for instance_id, pipeline in
+                    list(self.pipeline_manager.pipeline_instances.items())]
 
         return []
 
@@ -0,0 +1,164 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+from collections import defaultdict
+from threading import Event, Lock, Thread
+import time
+from server.common.utils import logging
+
+
+class ResourceMonitor:
+    """Measures process CPU and memory use and learns per pipeline cost.
+
+    The process is sampled from /proc at a fixed interval. Pipelines
+    share the process so their individual cost is not directly
+    observable. Instead the monitor fits, with normalized least mean
+    squares, a CPU cost per processed frame and a memory cost per
+    running instance for every pipeline version, such that the sum
+    over running instances matches the measured process usage. Costs
+    become accurate as the mix of running pipelines varies.
+
+    """
+    LEARNING_RATE = 0.5
+    FPS_SMOOTHING = 0.2
+
+    def __init__(self, interval, get_running, on_sample=None):
+        self._logger = logging.get_logger('ResourceMonitor', is_static=True)
+        self._interval = interval
+        self._get_running = get_running
+        self._on_sample = on_sample
+        self._lock = Lock()
+        self._stop = Event()
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+        self._cpu_per_frame = {}
+        self._memory_per_instance = {}
+        self._fps = {}
+        self._frame_counts = {}
+        self._base_memory = None
+        self._last_cpu_time = None
+        self._last_sample_time = None
+        self.cpu_utilization = None
+        self.memory_usage = None
+        self._thread = None
+        self.enabled = os.path.exists("/proc/self/stat")
+        if not self.enabled:
+            self._logger.warning("Resource monitoring disabled, /proc not available")
+
+    def start(self):
+        if self.enabled and self._interval > 0 and not self._thread:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.sample()
+                if self._on_sample:
+                    self._on_sample()
+            except Exception as error:
+                self._logger.error("Error sampling resource usage: %s", error)
+
+    @staticmethod
+    def _read_stat(pid="self"):
+        with open("/proc/{}/stat".format(pid), 'r') as stat_file:
+            # Fields after the parenthesized command name
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        # utime, stime and rss (fields 14, 15 and 24 of proc(5))
+        return int(fields[11]) + int(fields[12]), int(fields[21])
+
+    def _read_usage(self, running):
+        cpu_ticks, rss_pages = self._read_stat()
+        # Pipelines running as child processes (FFmpeg) are not part
+        # of the server process statistics
+        for _, pipeline in running:
+            process_id = pipeline.child_process_id()
+            if process_id is not None:
+                try:
+                    child_ticks, child_pages = self._read_stat(process_id)
+                    cpu_ticks += child_ticks
+                    rss_pages += child_pages
+                except (OSError, IndexError, ValueError):
+                    continue
+        return cpu_ticks / self._clock_ticks, rss_pages * self._page_size
+
+    def _get_frame_delta(self, instance_id, pipeline, elapsed):
+        frame_count = getattr(pipeline, "frame_count", None)
+        if frame_count is None:
+            return pipeline.status().get("avg_fps", 0) * elapsed
+        # Frame counts start at 0 when the instance starts
+        previous = self._frame_counts.get(instance_id, 0)
+        self._frame_counts[instance_id] = frame_count
+        return max(0, frame_count - previous)
+
+    def sample(self):
+        running = self._get_running()
+        now = time.time()
+        cpu_time, memory = self._read_usage(running)
+        with self._lock:
+            self.memory_usage = memory
+            if (not running) or (self._base_memory is None):
+                self._base_memory = memory if self._base_memory is None \
+                    else min(self._base_memory, memory)
+            if self._last_sample_time is None:
+                self._last_cpu_time, self._last_sample_time = cpu_time, now
+                self._frame_counts = {pipeline.identifier: pipeline.frame_count
+                                      for _, pipeline in running
+                                      if getattr(pipeline, "frame_count", None) is not None}
+                return
+            elapsed = now - self._last_sample_time
+            if elapsed <= 0:
+                return
+            self.cpu_utilization = (cpu_time - self._last_cpu_time) / elapsed
+            self._last_cpu_time, self._last_sample_time = cpu_time, now
+
+            running_ids = {pipeline.identifier for _, pipeline in running}
+            self._frame_counts = {key: value for key, value in self._frame_counts.items()
+                                  if key in running_ids}
+            frames = defaultdict(float)
+            instances = defaultdict(int)
+            for key, pipeline in running:
+                frame_delta = self._get_frame_delta(pipeline.identifier, pipeline, elapsed)
+                frames[key] += frame_delta / elapsed
+                instances[key] += 1
+            for key in instances:
+                fps = frames[key] / instances[key]
+                previous = self._fps.get(key, fps)
+                self._fps[key] = previous + self.FPS_SMOOTHING * (fps - previous)
+            self._fit(self._cpu_per_frame, frames, self.cpu_utilization)
+            self._fit(self._memory_per_instance, instances,
+                      max(0, memory - self._base_memory))
+
+    def _fit(self, costs, features, measured):
+        if not features:
+            return
+        predicted = sum(costs.get(key, 0) * value for key, value in features.items())
+        norm = sum(value * value for value in features.values())
+        if norm <= 0:
+            return
+        correction = self.LEARNING_RATE * (measured - predicted) / norm
+        for key, value in features.items():
+            costs[key] = max(0, costs.get(key, 0) + correction * value)
+
+    def get_cost(self, key):
+        """Returns expected (cpu cores, memory bytes) of an instance of
+        pipeline version key or None if the pipeline has not run yet."""
+        with self._lock:
+            if key not in self._cpu_per_frame:
+                return None
+            return (self._cpu_per_frame[key] * self._fps.get(key, 0),
+                    self._memory_per_instance.get(key, 0))
+
+    def get_instance_cost(self, key, fps):
+        with self._lock:
+            if key not in self._cpu_per_frame:
+                return None
+            return {"cpu": self._cpu_per_frame[key] * fps,
+                    "memory": self._memory_per_instance.get(key, 0)}
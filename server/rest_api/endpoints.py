@@ -6,6 +6,7 @@
 from http import HTTPStatus
 import connexion
 from server.common.utils import logging
+from server.pipeline import Pipeline
 from server.pipeline_server import PipelineServer
 
 
@@ -15,6 +16,39 @@ logger = logging.get_logger('Default Controller', is_static=True)
 bad_request_response = 'Invalid pipeline, version or instance'
 
 
+def metrics_get():  # noqa: E501
+    """metrics_get
+
+    Return pipeline server metrics in Prometheus text format # noqa: E501
+
+
+    :rtype: str
+    """
+    try:
+        logger.debug("GET on /metrics")
+        return (PipelineServer.pipeline_manager.get_metrics(), HTTPStatus.OK,
+                {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+    except Exception as error:
+        logger.error('metrics_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def pipelines_events_get(id=None, samples=None):  # noqa: E501
+    # pylint: disable=redefined-builtin,unused-argument
+    """pipelines_events_get
+
+    Stream pipeline instance events as server-sent events # noqa: E501
+
+    The stream is served by InstanceEventsHandler, which the Tornado
+    application routes ahead of the REST API. This is only reached if
+    the REST API is served without it.
+
+    :rtype: str
+    """
+    logger.debug("GET on /pipelines/events without event stream handler")
+    return ('Event stream not available', HTTPStatus.NOT_IMPLEMENTED)
+
+
 def models_get():  # noqa: E501
     """models_get
 
@@ -31,6 +65,38 @@ def models_get():  # noqa: E501
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+def models_reload_post():  # noqa: E501
+    """models_reload_post
+
+    Reload models whose files changed on disk # noqa: E501
+
+
+    :rtype: ReloadResult
+    """
+    try:
+        logger.debug("POST on /models/reload")
+        return PipelineServer.model_manager.reload_models()
+    except Exception as error:
+        logger.error('models_reload_post %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def pipelines_reload_post():  # noqa: E501
+    """pipelines_reload_post
+
+    Reload pipelines whose definitions changed on disk # noqa: E501
+
+
+    :rtype: ReloadResult
+    """
+    try:
+        logger.debug("POST on /pipelines/reload")
+        return PipelineServer.pipeline_manager.reload_pipelines()
+    except Exception as error:
+        logger.error('pipelines_reload_post %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 def pipelines_get():  # noqa: E501
     """pipelines_get
 
@@ -170,6 +236,28 @@ def pipelines_instance_id_get(instance_id):  # noqa: E501
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+def pipelines_instance_id_profile_get(instance_id):  # noqa: E501
+    """pipelines_instance_id_profile_get
+
+    Return per element profile of instance # noqa: E501
+
+    :param instance_id:
+    :type instance_id: str
+
+    :rtype: object
+    """
+    try:
+        logger.debug("GET on /pipelines/{id}/profile".format(id=instance_id))
+        result = PipelineServer.pipeline_manager.get_instance_profile(instance_id)
+        if result:
+            result['state'] = result['state'].name
+            return result
+        return ('Invalid instance or profiling not enabled', HTTPStatus.BAD_REQUEST)
+    except Exception as error:
+        logger.error('pipelines_instance_id_profile_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 def pipelines_name_version_instance_id_status_get(name, version, instance_id):  # noqa: E501
     """pipelines_name_version_instance_id_status_get
 
@@ -198,18 +286,48 @@ def pipelines_name_version_instance_id_status_get(name, version, instance_id):
         logger.error('pipelines_name_version_instance_id_status_get %s', error)
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
-def pipelines_status_get_all():  # noqa: E501
+def pipelines_status_get_all(state=None, name=None, version=None, tag=None,
+                             limit=None, cursor=None, fields=None):  # noqa: E501
     """pipelines_status_get_all
 
     Returns all instance status summary # noqa: E501
 
+    :param state:
+    :type state: List[str]
+    :param name:
+    :type name: str
+    :param version:
+    :type version: str
+    :param tag:
+    :type tag: List[str]
+    :param limit:
+    :type limit: int
+    :param cursor:
+    :type cursor: str
+    :param fields:
+    :type fields: List[str]
+
     :rtype: object
     """
     try:
         logger.debug("GET on /pipelines/status")
-        results = PipelineServer.pipeline_manager.get_all_instance_status()
+        tags = {}
+        for value in tag or []:
+            if ':' not in value:
+                return ('Invalid tag, expected key:value', HTTPStatus.BAD_REQUEST)
+            key, value = value.split(':', 1)
+            tags[key] = value
+        states = [Pipeline.State[value] for value in state] if state else None
+        try:
+            results, next_cursor = PipelineServer.pipeline_manager.query_instance_status(
+                states, name, version, tags, limit, cursor, fields)
+        except ValueError:
+            return ('Invalid cursor', HTTPStatus.BAD_REQUEST)
         for result in results:
-            result['state'] = result['state'].name
+            if 'state' in result:
+                result['state'] = result['state'].name
+        if next_cursor:
+            return results, HTTPStatus.OK, {'Next-Cursor': next_cursor}
         return results
     except Exception as error:
         logger.error('pipelines_status_get %s', error)
@@ -0,0 +1,104 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import json
+from datetime import timedelta
+from distutils import util
+import tornado.ioloop
+import tornado.iostream
+import tornado.queues
+import tornado.util
+import tornado.web
+from server.common.utils import logging
+from server.instance_events import InstanceEvents
+from server.pipeline_server import PipelineServer
+
+logger = logging.get_logger('Event Stream', is_static=True)
+
+
+class InstanceEventsHandler(tornado.web.RequestHandler):
+    """Streams pipeline instance events as server-sent events.
+
+    GET /pipelines/events?id=<instance_id>&samples=true
+
+    id may be repeated to select instances, all instances are streamed
+    otherwise. The current state of each selected instance is sent
+    first so clients do not miss transitions that happened before they
+    connected. Sample events are sent only if samples is true.
+    Connections of clients that do not keep up are closed.
+
+    """
+    KEEPALIVE_INTERVAL = 15
+    MAX_QUEUED_EVENTS = 1000
+
+    def initialize(self):
+        # pylint: disable=attribute-defined-outside-init
+        self._queue = tornado.queues.Queue(maxsize=self.MAX_QUEUED_EVENTS)
+        self._closed = False
+        self._overflow = False
+
+    def set_default_headers(self):
+        self.set_header("Access-Control-Allow-Origin", "*")
+
+    def on_connection_close(self):
+        self._closed = True
+        self._put(None)
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except tornado.queues.QueueFull:
+            self._overflow = True
+
+    def _get_snapshot(self, instance_ids):
+        events = []
+        for instance_id in instance_ids:
+            status = PipelineServer.pipeline_manager.get_instance_status(instance_id)
+            if status:
+                events.append({"type": InstanceEvents.STATE,
+                               "id": instance_id,
+                               "state": status["state"].name})
+            else:
+                events.append({"type": "unknown", "id": instance_id})
+        return events
+
+    def _write_event(self, event):
+        self.write("event: {}\ndata: {}\n\n".format(event["type"], json.dumps(event)))
+
+    async def get(self):
+        instance_ids = self.get_arguments("id")
+        try:
+            samples = bool(util.strtobool(self.get_argument("samples", "false")))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Invalid samples value")
+        logger.debug("GET on /pipelines/events")
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        io_loop = tornado.ioloop.IOLoop.current()
+        token = InstanceEvents.subscribe(
+            lambda event: io_loop.add_callback(self._put, event), instance_ids, samples)
+        try:
+            for event in self._get_snapshot(instance_ids):
+                self._write_event(event)
+            await self.flush()
+            while not self._closed:
+                try:
+                    event = await self._queue.get(
+                        timeout=timedelta(seconds=self.KEEPALIVE_INTERVAL))
+                except tornado.util.TimeoutError:
+                    self.write(": keepalive\n\n")
+                    await self.flush()
+                    continue
+                if (event is None) or (self._overflow):
+                    break
+                self._write_event(event)
+                await self.flush()
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            InstanceEvents.unsubscribe(token)
+        if self._overflow:
+            logger.warning("Closing event stream of slow client")
@@ -195,8 +195,45 @@ destination = {
                 "timeout": {
                     "type": "integer",
                     "element": "destination"
+                },
+                "publisher": {
+                    "type": "string",
+                    "enum": ["element", "server"]
+                },
+                "batch-size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "batch-timeout": {
+                    "type": "integer",
+                    "minimum": 0
+                },
+                "compression": {
+                    "type": "string",
+                    "enum": ["none", "gzip"]
+                },
+                "max-queue-size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["json", "msgpack", "cbor"]
                 }
             },
+            "anyOf": [
+                {
+                    "properties": {
+                        "format": {"enum": ["json"]}
+                    }
+                },
+                {
+                    "properties": {
+                        "publisher": {"enum": ["server"]}
+                    },
+                    "required": ["publisher"]
+                }
+            ],
             "required": [
                 "host",
                 "type",
@@ -238,8 +275,45 @@ destination = {
                         "type": "output",
                         "property": "_METAPUBLISH_KAFKA_TOPIC_"
                     }
+                },
+                "publisher": {
+                    "type": "string",
+                    "enum": ["element", "server"]
+                },
+                "batch-size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "batch-timeout": {
+                    "type": "integer",
+                    "minimum": 0
+                },
+                "compression": {
+                    "type": "string",
+                    "enum": ["none", "gzip"]
+                },
+                "max-queue-size": {
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["json", "msgpack", "cbor"]
                 }
             },
+            "anyOf": [
+                {
+                    "properties": {
+                        "format": {"enum": ["json"]}
+                    }
+                },
+                {
+                    "properties": {
+                        "publisher": {"enum": ["server"]}
+                    },
+                    "required": ["publisher"]
+                }
+            ],
             "required": [
                 "type",
                 "host",
@@ -329,12 +403,48 @@ destination = {
                 "peer-id"
             ]
         },
+        "shm": {
+            "type":"object",
+            "properties": {
+                "type": {
+                    "type":"string",
+                    "enum":["shm"]
+                },
+                "name": {
+                    "type":"string",
+                    "minLength": 1,
+                    "pattern" : "^[a-zA-Z0-9][a-zA-Z0-9_.-]*$"
+                },
+                "slots": {
+                    "type":"integer",
+                    "default":8,
+                    "minimum":1
+                },
+                "meta-size": {
+                    "type":"integer",
+                    "default":65536,
+                    "minimum":0
+                },
+                "policy": {
+                    "type":"string",
+                    "enum":["drop", "block"],
+                    "default":"drop"
+                }
+            },
+            "required": [
+                "type",
+                "name"
+            ]
+        },
         "oneOf": [
             {
                 "$ref": "#/rtsp"
             },
             {
                 "$ref": "#/webrtc"
+            },
+            {
+                "$ref": "#/shm"
             }
         ]
     },
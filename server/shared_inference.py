@@ -0,0 +1,264 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+from server.common.utils import logging
+
+
+class BatchMember:
+    """A pipeline instance feeding frames to an InferenceBatcher.
+
+    deliver(frame) is called with each inferred frame of the instance in
+    submission order, end() once after the last frame following finish()
+    and error(message) if the shared inference fails.
+
+    """
+
+    def __init__(self, batcher, deliver, end, error):
+        self.batcher = batcher
+        self.deliver = deliver
+        self.end = end
+        self.error = error
+        self.pending = 0
+        self.finished = False
+        self.ended = False
+        self.detached = False
+
+
+class InferenceBatcher:
+    """Collects frames of pipeline instances sharing an inference
+    instance into batches and runs them with one executor.
+
+    A batch is dispatched when it has batch_size frames or max_wait
+    seconds after its first frame. Partial batches are padded to
+    batch_size by repeating their last frame so the executor always
+    runs full batches, results of padding frames are discarded.
+
+    The executor runs each batch with submit(frames) and returns every
+    inferred frame, padding included, in submission order by calling
+    complete(frame), which routes it back to the instance that submitted
+    it. At most max_pending frames are queued or being inferred, submit()
+    blocks the calling streaming thread until there is room.
+
+    """
+
+    def __init__(self, key, batch_size, max_wait, max_pending=None, caps=None):
+        self.key = key
+        self.caps = caps
+        self._batch_size = batch_size
+        self._max_wait = max_wait
+        self._max_pending = max_pending or batch_size * 4
+        self._logger = logging.get_logger('InferenceBatcher', is_static=True)
+        self._condition = Condition()
+        self._queue = deque()
+        self._owners = deque()
+        self._members = []
+        self._executor = None
+        self._stopped = False
+        self._thread = None
+        self._frames = 0
+        self._padded_frames = 0
+        self._full_batches = 0
+        self._timed_out_batches = 0
+        self._sum_wait = 0.0
+        self._batch_sizes = [0] * (batch_size + 1)
+
+    @property
+    def members(self):
+        with self._condition:
+            return len(self._members)
+
+    def start(self, executor):
+        self._executor = executor
+        self._thread = Thread(target=self._run, name="batcher_{}".format(self.key))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._executor:
+            self._executor.stop()
+
+    def attach(self, deliver, end, error):
+        member = BatchMember(self, deliver, end, error)
+        with self._condition:
+            self._members.append(member)
+        return member
+
+    def detach(self, member):
+        with self._condition:
+            if member.detached:
+                return
+            member.detached = True
+            self._members.remove(member)
+            # Peers no longer wait for queued frames of this instance,
+            # results of frames already submitted are discarded
+            queued = len(self._queue)
+            self._queue = deque(entry for entry in self._queue if entry[0] is not member)
+            member.pending -= queued - len(self._queue)
+            self._condition.notify_all()
+
+    def submit(self, member, frame):
+        with self._condition:
+            while (not self._stopped and not member.detached
+                   and len(self._queue) + len(self._owners) >= self._max_pending):
+                self._condition.wait()
+            if self._stopped or member.detached:
+                return
+            self._queue.append((member, frame, time.monotonic()))
+            member.pending += 1
+            # A new batch starts its max_wait or a batch is complete
+            if len(self._queue) in (1, self._batch_size):
+                self._condition.notify_all()
+
+    def finish(self, member):
+        with self._condition:
+            member.finished = True
+            end = self._end_member(member)
+        if end:
+            member.end()
+
+    def complete(self, frame):
+        with self._condition:
+            member = self._owners.popleft() if self._owners else None
+            self._condition.notify_all()
+            if not member or member.detached:
+                return
+            member.pending -= 1
+            end = self._end_member(member)
+        member.deliver(frame)
+        if end:
+            member.end()
+
+    def fail(self, message):
+        with self._condition:
+            members = list(self._members)
+        for member in members:
+            member.error(message)
+
+    def _end_member(self, member):
+        if (member.finished and not member.ended and not member.detached
+                and member.pending == 0):
+            member.ended = True
+            return True
+        return False
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._stopped:
+                timeout = None
+                if self._queue:
+                    if len(self._queue) >= self._batch_size:
+                        break
+                    timeout = self._queue[0][2] + self._max_wait - time.monotonic()
+                    if timeout <= 0:
+                        break
+                self._condition.wait(timeout)
+            if self._stopped:
+                return None
+            now = time.monotonic()
+            entries = [self._queue.popleft()
+                       for _ in range(min(len(self._queue), self._batch_size))]
+            padding = self._batch_size - len(entries)
+            frames = [frame for _, frame, _ in entries] + [entries[-1][1]] * padding
+            self._owners.extend([member for member, _, _ in entries] + [None] * padding)
+            self._batch_sizes[len(entries)] += 1
+            self._frames += len(entries)
+            self._padded_frames += padding
+            self._sum_wait += sum(now - queued for _, _, queued in entries)
+            if padding:
+                self._timed_out_batches += 1
+            else:
+                self._full_batches += 1
+            return frames
+
+    def _run(self):
+        frames = self._next_batch()
+        while frames is not None:
+            try:
+                self._executor.submit(frames)
+            except Exception as error:
+                self._logger.error("Error running batch of {}: {}".format(self.key, error))
+                self.fail("Shared inference {}: {}".format(self.key, error))
+            frames = self._next_batch()
+
+    def status(self):
+        with self._condition:
+            batches = self._full_batches + self._timed_out_batches
+            status = {"batch_size": self._batch_size,
+                      "max_wait": self._max_wait,
+                      "instances": len(self._members),
+                      "batches": batches,
+                      "frames": self._frames,
+                      "padded_frames": self._padded_frames,
+                      "full_batches": self._full_batches,
+                      "timed_out_batches": self._timed_out_batches,
+                      "avg_batch_size": self._frames / batches if batches else None,
+                      "avg_occupancy": self._frames / (batches * self._batch_size)
+                                       if batches else None,
+                      "avg_wait": self._sum_wait / self._frames if self._frames else None,
+                      "batch_sizes": list(self._batch_sizes)}
+        if self.caps:
+            status["caps"] = self.caps
+        return status
+
+
+class SharedInference:
+    """Batchers of inference instances shared by pipeline instances,
+    keyed like GStreamerPipeline's inference element cache and by the
+    caps of their frames, as frames of one batch must share a format.
+
+    The first instance attaching to a key and caps creates its batcher
+    and executor with create_executor(element, batch_size, batcher),
+    where element is that instance's inference element. The batcher and
+    executor are stopped when the last instance detaches.
+
+    """
+
+    def __init__(self, batch_size, max_wait, create_executor):
+        self._batch_size = batch_size
+        self._max_wait = max_wait
+        self._create_executor = create_executor
+        self._lock = Lock()
+        self._batchers = {}
+
+    def attach(self, key, element, deliver, end, error, caps=None):
+        with self._lock:
+            batcher = self._batchers.get((key, caps))
+            if not batcher:
+                batcher = InferenceBatcher(key, self._batch_size, self._max_wait, caps=caps)
+                batcher.start(self._create_executor(element, self._batch_size, batcher))
+                self._batchers[(key, caps)] = batcher
+            return batcher.attach(deliver, end, error)
+
+    def detach(self, member):
+        batcher = member.batcher
+        with self._lock:
+            batcher.detach(member)
+            batcher_key = (batcher.key, batcher.caps)
+            if batcher.members or self._batchers.get(batcher_key) is not batcher:
+                return
+            del self._batchers[batcher_key]
+        batcher.stop()
+
+    def stop(self):
+        with self._lock:
+            batchers = list(self._batchers.values())
+            self._batchers.clear()
+        for batcher in batchers:
+            batcher.stop()
+
+    def status(self):
+        with self._lock:
+            batchers = list(self._batchers.values())
+        return [dict(batcher.status(), key=batcher.key) for batcher in batchers]
@@ -0,0 +1,118 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+import time
+from enum import Enum, auto
+from threading import Lock
+import gi
+gi.require_version('Gst', '1.0')
+# pylint: disable=wrong-import-position
+from gi.repository import Gst
+from gstgva.util import gst_buffer_data
+from gstgva.video_frame import VideoFrame
+from server.common.utils import logging
+from server.app_destination import AppDestination
+from server.shm.shm_ring_buffer import ShmRingWriter, get_path
+# pylint: enable=wrong-import-position
+
+class GStreamerShmDestination(AppDestination):
+    """Writes frames and their meta into a shared memory ring buffer
+    read by ShmRingReader in consumer processes."""
+    BLOCK_INTERVAL = 0.001
+    _names = set()
+    _names_lock = Lock()
+
+    class Policy(Enum):
+        DROP = auto()
+        BLOCK = auto()
+        @classmethod
+        def _missing_(cls, name):
+            return cls[name.upper()]
+
+    def __init__(self, request, pipeline):
+        AppDestination.__init__(self, request, pipeline)
+        self._pipeline = pipeline
+        self._logger = logging.get_logger('GStreamerShmDestination', is_static=True)
+        self._writer = None
+        self._meta_dropped = 0
+        frame_config = request.get("destination", {}).get("frame", {})
+        self._name = frame_config["name"]
+        self._slots = frame_config.get("slots")
+        self._meta_size = frame_config.get("meta-size")
+        self._policy = GStreamerShmDestination.Policy(frame_config.get("policy"))
+        with GStreamerShmDestination._names_lock:
+            if self._name in GStreamerShmDestination._names:
+                raise Exception("Shared memory name {} is in use".format(self._name))
+            GStreamerShmDestination._names.add(self._name)
+        caps = Gst.Caps.from_string("video/x-raw")
+        if self._pipeline.appsink_element.props.caps:
+            caps = caps.intersect(self._pipeline.appsink_element.props.caps)
+        self._pipeline.appsink_element.props.caps = caps
+
+    def _init_ring(self, frame_size, caps_size):
+        path = get_path(self._name)
+        if os.path.exists(path):
+            # Left behind by a server that did not shut down cleanly,
+            # replaced by ShmRingWriter
+            self._logger.warning("Replacing shared memory {}".format(path))
+        self._writer = ShmRingWriter(self._name, self._slots,
+                                     frame_size + self._meta_size + caps_size)
+        self._logger.info("Pipeline {id} writing frames to {path}".format(
+            id=self._pipeline.identifier, path=path))
+
+    def _wait_for_space(self):
+        if self._writer.has_space():
+            return True
+        if (self._policy == GStreamerShmDestination.Policy.DROP):
+            return False
+        while not self._pipeline.state.stopped():
+            time.sleep(self.BLOCK_INTERVAL)
+            if self._writer.has_space():
+                return True
+        return False
+
+    def process_frame(self, frame):
+        buffer = frame.get_buffer()
+        caps = frame.get_caps()
+        caps_string = caps.to_string().encode() if caps else b""
+        if not self._writer:
+            self._init_ring(buffer.get_size(), len(caps_string))
+        if not self._wait_for_space():
+            self._writer.add_dropped()
+            return
+        messages = []
+        try:
+            messages = list(VideoFrame(buffer, caps=caps).messages())
+        except Exception:
+            pass
+        meta = "\n".join(messages).encode()
+        if len(meta) > self._meta_size:
+            if not self._meta_dropped:
+                self._logger.warning("Dropping frames with more than {} bytes of meta-data, "
+                                     "increase meta-size".format(self._meta_size))
+            self._meta_dropped += 1
+            self._writer.add_dropped()
+            return
+        with gst_buffer_data(buffer, Gst.MapFlags.READ) as data:
+            try:
+                self._writer.write(data, meta, caps_string, buffer.pts)
+            except ValueError as error:
+                # Slots are sized for the first frame and cannot be
+                # resized while a reader maps the ring
+                raise Exception("Shared memory {} requires frames of a fixed size: {}".format(
+                    self._name, error)) from error
+
+    def finish(self):
+        if self._writer:
+            if self._writer.dropped:
+                self._logger.info("Pipeline {id} dropped {dropped} frames".format(
+                    id=self._pipeline.identifier, dropped=self._writer.dropped))
+            self._writer.close()
+            self._writer.unlink()
+            self._writer = None
+        with GStreamerShmDestination._names_lock:
+            GStreamerShmDestination._names.discard(self._name)
@@ -0,0 +1,248 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import mmap
+import os
+import struct
+import time
+
+# Layout of the shared memory segment /dev/shm/<name>
+#
+# header     HEADER_SIZE bytes
+# index      slot_count descriptors of SLOT_SIZE bytes
+# data       slot_count slots of slot_size bytes, page aligned
+#
+# Each slot holds the frame data followed by its meta, JSON messages
+# separated by newlines, and its caps string.
+#
+# There is a single writer and a single reader. The writer never
+# overwrites a slot the reader has not released, so frames read from
+# a slot stay valid until released. Sequence numbers are written
+# after the data they publish.
+
+MAGIC = b"DLSPSHM1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQI4x")
+HEADER_SIZE = 64
+WRITE_SEQUENCE_OFFSET = 24
+READ_SEQUENCE_OFFSET = 32
+DROPPED_OFFSET = 40
+FLAGS_OFFSET = 48
+SLOT = struct.Struct("<QQIIId")
+SLOT_SIZE = 64
+FLAG_END_OF_STREAM = 1
+ALIGNMENT = 64
+SEQUENCE = struct.Struct("<Q")
+FLAGS = struct.Struct("<I")
+
+
+def get_path(name):
+    return os.path.join("/dev/shm", name)
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def _get_data_offset(slot_count):
+    return _align(HEADER_SIZE + slot_count * SLOT_SIZE, mmap.PAGESIZE)
+
+
+class ShmRingWriter:
+    """Writes frames into a shared memory ring buffer.
+
+    The segment is created and its header written under a temporary
+    name, then renamed into place, so readers waiting for it never see
+    an empty or partially initialized segment. An existing segment of
+    the same name is replaced.
+
+    """
+
+    def __init__(self, name, slot_count, slot_size):
+        self.name = name
+        self.slot_count = slot_count
+        self.slot_size = _align(slot_size, ALIGNMENT)
+        self._data_offset = _get_data_offset(slot_count)
+        self._write_sequence = 0
+        self._dropped = 0
+        size = self._data_offset + slot_count * self.slot_size
+        temp_path = get_path(".{}.{}.tmp".format(name, os.getpid()))
+        fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o660)
+        try:
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+            HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, slot_count, self.slot_size,
+                             0, 0, 0, 0)
+            os.rename(temp_path, get_path(name))
+        except:
+            if getattr(self, "_mmap", None):
+                self._mmap.close()
+            os.unlink(temp_path)
+            raise
+        finally:
+            os.close(fd)
+
+    def has_space(self):
+        read_sequence = SEQUENCE.unpack_from(self._mmap, READ_SEQUENCE_OFFSET)[0]
+        return self._write_sequence - read_sequence < self.slot_count
+
+    def write(self, data, meta=b"", caps=b"", pts=0):
+        """Writes a frame into the next slot. The caller must check
+        has_space() first."""
+        data = memoryview(data).cast('B')
+        if data.nbytes + len(meta) + len(caps) > self.slot_size:
+            raise ValueError("Frame of {} bytes does not fit slot of {} bytes".format(
+                data.nbytes + len(meta) + len(caps), self.slot_size))
+        sequence = self._write_sequence
+        slot = sequence % self.slot_count
+        offset = self._data_offset + slot * self.slot_size
+        meta_offset = offset + data.nbytes
+        caps_offset = meta_offset + len(meta)
+        self._mmap[offset:meta_offset] = data
+        self._mmap[meta_offset:caps_offset] = meta
+        self._mmap[caps_offset:caps_offset + len(caps)] = caps
+        SLOT.pack_into(self._mmap, HEADER_SIZE + slot * SLOT_SIZE, sequence,
+                       pts, data.nbytes, len(meta), len(caps), time.time())
+        self._write_sequence += 1
+        SEQUENCE.pack_into(self._mmap, WRITE_SEQUENCE_OFFSET, self._write_sequence)
+
+    def add_dropped(self):
+        self._dropped += 1
+        SEQUENCE.pack_into(self._mmap, DROPPED_OFFSET, self._dropped)
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def close(self):
+        """Signals end of stream to the reader and unmaps the segment"""
+        if self._mmap:
+            FLAGS.pack_into(self._mmap, FLAGS_OFFSET, FLAG_END_OF_STREAM)
+            self._mmap.close()
+            self._mmap = None
+
+    def unlink(self):
+        try:
+            os.unlink(get_path(self.name))
+        except FileNotFoundError:
+            pass
+
+
+class ShmFrame:
+    """Frame in a shared memory ring buffer slot.
+
+    data is a read-only memoryview of the slot, no data is copied. It
+    is valid until the frame is released. Releasing a frame also
+    releases all frames read before it.
+
+    """
+
+    def __init__(self, reader, sequence, pts, timestamp, data, meta, caps):
+        self._reader = reader
+        self.sequence = sequence
+        self.pts = pts
+        self.timestamp = timestamp
+        self.data = data
+        self.meta = meta
+        self.caps = caps
+
+    def numpy(self):
+        # pylint: disable=import-outside-toplevel
+        import numpy
+        return numpy.frombuffer(self.data, dtype=numpy.uint8)
+
+    def messages(self):
+        """Returns the JSON messages attached to the frame"""
+        # pylint: disable=import-outside-toplevel
+        import json
+        return [json.loads(line) for line in bytes(self.meta).splitlines() if line]
+
+    def release(self):
+        if self._reader:
+            self.data.release()
+            self.meta.release()
+            self._reader.release(self.sequence)
+            self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ShmRingReader:
+    """Reads frames from a shared memory ring buffer written by a
+    GStreamerShmDestination, typically in another process."""
+    POLL_INTERVAL = 0.001
+
+    def __init__(self, name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(get_path(name), os.O_RDWR)
+                break
+            except FileNotFoundError:
+                if (deadline is not None) and (time.monotonic() > deadline):
+                    raise
+                time.sleep(self.POLL_INTERVAL)
+        try:
+            self._mmap = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        magic, version, self.slot_count, self.slot_size, _, read_sequence, _, _ = \
+            HEADER.unpack_from(self._mmap, 0)
+        if (magic != MAGIC) or (version != VERSION):
+            self._mmap.close()
+            raise ValueError("{} is not a frame ring buffer of version {}".format(name,
+                                                                                VERSION))
+        self._data_offset = _get_data_offset(self.slot_count)
+        self._view = memoryview(self._mmap).toreadonly()
+        self._next_sequence = read_sequence
+
+    @property
+    def dropped(self):
+        """Number of frames the writer dropped"""
+        return SEQUENCE.unpack_from(self._mmap, DROPPED_OFFSET)[0]
+
+    def read(self, timeout=None):
+        """Returns the next ShmFrame, waiting up to timeout seconds, or
+        None at end of stream."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            write_sequence = SEQUENCE.unpack_from(self._mmap, WRITE_SEQUENCE_OFFSET)[0]
+            if self._next_sequence < write_sequence:
+                break
+            if FLAGS.unpack_from(self._mmap, FLAGS_OFFSET)[0] & FLAG_END_OF_STREAM:
+                return None
+            if (deadline is not None) and (time.monotonic() > deadline):
+                raise TimeoutError("No frame in {} seconds".format(timeout))
+            time.sleep(self.POLL_INTERVAL)
+        slot = self._next_sequence % self.slot_count
+        sequence, pts, data_size, meta_size, caps_size, timestamp = SLOT.unpack_from(
+            self._mmap, HEADER_SIZE + slot * SLOT_SIZE)
+        offset = self._data_offset + slot * self.slot_size
+        meta_offset = offset + data_size
+        caps_offset = meta_offset + meta_size
+        caps = bytes(self._view[caps_offset:caps_offset + caps_size]).decode()
+        self._next_sequence += 1
+        return ShmFrame(self, sequence, pts, timestamp,
+                        self._view[offset:meta_offset],
+                        self._view[meta_offset:caps_offset],
+                        caps)
+
+    def release(self, sequence):
+        read_sequence = SEQUENCE.unpack_from(self._mmap, READ_SEQUENCE_OFFSET)[0]
+        if sequence + 1 > read_sequence:
+            SEQUENCE.pack_into(self._mmap, READ_SEQUENCE_OFFSET, sequence + 1)
+
+    def close(self):
+        """Closes the ring buffer. Raises BufferError while views of
+        unreleased frames are referenced."""
+        if self._mmap:
+            self._view.release()
+            self._mmap.close()
+            self._mmap = None
@@ -0,0 +1,156 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import itertools
+import json
+import time
+from collections import namedtuple
+import pytest
+from server.pipeline import Pipeline
+from server.pipeline_manager import PipelineManager
+
+
+class FakePipeline(Pipeline):
+    """Pipeline that runs until the test finishes it, used to simulate
+    load on the PipelineManager without GStreamer or FFmpeg."""
+    _start_sequence = itertools.count()
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, identifier, config, model_manager, request, finished_callback, options):
+        self.identifier = identifier
+        self.config = config
+        self.request = request
+        self.state = Pipeline.State.QUEUED
+        self.start_time = None
+        self.start_sequence = None
+        self.stop_time = None
+        self.frame_count = 0
+        self._finished_callback = finished_callback
+
+    def start(self):
+        self.state = Pipeline.State.RUNNING
+        self.start_time = time.time()
+        self.start_sequence = next(FakePipeline._start_sequence)
+
+    def finish(self, state=Pipeline.State.COMPLETED):
+        self.state = state
+        self.stop_time = time.time()
+        self._finished_callback()
+
+    def stop(self):
+        if self.state is Pipeline.State.RUNNING:
+            self.finish(Pipeline.State.ABORTED)
+        elif self.state is Pipeline.State.QUEUED:
+            self.state = Pipeline.State.ABORTED
+        return self.status()
+
+    def status(self):
+        return {"id": self.identifier,
+                "state": self.state,
+                "avg_fps": 0,
+                "start_time": self.start_time,
+                "elapsed_time": None,
+                "message": ""}
+
+    def params(self):
+        return {"id": self.identifier,
+                "request": self.request,
+                "type": self.config["type"],
+                "launch_command": None}
+
+    @staticmethod
+    def validate_config(config, request):
+        pass
+
+
+class FakeModelManager:
+    models = {}
+
+
+Rect = namedtuple("Rect", "x y w h")
+
+
+class FakeRegion:
+    """Subset of gstgva.RegionOfInterest used by the spatial analytics
+    extensions. Object id 0 is an untracked detection."""
+
+    def __init__(self, rect, confidence=1.0, object_id=0):
+        self._rect = Rect(*rect)
+        self._confidence = confidence
+        self._object_id = object_id
+
+    def normalized_rect(self):
+        return self._rect
+
+    def confidence(self):
+        return self._confidence
+
+    def object_id(self):
+        return self._object_id
+
+    def tensors(self):
+        return []
+
+
+class FakeFrame:
+    """Subset of gstgva.VideoFrame used by the spatial analytics
+    extensions"""
+
+    def __init__(self, regions=()):
+        self._regions = list(regions)
+        self._messages = []
+
+    def regions(self):
+        return self._regions
+
+    def messages(self):
+        return list(self._messages)
+
+    def add_message(self, message):
+        self._messages.append(message)
+
+    def remove_message(self, message):
+        self._messages.remove(message)
+
+    def events(self):
+        events = []
+        for message in self._messages:
+            events.extend(json.loads(message).get("events", []))
+        return events
+
+
+def write_pipeline(pipeline_dir, name, version="1", **config):
+    path = pipeline_dir / name / version
+    path.mkdir(parents=True)
+    config.setdefault("type", "Fake")
+    config.setdefault("description", "Fake pipeline {}".format(name))
+    config.setdefault("template", "")
+    (path / "pipeline.json").write_text(json.dumps(config))
+
+
+@pytest.fixture
+def pipeline_dir(tmp_path):
+    return tmp_path / "pipelines"
+
+
+@pytest.fixture
+def create_manager(monkeypatch, pipeline_dir):
+    """Returns a function creating a PipelineManager running
+    FakePipeline instances of the pipelines in pipeline_dir."""
+    monkeypatch.setattr(PipelineManager, "_import_pipeline_types",
+                        lambda self: {"Fake": FakePipeline})
+    managers = []
+
+    def create(**kwargs):
+        pipeline_dir.mkdir(exist_ok=True)
+        kwargs.setdefault("max_running_pipelines", 0)
+        manager = PipelineManager(FakeModelManager(), str(pipeline_dir), **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield create
+    for manager in managers:
+        manager.stop()
@@ -0,0 +1,112 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import socket
+import struct
+import threading
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+class MqttBroker:
+    """In-process MQTT 3.1.1 broker accepting QoS 0 publishes.
+
+    Payloads are recorded per topic, connections counts the clients
+    that connected. Used in place of a real broker in tests.
+
+    """
+
+    def __init__(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self.host = "127.0.0.1:{}".format(self.port)
+        self.connections = 0
+        self.messages = {}
+        self._condition = threading.Condition()
+        self._clients = []
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    @staticmethod
+    def _read(client, size):
+        data = b""
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError()
+            data += chunk
+        return data
+
+    def _read_packet(self, client):
+        header = self._read(client, 1)[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = self._read(client, 1)[0]
+            length += (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header >> 4, self._read(client, length)
+
+    def _serve(self, client):
+        try:
+            while True:
+                packet_type, body = self._read_packet(client)
+                if packet_type == CONNECT:
+                    with self._condition:
+                        self.connections += 1
+                    client.sendall(bytes([CONNACK << 4, 2, 0, 0]))
+                elif packet_type == PUBLISH:
+                    topic_length = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + topic_length].decode()
+                    with self._condition:
+                        self.messages.setdefault(topic, []).append(body[2 + topic_length:])
+                        self._condition.notify_all()
+                elif packet_type == SUBSCRIBE:
+                    client.sendall(bytes([SUBACK << 4, 3]) + body[:2] + b"\x00")
+                elif packet_type == PINGREQ:
+                    client.sendall(bytes([PINGRESP << 4, 0]))
+                elif packet_type == DISCONNECT:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        client.close()
+
+    def wait_for(self, topic, count, timeout=10):
+        """Returns the payloads of topic once count were received"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.messages.get(topic, [])) >= count,
+                                     timeout)
+            return list(self.messages.get(topic, []))
+
+    def close(self):
+        self._server.close()
+        for client in self._clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
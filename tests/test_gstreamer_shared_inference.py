@@ -0,0 +1,127 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+
+gi = pytest.importorskip("gi")
+try:
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+except (ImportError, ValueError):
+    pytest.skip("GStreamer is not available", allow_module_level=True)
+# pylint: disable=wrong-import-position
+from server.gstreamer_shared_inference import GStreamerBatchedElement, GStreamerInferenceExecutor
+from server.shared_inference import SharedInference
+# pylint: enable=wrong-import-position
+
+Gst.init(None)
+
+FRAMES = 30
+KEY = "GstIdentity_stub"
+# identity stands in for the inference element, sleep-time in
+# microseconds is the time per frame
+STUB_INFERENCE = "identity name=detection sleep-time=1000"
+CAPS = "video/x-raw,format=BGRx,width={width},height=48,framerate=30/1"
+TEMPLATE = ("videotestsrc num-buffers={frames} pattern={pattern} ! {caps} "
+            "! {decode}{inference} ! appsink name=appsink emit-signals=true sync=false")
+
+
+class Instance:
+    def __init__(self, pattern, width=64, decode=False):
+        # decodebin links its src pad to the inference element only once
+        # the stream is typed, like the pipelines shipped with the server
+        self.pipeline = Gst.parse_launch(TEMPLATE.format(
+            frames=FRAMES, pattern=pattern, caps=CAPS.format(width=width),
+            decode="decodebin ! " if decode else "", inference=STUB_INFERENCE))
+        self.timestamps = []
+        self.pipeline.get_by_name("appsink").connect("new-sample", self._on_sample)
+
+    def _on_sample(self, sink):
+        self.timestamps.append(sink.emit("pull-sample").get_buffer().pts)
+        return Gst.FlowReturn.OK
+
+    def wait(self):
+        message = self.pipeline.get_bus().timed_pop_filtered(
+            10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        self.pipeline.set_state(Gst.State.NULL)
+        return message
+
+
+@pytest.fixture
+def shared_inference():
+    executors = []
+
+    def create_executor(element, batch_size, batcher):
+        executors.append(GStreamerInferenceExecutor(element, batch_size, batcher))
+        return executors[-1]
+    result = SharedInference(4, 0.05, create_executor)
+    result.executors = executors
+    yield result
+    result.stop()
+
+
+def run(instances, shared_inference):
+    batched = [GStreamerBatchedElement(instance.pipeline.get_by_name("detection"), KEY,
+                                       shared_inference)
+               for instance in instances]
+    for instance in instances:
+        instance.pipeline.set_state(Gst.State.PLAYING)
+    for instance in instances:
+        message = instance.wait()
+        assert message and message.type == Gst.MessageType.EOS
+        assert len(instance.timestamps) == FRAMES
+        assert instance.timestamps == sorted(instance.timestamps)
+    return batched
+
+
+@pytest.mark.parametrize("decode", [False, True])
+def test_instances_share_stub_inference_element(shared_inference, decode):
+    instances = [Instance(pattern, decode=decode) for pattern in range(3)]
+    batched = run(instances, shared_inference)
+    assert len(shared_inference.executors) == 1
+    shared_element = shared_inference.executors[0].pipeline.get_by_name("inference")
+    assert shared_element.get_factory().get_name() == "identity"
+    assert shared_element.get_property("sleep-time") == 1000
+    # The instance's own element is never started
+    detection = instances[0].pipeline.get_by_name("detection")
+    assert detection.is_locked_state()
+    assert detection.get_state(0).state == Gst.State.NULL
+    status = batched[0].status()
+    assert status["instances"] == 3
+    assert status["frames"] == 3 * FRAMES
+    assert sum(status["batch_sizes"]) == status["batches"]
+    assert status["avg_batch_size"] > 1
+    for element in batched:
+        element.detach()
+    assert not shared_inference.status()
+
+
+def test_caps_not_shared(shared_inference):
+    instances = [Instance(pattern, width=64 if pattern % 2 else 32) for pattern in range(4)]
+    batched = run(instances, shared_inference)
+    assert len(shared_inference.executors) == 2
+    statuses = shared_inference.status()
+    assert sorted(status["frames"] for status in statuses) == [2 * FRAMES, 2 * FRAMES]
+    assert all("width=(int)32" in status["caps"] or "width=(int)64" in status["caps"]
+               for status in statuses)
+    for element in batched:
+        element.detach()
+
+
+def test_detached_instance(shared_inference):
+    instances = [Instance(pattern) for pattern in range(2)]
+    batched = [GStreamerBatchedElement(instance.pipeline.get_by_name("detection"), KEY,
+                                       shared_inference)
+               for instance in instances]
+    batched[0].detach()
+    assert batched[0].status() is None
+    instances[0].pipeline.set_state(Gst.State.NULL)
+    instances[1].pipeline.set_state(Gst.State.PLAYING)
+    message = instances[1].wait()
+    assert message and message.type == Gst.MessageType.EOS
+    assert len(instances[1].timestamps) == FRAMES
+    assert batched[1].status()["instances"] == 1
+    batched[1].detach()
@@ -0,0 +1,135 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+from conftest import FakeFrame, FakeRegion
+from extensions.gva_event_meta import gva_event_meta
+from extensions.gva_event_meta.gva_event_filter import EventFilter
+
+ZONE_COUNT = "object-zone-count"
+
+
+def zone_event(zone_name, related_objects):
+    return {"zone-name": zone_name, "related-objects": list(related_objects)}
+
+
+def run(event_filter, frames, frame_interval=0.1):
+    # frames are lists of (event type, attributes), returns the passed
+    # (event type, zone name) of each frame
+    passed = []
+    for index, events in enumerate(frames):
+        frame = FakeFrame([FakeRegion((0.1, 0.1, 0.1, 0.1), object_id=object_id)
+                           for object_id in range(1, 4)])
+        with gva_event_meta.frame_events(frame) as accumulator:
+            for event_type, attributes in events:
+                accumulator.add(event_type, attributes)
+            event_filter.filter(accumulator, frame, now=index * frame_interval)
+        passed.append([(event["event-type"], event["zone-name"]) for event in frame.events()])
+    return passed
+
+
+def test_change_only():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True}})
+    frames = [[(ZONE_COUNT, zone_event("A", [0]))],
+              [(ZONE_COUNT, zone_event("A", [0]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))]]
+    # An event passes again after a frame without one
+    assert run(event_filter, frames) == [[(ZONE_COUNT, "A")], [], [(ZONE_COUNT, "A")], [],
+                                         [(ZONE_COUNT, "A")]]
+    assert event_filter.status() == {"passed": 3, "suppressed": {ZONE_COUNT: {"change": 1}}}
+
+
+def test_change_only_uses_object_ids():
+    # Same tracked object at a different index in the frame
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True}})
+    frame = FakeFrame([FakeRegion((0, 0, 0, 0), object_id=5)])
+    with gva_event_meta.frame_events(frame) as events:
+        events.add(ZONE_COUNT, zone_event("A", [0]))
+        assert event_filter.filter(events, frame, now=0) == 0
+    frame = FakeFrame([FakeRegion((0, 0, 0, 0), object_id=7),
+                       FakeRegion((0, 0, 0, 0), object_id=5)])
+    with gva_event_meta.frame_events(frame) as events:
+        events.add(ZONE_COUNT, zone_event("A", [1]))
+        assert event_filter.filter(events, frame, now=1) == 1
+
+
+def test_change_only_with_min_interval():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True, "min_interval": 1}})
+    frames = [[(ZONE_COUNT, zone_event("A", [0]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [(ZONE_COUNT, zone_event("A", [0]))]]
+    # The change suppressed by the interval is reported once it expires
+    assert run(event_filter, frames, frame_interval=0.6) == [
+        [(ZONE_COUNT, "A")], [], [(ZONE_COUNT, "A")], [], [(ZONE_COUNT, "A")]]
+    assert event_filter.status()["suppressed"] == {ZONE_COUNT: {"interval": 1, "change": 1}}
+
+
+def test_change_only_with_rate():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True, "rate": 1}})
+    frames = [[(ZONE_COUNT, zone_event("A", [0]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))],
+              [(ZONE_COUNT, zone_event("A", [0, 1]))]]
+    assert run(event_filter, frames, frame_interval=0.5) == [
+        [(ZONE_COUNT, "A")], [], [(ZONE_COUNT, "A")], []]
+    assert event_filter.status()["suppressed"] == {ZONE_COUNT: {"rate": 1, "change": 1}}
+
+
+def test_min_interval():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"min_interval": 0.25}})
+    frames = [[(ZONE_COUNT, zone_event("A", [0])), (ZONE_COUNT, zone_event("B", [1]))]] * 6
+    passed = run(event_filter, frames)
+    assert [len(events) for events in passed] == [2, 0, 0, 2, 0, 0]
+    assert event_filter.status()["suppressed"] == {ZONE_COUNT: {"interval": 8}}
+
+
+def test_rate_is_limited_per_zone():
+    event_filter = EventFilter(rules={"*": {"rate": 1, "burst": 2}})
+    busy = [(ZONE_COUNT, zone_event("Busy", [0]))] * 3
+    frames = [busy + [(ZONE_COUNT, zone_event("Quiet", [1]))]] + [busy] * 9 + \
+        [[(ZONE_COUNT, zone_event("Quiet", [1]))]]
+    passed = run(event_filter, frames)
+    busy_passed = [events.count((ZONE_COUNT, "Busy")) for events in passed]
+    # Burst of 2 then 1 per second at 10 frames per second
+    assert busy_passed[0] == 2
+    assert sum(busy_passed) == 2
+    # The busy zone does not use the tokens of the quiet zone
+    assert passed[0].count((ZONE_COUNT, "Quiet")) == 1
+    assert passed[-1] == [(ZONE_COUNT, "Quiet")]
+
+
+def test_rate_refills():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"rate": 2}})
+    frames = [[(ZONE_COUNT, zone_event("A", [0]))] * 3] * 11
+    passed = run(event_filter, frames)
+    # Burst defaults to rate, then 2 events per second
+    assert sum(len(events) for events in passed) == 2 + 2
+
+
+def test_event_types_without_rule_pass():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True}})
+    frames = [[("object-line-crossing", zone_event("A", [0]))]] * 3
+    assert run(event_filter, frames) == [[("object-line-crossing", "A")]] * 3
+    assert event_filter.passed == 3
+
+
+@pytest.mark.parametrize("rule", [{"unknown": 1}, {"burst": 2}, {"rate": 0}])
+def test_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        EventFilter(rules={ZONE_COUNT: rule})
+
+
+def test_process_frame():
+    event_filter = EventFilter(rules={ZONE_COUNT: {"change_only": True}})
+    for expected in (1, 0):
+        frame = FakeFrame([FakeRegion((0, 0, 0, 0), object_id=1)])
+        gva_event_meta.add_event(frame, ZONE_COUNT, zone_event("A", [0]))
+        assert event_filter.process_frame(frame)
+        assert len(frame.events()) == expected
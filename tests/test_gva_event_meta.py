@@ -0,0 +1,122 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import json
+import pytest
+from extensions.gva_event_meta import gva_event_convert, gva_event_meta
+
+
+class FakeFrame:
+    """Frame holding JSON messages like gstgva.VideoFrame. Each call to
+    messages() returns new strings, as read from the buffer's meta."""
+
+    def __init__(self, messages=()):
+        self._messages = list(messages)
+
+    def messages(self):
+        return ["".join(message) for message in self._messages]
+
+    def add_message(self, message):
+        self._messages.append(message)
+
+    def remove_message(self, message):
+        self._messages.remove(message)
+
+
+@pytest.fixture
+def parse_count(monkeypatch):
+    counter = {"loads": 0}
+    loads = json.loads
+
+    def counting_loads(*args, **kwargs):
+        counter["loads"] += 1
+        return loads(*args, **kwargs)
+    monkeypatch.setattr(gva_event_meta.json, "loads", counting_loads)
+    return counter
+
+
+def test_accumulator_writes_once():
+    frame = FakeFrame([json.dumps({"objects": []})])
+    with gva_event_meta.frame_events(frame) as events:
+        events.add("first", {"zone": 1})
+        events.add("second", {"zone": 2})
+        assert len(frame.messages()) == 1
+    assert len(frame.messages()) == 2
+    assert [event["event-type"] for event in gva_event_meta.events(frame)] == \
+        ["first", "second"]
+
+
+def test_next_extension_reuses_parsed_events(parse_count):
+    frame = FakeFrame()
+    # Extensions in consecutive gvapython elements
+    with gva_event_meta.frame_events(frame) as events:
+        events.add("zoneCount", {"zone-name": "Zone1"})
+    with gva_event_meta.frame_events(frame) as events:
+        events.add("lineCrossing", {"line-name": "Line1"})
+    with gva_event_meta.frame_events(frame) as events:
+        assert [event["event-type"] for event in events.events] == \
+            ["zoneCount", "lineCrossing"]
+    assert parse_count["loads"] == 0
+
+
+def test_events_of_unknown_messages_are_parsed(parse_count):
+    events = [{"event-type": "external"}]
+    frame = FakeFrame([json.dumps({"events": events}, indent=1)])
+    assert gva_event_meta.events(frame) == events
+    assert parse_count["loads"] == 1
+
+
+def test_cached_events_are_not_shared():
+    frame = FakeFrame()
+    gva_event_meta.add_event(frame, "first", {})
+    # A copy of the buffer holds the same message
+    copy = FakeFrame(frame.messages())
+    gva_event_meta.add_event(frame, "second", {})
+    assert len(gva_event_meta.events(copy)) == 1
+    assert len(gva_event_meta.events(frame)) == 2
+
+
+def test_cached_event_dicts_are_not_shared():
+    frame = FakeFrame()
+    gva_event_meta.add_event(frame, "first", {"related-objects": [0]})
+    copy = FakeFrame(frame.messages())
+    # An extension changing an event in place
+    gva_event_meta.events(frame)[0]["related-objects"].append(1)
+    gva_event_meta.events(frame)[0]["zone-name"] = "Zone1"
+    assert gva_event_meta.events(copy) == [{"event-type": "first", "related-objects": [0]}]
+
+
+def test_cache_is_bounded():
+    for index in range(gva_event_meta.MAX_CACHED_MESSAGES * 2):
+        gva_event_meta.add_event(FakeFrame(), "event", {"index": index})
+    # pylint: disable=protected-access
+    assert len(gva_event_meta._cached_events) == gva_event_meta.MAX_CACHED_MESSAGES
+
+
+def test_remove_events():
+    frame = FakeFrame([json.dumps({"objects": []})])
+    gva_event_meta.add_event(frame, "first", {})
+    gva_event_meta.remove_events(frame)
+    assert frame.messages() == [json.dumps({"objects": []})]
+    assert gva_event_meta.events(frame) == []
+
+
+def test_convert_merges_events_into_objects_message():
+    frame = FakeFrame([json.dumps({"objects": [{"id": 1}]})])
+    gva_event_meta.add_event(frame, "zoneCount", {"zone-count": 1})
+    assert gva_event_convert.process_frame(frame)
+    messages = frame.messages()
+    assert len(messages) == 1
+    assert json.loads(messages[0]) == {"objects": [{"id": 1}],
+                                       "events": [{"event-type": "zoneCount",
+                                                   "zone-count": 1}]}
+
+
+def test_convert_keeps_events_without_objects_message():
+    frame = FakeFrame()
+    gva_event_meta.add_event(frame, "zoneCount", {"zone-count": 1})
+    assert gva_event_convert.process_frame(frame)
+    assert gva_event_meta.events(frame) == [{"event-type": "zoneCount", "zone-count": 1}]
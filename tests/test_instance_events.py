@@ -0,0 +1,46 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.instance_events import InstanceEvents
+from conftest import write_pipeline
+
+
+def test_state_events(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=1)
+    events = []
+    token = InstanceEvents.subscribe(events.append)
+    try:
+        instance_id, _ = manager.create_instance("detect", "1", {}, None)
+    finally:
+        InstanceEvents.unsubscribe(token)
+    assert [(event["type"], event["id"], event["state"]) for event in events] == \
+        [(InstanceEvents.STATE, instance_id, "QUEUED")]
+    assert events[0]["name"] == "detect"
+
+
+def test_subscribe_filters_instances_and_samples():
+    events = []
+    token = InstanceEvents.subscribe(events.append, instance_ids=["a"])
+    try:
+        InstanceEvents.publish({"type": InstanceEvents.STATE, "id": "a"})
+        InstanceEvents.publish({"type": InstanceEvents.STATE, "id": "b"})
+        InstanceEvents.publish_sample({"id": "a", "avg_fps": 30})
+    finally:
+        InstanceEvents.unsubscribe(token)
+    assert events == [{"type": InstanceEvents.STATE, "id": "a"}]
+
+
+def test_manager_unsubscribes_on_stop(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    subscribers = len(InstanceEvents._subscribers)
+    manager = create_manager()
+    assert len(InstanceEvents._subscribers) == subscribers + 1
+    manager.stop()
+    assert len(InstanceEvents._subscribers) == subscribers
+    # Stopping again is harmless
+    manager.stop()
+    assert len(InstanceEvents._subscribers) == subscribers
@@ -0,0 +1,118 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+from server.pipeline import Pipeline
+from conftest import write_pipeline
+
+
+@pytest.fixture
+def manager(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect", version="1")
+    write_pipeline(pipeline_dir, "detect", version="2")
+    write_pipeline(pipeline_dir, "track")
+    return create_manager(max_running_pipelines=3)
+
+
+def create(manager, name="detect", version="1", tags=None):
+    request = {"tags": tags} if tags else {}
+    instance_id, error = manager.create_instance(name, version, request, None)
+    assert error is None
+    return instance_id
+
+
+def query_ids(manager, **kwargs):
+    statuses, _ = manager.query_instance_status(**kwargs)
+    return [status["id"] for status in statuses]
+
+
+def test_state_filter(manager):
+    instance_ids = [create(manager) for _ in range(5)]
+    manager.pipeline_instances[instance_ids[0]].finish(Pipeline.State.ERROR)
+    # The first queued instance starts in its place
+    assert query_ids(manager, states=[Pipeline.State.RUNNING]) == instance_ids[1:4]
+    assert query_ids(manager, states=[Pipeline.State.QUEUED]) == instance_ids[4:]
+    assert query_ids(manager, states=[Pipeline.State.ERROR]) == instance_ids[:1]
+    assert query_ids(manager, states=[Pipeline.State.ERROR, Pipeline.State.QUEUED]) == \
+        [instance_ids[0], instance_ids[4]]
+    assert query_ids(manager, states=[Pipeline.State.COMPLETED]) == []
+    statuses, _ = manager.query_instance_status(states=[Pipeline.State.QUEUED])
+    assert statuses[0]["queue_position"] == 1
+
+
+def test_name_and_version_filters(manager):
+    detect_1 = create(manager, "detect", "1")
+    detect_2 = create(manager, "detect", "2")
+    track = create(manager, "track", "1")
+    assert query_ids(manager, name="detect") == [detect_1, detect_2]
+    assert query_ids(manager, name="detect", version="2") == [detect_2]
+    assert query_ids(manager, name="track", version="1") == [track]
+    assert query_ids(manager, name="unknown") == []
+    assert query_ids(manager, name="detect", states=[Pipeline.State.RUNNING]) == \
+        [detect_1, detect_2]
+
+
+def test_tag_filter(manager):
+    lobby = create(manager, tags={"camera": "lobby", "floor": 1})
+    create(manager, tags={"camera": "garage", "floor": 1})
+    create(manager)
+    # Tag values are matched as strings
+    assert query_ids(manager, tags={"camera": "lobby"}) == [lobby]
+    assert len(query_ids(manager, tags={"floor": "1"})) == 2
+    assert query_ids(manager, tags={"camera": "lobby", "floor": "2"}) == []
+    assert query_ids(manager, tags={"missing": "1"}) == []
+
+
+@pytest.mark.parametrize("count", [5, 6])
+def test_paging(manager, count):
+    instance_ids = [create(manager) for _ in range(count)]
+    pages = []
+    cursor = None
+    while True:
+        statuses, cursor = manager.query_instance_status(limit=2, cursor=cursor)
+        pages.append([status["id"] for status in statuses])
+        if cursor is None:
+            break
+    # The last page has no next cursor, even when it is full
+    assert [len(page) for page in pages] == [2] * (count // 2) + [1] * (count % 2)
+    assert sum(pages, []) == instance_ids
+
+
+def test_paging_with_filter(manager):
+    detect = [create(manager, "detect", "1") for _ in range(3)]
+    for _ in range(2):
+        create(manager, "track", "1")
+    detect.append(create(manager, "detect", "1"))
+    statuses, cursor = manager.query_instance_status(name="detect", limit=3)
+    assert [status["id"] for status in statuses] == detect[:3]
+    statuses, cursor = manager.query_instance_status(name="detect", limit=3, cursor=cursor)
+    assert [status["id"] for status in statuses] == detect[3:]
+    assert cursor is None
+
+
+def test_instances_created_after_cursor_are_returned(manager):
+    first = create(manager)
+    _, cursor = manager.query_instance_status(limit=1)
+    assert cursor is None
+    statuses, _ = manager.query_instance_status(limit=1, cursor="0")
+    assert statuses == []
+    second = create(manager)
+    assert query_ids(manager, cursor="0") == [second]
+    assert query_ids(manager) == [first, second]
+
+
+def test_fields(manager):
+    create(manager)
+    statuses, _ = manager.query_instance_status(fields=["state", "unknown"])
+    assert set(statuses[0]) == {"id", "state"}
+    assert statuses[0]["state"] is Pipeline.State.RUNNING
+
+
+@pytest.mark.parametrize("cursor", ["abc", "1.5"])
+def test_invalid_cursor(manager, cursor):
+    create(manager)
+    with pytest.raises(ValueError):
+        manager.query_instance_status(cursor=cursor)
@@ -0,0 +1,141 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+from server import pipeline_manager
+from server.instance_history import InstanceHistory
+from server.pipeline import Pipeline
+from conftest import write_pipeline
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    result = Clock()
+    monkeypatch.setattr(pipeline_manager.time, "time", result)
+    return result
+
+
+@pytest.fixture
+def create_retaining_manager(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+
+    def create(history=None, **retention):
+        return create_manager(retention=retention, history=history)
+    return create
+
+
+def run_instances(manager, states, clock=None, interval=1):
+    instance_ids = []
+    for state in states:
+        instance_id, error = manager.create_instance("detect", "1", {"tags": {"camera": "1"}},
+                                                     None)
+        assert error is None
+        manager.pipeline_instances[instance_id].finish(state)
+        instance_ids.append(instance_id)
+        if clock:
+            clock.now += interval
+    return instance_ids
+
+
+def retained(manager):
+    return set(manager.pipeline_instances)
+
+
+def test_max_instances(create_retaining_manager):
+    manager = create_retaining_manager(max_instances=2)
+    instance_ids = run_instances(manager, [Pipeline.State.COMPLETED] * 3 +
+                                 [Pipeline.State.ERROR])
+    assert retained(manager) == set(instance_ids[2:])
+    statuses, _ = manager.query_instance_status()
+    assert [status["id"] for status in statuses] == instance_ids[2:]
+
+
+def test_max_age(create_retaining_manager, clock):
+    manager = create_retaining_manager(max_age=10)
+    instance_ids = run_instances(manager, [Pipeline.State.COMPLETED] * 3, clock, interval=5)
+    assert retained(manager) == set(instance_ids)
+    # Finished at 1000, 1005 and 1010
+    clock.now = 1012
+    manager.query_instance_status()
+    assert retained(manager) == set(instance_ids[1:])
+    clock.now = 1030
+    manager.query_instance_status()
+    assert not retained(manager)
+
+
+def test_state_limits(create_retaining_manager):
+    manager = create_retaining_manager(state_limits={"ERROR": 1, "ABORTED": 0})
+    instance_ids = run_instances(manager, [Pipeline.State.ERROR, Pipeline.State.COMPLETED,
+                                           Pipeline.State.ERROR, Pipeline.State.ABORTED,
+                                           Pipeline.State.COMPLETED])
+    assert retained(manager) == {instance_ids[1], instance_ids[2], instance_ids[4]}
+
+
+def test_oldest_evicted_across_states(create_retaining_manager, clock):
+    manager = create_retaining_manager(max_instances=2)
+    instance_ids = run_instances(manager, [Pipeline.State.ERROR, Pipeline.State.COMPLETED,
+                                           Pipeline.State.ABORTED], clock)
+    assert retained(manager) == set(instance_ids[1:])
+
+
+def test_evicted_instances_are_found(create_retaining_manager):
+    manager = create_retaining_manager(max_instances=1)
+    instance_ids = run_instances(manager, [Pipeline.State.ERROR, Pipeline.State.COMPLETED])
+    evicted = instance_ids[0]
+    assert evicted not in manager.pipeline_instances
+    assert manager.instance_exists(evicted)
+    assert manager.instance_exists(evicted, "detect", "1")
+    assert not manager.instance_exists(evicted, "track", "1")
+    status = manager.get_instance_status(evicted)
+    assert status["id"] == evicted
+    assert status["state"] is Pipeline.State.ERROR
+    assert manager.get_instance_status(evicted, "detect", "1") == status
+    assert manager.get_instance_status(evicted, "track", "1") is None
+    assert manager.stop_instance(evicted)["state"] is Pipeline.State.ERROR
+    params = manager.get_instance_summary(evicted)
+    assert params["request"]["tags"] == {"camera": "1"}
+    assert params["request"]["pipeline"] == {"name": "detect", "version": "1"}
+    assert not manager.instance_exists("unknown")
+    assert manager.get_instance_status("unknown") is None
+
+
+def test_history_spills_to_sqlite(create_retaining_manager, tmp_path):
+    path = str(tmp_path / "history.db")
+    manager = create_retaining_manager(history=InstanceHistory(max_size=1, path=path),
+                                       max_instances=1)
+    instance_ids = run_instances(manager, [Pipeline.State.COMPLETED, Pipeline.State.ERROR,
+                                           Pipeline.State.ABORTED])
+    assert retained(manager) == {instance_ids[2]}
+    # Only the last evicted summary is in memory, the first is read back
+    assert manager.get_instance_status(instance_ids[0])["state"] is Pipeline.State.COMPLETED
+    assert manager.get_instance_status(instance_ids[1])["state"] is Pipeline.State.ERROR
+    # Summaries are available after a restart
+    history = InstanceHistory(max_size=0, path=path)
+    summary = history.get(instance_ids[1])
+    assert summary["status"]["state"] == "ERROR"
+    assert summary["params"]["request"]["tags"] == {"camera": "1"}
+    assert instance_ids[0] in history
+    assert instance_ids[2] not in history
+
+
+def test_history_without_file_is_bounded():
+    history = InstanceHistory(max_size=2)
+    for index in range(3):
+        history.add({"status": {"id": str(index)}, "params": {}})
+    assert "0" not in history
+    # Lookups refresh a summary
+    assert history.get("1")
+    history.add({"status": {"id": "3"}, "params": {}})
+    assert "1" in history
+    assert "2" not in history
@@ -0,0 +1,103 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import random
+import pytest
+from conftest import FakeFrame, FakeRegion
+
+pytest.importorskip("numpy")
+# pylint: disable=wrong-import-position,protected-access
+from extensions.spatial_analytics.object_line_crossing import ObjectLineCrossing
+
+WIDTH = 0.125
+HEIGHT = 0.25
+
+
+def at(x, y, object_id=1):
+    # Region whose bottom center focus point is (x, y), dyadic values
+    # keep focus points exactly on the lines
+    return FakeRegion((x - WIDTH / 2, y - HEIGHT, WIDTH, HEIGHT), object_id=object_id)
+
+
+def line(start, end, name="Line", focus="bottom_center"):
+    return {"name": name, "line": [list(start), list(end)], "focus": focus}
+
+
+def run(engine, lines, frames):
+    extension = ObjectLineCrossing([dict(item) for item in lines], engine=engine)
+    assert (extension._line_engine is not None) == (engine == "numpy")
+    events = []
+    for regions in frames:
+        frame = FakeFrame(regions)
+        extension.process_frame(frame)
+        events.append([(event["line-name"], event["related-objects"], event["directions"])
+                       for event in frame.events()])
+    return events, [item.cross_totals for item in extension._lines]
+
+
+def assert_same_results(lines, frames):
+    expected = run("python", lines, frames)
+    assert run("numpy", lines, frames) == expected
+    return expected[0]
+
+
+def test_crossing_directions():
+    events = assert_same_results([line((0.5, 0.0), (0.5, 1.0))],
+                                 [[at(0.25, 0.5)], [at(0.75, 0.5)], [at(0.25, 0.5)]])
+    assert events == [[], [("Line", [0], ["counterclockwise"])],
+                      [("Line", [0], ["clockwise"])]]
+
+
+@pytest.mark.parametrize("positions", [
+    [(0.25, 0.5), (0.375, 0.5), (0.625, 0.5), (0.75, 0.5)],   # along the line
+    [(0.0, 0.5), (0.125, 0.5), (0.875, 0.5), (1.0, 0.5)],     # along the extension of the line
+    [(0.125, 0.5), (0.25, 0.5), (0.125, 0.5)],                # onto an end point and back
+    [(0.5, 0.5), (0.5, 0.5), (0.5, 0.5)],                     # stationary on the line
+    [(0.5, 0.25), (0.5, 0.5), (0.5, 0.75)],                   # across through the line
+    [(0.375, 0.25), (0.25, 0.5), (0.125, 0.75)]])             # through an end point
+def test_collinear_movement(positions):
+    lines = [line((0.25, 0.5), (0.75, 0.5), "Horizontal"),
+             line((0.5, 0.25), (0.5, 0.75), "Vertical"),
+             line((0.25, 0.25), (0.75, 0.75), "Diagonal")]
+    assert_same_results(lines, [[at(x, y)] for x, y in positions])
+
+
+def test_degenerate_line():
+    lines = [line((0.5, 0.5), (0.5, 0.5), "Point")]
+    positions = [(0.25, 0.5), (0.5, 0.5), (0.75, 0.5), (0.75, 0.25), (0.25, 0.75)]
+    assert_same_results(lines, [[at(x, y)] for x, y in positions])
+
+
+def test_center_focus():
+    # Centers move from 0.375 to 0.5, on the line, then to 0.625 while
+    # bottom centers stay below the line
+    lines = [line((0.0, 0.5), (1.0, 0.5), focus="center")]
+    frames = [[at(0.5, 0.5)], [at(0.5, 0.625)], [at(0.5, 0.75)]]
+    events = assert_same_results(lines, frames)
+    assert events[1:] == [[("Line", [0], ["parallel"])], [("Line", [0], ["clockwise"])]]
+
+
+def test_untracked_objects_do_not_cross():
+    events = assert_same_results([line((0.5, 0.0), (0.5, 1.0))],
+                                 [[at(0.25, 0.5, object_id=1)], [at(0.75, 0.5, object_id=2)]])
+    assert events == [[], []]
+
+
+def test_random_movement():
+    random.seed(0)
+    lines = [line((random.random() * 0.2, random.random()),
+                  (0.8 + random.random() * 0.2, random.random()),
+                  "Line{}".format(index), random.choice(["bottom_center", "center"]))
+             for index in range(5)]
+    tracks = [[random.random(), random.random()] for _ in range(40)]
+    frames = []
+    for _ in range(50):
+        for track in tracks:
+            track[0] = min(max(track[0] + (random.random() - 0.5) * 0.05, 0.0), 1.0)
+            track[1] = min(max(track[1] + (random.random() - 0.5) * 0.05, 0.0), 1.0)
+        frames.append([at(x, y, object_id) for object_id, (x, y) in enumerate(tracks, 1)])
+    events = assert_same_results(lines, frames)
+    assert any(events)
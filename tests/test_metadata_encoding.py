@@ -0,0 +1,138 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import json
+from collections import namedtuple
+import pytest
+from server import schema
+from server.metadata_sinks import SinkQueue, frame_metadata
+from server.pipeline_manager import PipelineManager
+
+Rect = namedtuple("Rect", ["x", "y", "w", "h"])
+VideoInfo = namedtuple("VideoInfo", ["width", "height"])
+
+
+class FakeTensor:
+    def __init__(self, name, label, label_id, confidence, detection=False):
+        self._values = (name, label, label_id, confidence)
+        self._detection = detection
+
+    def name(self):
+        return self._values[0]
+
+    def label(self):
+        return self._values[1]
+
+    def label_id(self):
+        return self._values[2]
+
+    def confidence(self):
+        return self._values[3]
+
+    def is_detection(self):
+        return self._detection
+
+
+class FakeRegion:
+    def __init__(self, object_id, tensors):
+        self._object_id = object_id
+        self._tensors = tensors
+
+    def rect(self):
+        return Rect(192, 108, 96, 216)
+
+    def normalized_rect(self):
+        return Rect(0.1, 0.1, 0.05, 0.2)
+
+    def label(self):
+        return "vehicle"
+
+    def confidence(self):
+        return 0.75
+
+    def object_id(self):
+        return self._object_id
+
+    def tensors(self):
+        return self._tensors
+
+
+class FakeFrame:
+    def __init__(self, regions, messages=()):
+        self._regions = regions
+        self._messages = list(messages)
+
+    def regions(self):
+        return self._regions
+
+    def messages(self):
+        return self._messages
+
+    def video_info(self):
+        return VideoInfo(1920, 1080)
+
+
+def vehicle(object_id):
+    return FakeRegion(object_id, [
+        FakeTensor("detection", "vehicle", 2, 0.75, detection=True),
+        FakeTensor("color", "red", 4, 0.5)])
+
+
+def test_frame_layout():
+    metadata = frame_metadata(FakeFrame([vehicle(3), vehicle(0)]), 1000, {"camera": 1})
+    assert metadata["timestamp"] == 1000
+    assert metadata["resolution"] == {"width": 1920, "height": 1080}
+    assert metadata["events"] == []
+    assert metadata["tags"] == {"camera": 1}
+    first, untracked = metadata["objects"]
+    assert first == {
+        "id": 3, "x": 192, "y": 108, "w": 96, "h": 216, "roi_type": "vehicle",
+        "detection": {"label": "vehicle", "label_id": 2, "confidence": 0.75,
+                      "bounding_box": {"x_min": 0.1, "y_min": 0.1,
+                                       "x_max": pytest.approx(0.15),
+                                       "y_max": pytest.approx(0.3)}},
+        "tensors": [{"name": "color", "label": "red", "label_id": 4, "confidence": 0.5}]}
+    assert untracked["id"] is None
+    # Every object has the same fields
+    assert set(first) == set(untracked)
+
+
+def test_frame_events():
+    events = [{"event-type": "zoneCount", "zone-name": "Zone1", "zone-count": 1}]
+    frame = FakeFrame([], [json.dumps({"other": 1}), json.dumps({"events": events})])
+    metadata = frame_metadata(frame, 0)
+    assert metadata["objects"] == []
+    assert metadata["events"] == events
+    assert metadata["tags"] == {}
+
+
+def test_empty_frame_is_not_published():
+    assert frame_metadata(FakeFrame([], [json.dumps({"other": 1})]), 0) is None
+
+
+@pytest.mark.parametrize("encoding", ["msgpack", "cbor"])
+def test_binary_round_trip(encoding):
+    decoder = pytest.importorskip({"msgpack": "msgpack", "cbor": "cbor2"}[encoding])
+    metadata = [frame_metadata(FakeFrame([vehicle(index)]), index) for index in range(3)]
+    payload = SinkQueue("topic", encoding=encoding).encode(metadata)
+    if encoding == "msgpack":
+        unpacker = decoder.Unpacker(raw=False)
+        unpacker.feed(payload)
+        assert list(unpacker) == metadata
+    else:
+        assert decoder.loads(payload) == metadata[0]
+        assert len(payload) == sum(len(decoder.dumps(item)) for item in metadata)
+
+
+@pytest.mark.parametrize("metadata_type", ["mqtt", "kafka"])
+def test_binary_format_requires_server_publisher(metadata_type):
+    validator = PipelineManager._create_validator(schema.destination["metadata"])
+    request = {"type": metadata_type, "host": "localhost", "topic": "results"}
+    assert validator.is_valid(request)
+    assert validator.is_valid(dict(request, format="json"))
+    assert validator.is_valid(dict(request, format="msgpack", publisher="server"))
+    assert not validator.is_valid(dict(request, format="msgpack"))
+    assert not validator.is_valid(dict(request, format="cbor", publisher="element"))
@@ -0,0 +1,197 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import gzip
+import json
+import socket
+import pytest
+from server.metadata_sinks import KafkaSink, MetadataSinks, SinkQueue
+from mqtt_broker import MqttBroker
+
+pytest.importorskip("paho.mqtt.client")
+
+
+@pytest.fixture
+def broker():
+    mqtt_broker = MqttBroker()
+    yield mqtt_broker
+    mqtt_broker.close()
+
+
+@pytest.fixture
+def sinks():
+    metadata_sinks = MetadataSinks()
+    yield metadata_sinks
+    metadata_sinks.stop()
+
+
+def destination(host, topic, **options):
+    result = {"type": "mqtt", "host": host, "topic": topic, "publisher": "server"}
+    result.update(options)
+    return result
+
+
+def message(index):
+    return json.dumps({"timestamp": index, "objects": []})
+
+
+def decode(payload):
+    return [json.loads(line) for line in payload.splitlines()]
+
+
+def test_queue_drops_oldest_when_full():
+    sink_queue = SinkQueue("topic", batch_size=10, max_size=3)
+    for index in range(5):
+        sink_queue.append(message(index), now=0)
+    assert len(sink_queue) == 3
+    assert sink_queue.status() == {"queue_depth": 3, "sent": 0, "dropped": 2}
+    assert [json.loads(item)["timestamp"] for item in sink_queue.take_batch()] == [2, 3, 4]
+
+
+def test_queue_holds_messages_until_batch_is_due():
+    sink_queue = SinkQueue("topic", batch_size=3, batch_timeout=0.5)
+    assert sink_queue.get_delay(now=0) is None
+    sink_queue.append(message(0), now=10)
+    sink_queue.append(message(1), now=10.2)
+    assert sink_queue.get_delay(now=10.2) == pytest.approx(0.3)
+    assert sink_queue.get_delay(now=10.6) == 0
+    sink_queue.append(message(2), now=10.3)
+    assert sink_queue.get_delay(now=10.3) == 0
+    assert len(sink_queue.take_batch()) == 3
+
+
+def test_closed_queue_is_sent_without_waiting():
+    sink_queue = SinkQueue("topic", batch_size=10, batch_timeout=60)
+    sink_queue.append(message(0), now=0)
+    assert sink_queue.get_delay(now=0) > 0
+    sink_queue.closed = True
+    assert sink_queue.get_delay(now=0) == 0
+
+
+def test_batch_encoding():
+    batch = [message(0), message(1)]
+    payload = SinkQueue("topic").encode(batch)
+    assert decode(payload) == [json.loads(item) for item in batch]
+    payload = SinkQueue("topic", compression="gzip").encode(batch)
+    assert decode(gzip.decompress(payload)) == [json.loads(item) for item in batch]
+
+
+def test_publisher_selection():
+    assert not MetadataSinks.uses_server_publisher({})
+    assert not MetadataSinks.uses_server_publisher({"type": "file", "publisher": "server"})
+    assert not MetadataSinks.uses_server_publisher({"type": "mqtt"})
+    assert not MetadataSinks.uses_server_publisher({"type": "kafka", "publisher": "element"})
+    assert not MetadataSinks.uses_server_publisher({"type": "mqtt", "format": "msgpack"})
+    assert MetadataSinks.uses_server_publisher({"type": "mqtt", "publisher": "server"})
+    assert MetadataSinks.uses_server_publisher({"type": "kafka", "publisher": "server"})
+
+
+def test_instances_share_connection(broker, sinks):
+    first = sinks.open(destination(broker.host, "first"))
+    second = sinks.open(destination(broker.host, "second"))
+    assert first[0] is second[0]
+    for index in range(3):
+        first[0].put(first[1], message(index))
+        second[0].put(second[1], message(index))
+    assert len(broker.wait_for("first", 3)) == 3
+    assert len(broker.wait_for("second", 3)) == 3
+    assert broker.connections == 1
+    sinks.close(*first)
+    sinks.close(*second)
+    first[0].join(timeout=10)
+    assert not first[0].is_alive()
+    assert first[1].status() == {"queue_depth": 0, "sent": 3, "dropped": 0}
+
+
+def test_batches_by_count_and_timeout(broker, sinks):
+    sink, sink_queue = sinks.open(destination(broker.host, "batched",
+                                              **{"batch-size": 4, "batch-timeout": 50,
+                                                 "compression": "gzip"}))
+    for index in range(6):
+        sink.put(sink_queue, message(index))
+    payloads = broker.wait_for("batched", 2)
+    results = [decode(gzip.decompress(payload)) for payload in payloads]
+    assert [len(batch) for batch in results] == [4, 2]
+    assert [result["timestamp"] for batch in results for result in batch] == list(range(6))
+    sinks.close(sink, sink_queue)
+
+
+def test_close_sends_remaining_messages(broker, sinks):
+    sink, sink_queue = sinks.open(destination(broker.host, "closing",
+                                              **{"batch-size": 100, "batch-timeout": 60000}))
+    sink.put(sink_queue, message(0))
+    sinks.close(sink, sink_queue)
+    assert len(broker.wait_for("closing", 1)) == 1
+    sink.join(timeout=10)
+    assert sink_queue.status()["sent"] == 1
+
+
+def test_unreachable_broker_counts_dropped(sinks):
+    unused = socket.socket()
+    unused.bind(("127.0.0.1", 0))
+    host = "127.0.0.1:{}".format(unused.getsockname()[1])
+    unused.close()
+    sink, sink_queue = sinks.open(destination(host, "unreachable"))
+    sink.put(sink_queue, message(0))
+    sink.put(sink_queue, message(1))
+    sinks.close(sink, sink_queue)
+    sink.join(timeout=10)
+    assert sink_queue.status() == {"queue_depth": 0, "sent": 0, "dropped": 2}
+
+
+class FakeKafkaFuture:
+    def __init__(self, error):
+        self.error = error
+        self.callbacks = []
+        self.errbacks = []
+
+    def add_callback(self, function, *args):
+        self.callbacks.append((function, args))
+
+    def add_errback(self, function, *args):
+        self.errbacks.append((function, args))
+
+    def resolve(self):
+        for function, args in self.errbacks if self.error else self.callbacks:
+            function(*args, self.error or "metadata")
+
+
+class FakeKafkaProducer:
+    """Acknowledges sends when flushed, failing those to failing_topics"""
+
+    def __init__(self, failing_topics):
+        self.failing_topics = failing_topics
+        self.futures = []
+
+    def send(self, topic, unused_payload):
+        self.futures.append(FakeKafkaFuture(
+            Exception("broker unavailable") if topic in self.failing_topics else None))
+        return self.futures[-1]
+
+    def flush(self):
+        for future in self.futures:
+            future.resolve()
+        self.futures.clear()
+
+    def close(self):
+        pass
+
+
+def test_kafka_broker_errors_count_dropped(monkeypatch, sinks):
+    producer = FakeKafkaProducer({"failing"})
+    monkeypatch.setattr(KafkaSink, "_connect",
+                        lambda self: setattr(self, "_producer", producer))
+    queues = {}
+    for topic in ("ok", "failing"):
+        sink, queues[topic] = sinks.open({"type": "kafka", "host": "broker:9092",
+                                          "topic": topic, "publisher": "server"})
+        sink.put(queues[topic], message(0))
+        sink.put(queues[topic], message(1))
+    for sink_queue in queues.values():
+        sinks.close(sink, sink_queue)
+    sink.join(timeout=10)
+    assert queues["ok"].status() == {"queue_depth": 0, "sent": 2, "dropped": 0}
+    assert queues["failing"].status() == {"queue_depth": 0, "sent": 0, "dropped": 2}
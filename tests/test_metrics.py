@@ -0,0 +1,139 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import threading
+from types import SimpleNamespace
+from server.metrics import Histogram, LatencyTracker, PipelineMetrics
+from server.pipeline import Pipeline
+
+
+def create_instance(frame_count, state=Pipeline.State.RUNNING):
+    histogram = Histogram()
+    histogram.observe(0.02)
+    return SimpleNamespace(request={"pipeline": {"name": "detect", "version": "1"}},
+                           frame_count=frame_count, latency_histogram=histogram, state=state)
+
+
+def test_render_instance_labels():
+    metrics = PipelineMetrics()
+    snapshot = metrics.collect([("a1", create_instance(10))], 2)
+    text = metrics.render(snapshot)
+    assert 'pipeline_server_instance_frames_total{name="detect",version="1",' \
+           'instance_id="a1"} 10' in text
+    # instance is the target label set by Prometheus
+    assert 'instance="' not in text
+    assert "pipeline_server_queue_depth 2" in text
+
+
+def test_finished_instances_fold_into_pipeline_totals():
+    metrics = PipelineMetrics()
+    metrics.instance_finished(create_instance(5, Pipeline.State.COMPLETED))
+    text = metrics.render(metrics.collect([("a1", create_instance(10))], 0))
+    assert 'pipeline_server_frames_total{name="detect",version="1"} 15' in text
+    assert 'pipeline_server_latency_seconds_count{name="detect",version="1"} 2' in text
+    assert 'pipeline_server_instances_finished_total{name="detect",version="1",' \
+           'state="COMPLETED"} 1' in text
+
+
+def test_render_profiled_elements():
+    metrics = PipelineMetrics()
+    profiled = create_instance(10)
+    percentiles = {"p50": 0.002, "p95": 0.004, "p99": None}
+    queue = {"current_level_buffers": 3, "current_level_bytes": 4096,
+             "current_level_time": 50000000, "max_size_buffers": 200,
+             "max_size_bytes": 10485760, "max_size_time": 1000000000}
+    profiled.profile = lambda: {"elements": [
+        {"name": "detection", "buffers": 10, "avg_latency": 0.003,
+         "latency_percentiles": percentiles},
+        {"name": "queue0", "buffers": 9, "avg_latency": None,
+         "latency_percentiles": dict(percentiles, p50=None, p95=None), "queue": queue}]}
+    # Instances started without profiling have no profile
+    unprofiled = create_instance(5)
+    unprofiled.profile = lambda: None
+    text = metrics.render(metrics.collect([("a1", profiled), ("a2", unprofiled)], 0))
+    labels = 'name="detect",version="1",instance_id="a1",element="{}"'
+    assert "pipeline_server_element_frames_total{" + labels.format("detection") + "} 10" in text
+    assert "pipeline_server_element_avg_latency_seconds{" + labels.format("detection") + \
+           "} 0.003" in text
+    assert "pipeline_server_element_latency_seconds{" + labels.format("detection") + \
+           ',quantile="0.95"} 0.004' in text
+    assert "pipeline_server_element_queue_level_buffers{" + labels.format("queue0") + \
+           "} 3" in text
+    assert "pipeline_server_element_queue_level_seconds{" + labels.format("queue0") + \
+           "} 0.05" in text
+    assert "pipeline_server_element_queue_max_size_seconds{" + labels.format("queue0") + \
+           "} 1.0" in text
+    # Missing values and non queue elements have no samples
+    assert 'quantile="0.99"' not in text
+    assert 'element="queue0",quantile' not in text
+    assert "avg_latency_seconds{" + labels.format("queue0") not in text
+    assert "queue_level_buffers{" + labels.format("detection") not in text
+    assert 'instance_id="a2",element' not in text
+
+
+def test_latency_tracker_matches_buffers():
+    tracker = LatencyTracker()
+    tracker.add(1, now=10.0)
+    tracker.add(2, now=10.5)
+    assert tracker.match(1, now=10.25) == 0.25
+    assert tracker.match(3, now=11.0) is None
+    assert len(tracker) == 1
+    # Matched entries are removed by the next add and are not unmatched
+    tracker.add(3, now=11.0)
+    assert tracker.match(1, now=11.0) is None
+    assert tracker.match(2, now=11.0) == 0.5
+    assert tracker.unmatched == 0
+
+
+def test_latency_tracker_sample_interval():
+    tracker = LatencyTracker(sample_interval=3)
+    for pts in range(9):
+        tracker.add(pts, now=0.0)
+    assert [pts for pts in range(9) if tracker.match(pts, now=1.0) is not None] == [2, 5, 8]
+
+
+def test_latency_tracker_evicts_unmatched_entries():
+    tracker = LatencyTracker(capacity=2, max_age=5)
+    for pts in range(4):
+        tracker.add(pts, now=float(pts))
+    assert tracker.unmatched == 2
+    assert tracker.match(0, now=4.0) is None
+    tracker.add(10, now=20.0)
+    # Entries older than max_age are evicted too
+    assert tracker.unmatched == 4
+    assert len(tracker) == 1
+
+
+def test_latency_tracker_concurrent_probes():
+    # Source and sink probes run on different threads
+    tracker = LatencyTracker(capacity=64)
+    count = 20000
+    matched = []
+    added = threading.Event()
+    progress = [0]
+
+    def source():
+        for pts in range(count):
+            tracker.add(pts)
+            progress[0] = pts
+        added.set()
+
+    def sink():
+        pts = 0
+        while pts < count:
+            if pts > progress[0] and not added.is_set():
+                continue
+            if tracker.match(pts) is not None:
+                matched.append(pts)
+            pts += 1
+
+    threads = [threading.Thread(target=source), threading.Thread(target=sink)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(matched) + tracker.unmatched + len(tracker) >= count - 1
+    assert len(set(matched)) == len(matched)
@@ -0,0 +1,126 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+from conftest import FakeFrame, FakeRegion
+from extensions.spatial_analytics import object_line_crossing
+from extensions.spatial_analytics.object_line_crossing import ObjectLineCrossing
+from extensions.spatial_analytics.track_store import TrackStore
+
+LINES = [{"name": "Line", "line": [[0.5, 0.0], [0.5, 1.0]]}]
+LEFT = (0.1, 0.25, 0.2, 0.25)
+RIGHT = (0.7, 0.25, 0.2, 0.25)
+
+
+class Clock:
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(object_line_crossing.time, "time", lambda: self.now)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+@pytest.fixture(params=["python", "numpy"])
+def engine(request):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    return request.param
+
+
+def create_crossing(engine, **kwargs):
+    return ObjectLineCrossing([dict(line) for line in LINES], engine=engine, **kwargs)
+
+
+def process(extension, *regions):
+    frame = FakeFrame([FakeRegion(rect, object_id=object_id) for object_id, rect in regions])
+    extension.process_frame(frame)
+    return [(event["related-objects"], event["tracks"], event["expired-tracks"],
+             event["evicted-tracks"]) for event in frame.events()]
+
+
+def test_track_store_max_age_frames():
+    store = TrackStore(max_age_frames=2)
+    store.update(1, "a", 0, 0)
+    store.update(2, "b", 1, 0)
+    assert store.expire(2, 0) == []
+    assert store.expire(3, 0) == [(1, "a")]
+    assert 1 not in store
+    assert store.get(2) == "b"
+    assert store.status() == {"tracks": 1, "expired": 1, "evicted": 0}
+
+
+def test_track_store_max_age_seconds():
+    store = TrackStore(max_age_seconds=5)
+    store.update(1, "a", 0, 100)
+    store.update(2, "b", 0, 103)
+    # Updating a track refreshes its age
+    store.update(1, "c", 0, 104)
+    assert store.expire(0, 108.5) == [(2, "b")]
+    assert dict(store.items()) == {1: "c"}
+    assert store.expire(0, 110) == [(1, "c")]
+    assert store.status() == {"tracks": 0, "expired": 2, "evicted": 0}
+
+
+def test_track_store_max_tracks():
+    store = TrackStore(max_tracks=2)
+    for track_id in (1, 2, 3):
+        store.update(track_id, track_id, 0, 0)
+    store.update(1, 1, 1, 0)
+    # The least recently updated tracks are evicted
+    assert store.expire(1, 0) == [(2, 2)]
+    assert [track_id for track_id, _ in store.items()] == [3, 1]
+    assert store.status() == {"tracks": 2, "expired": 0, "evicted": 1}
+
+
+def test_track_store_unbounded():
+    store = TrackStore()
+    for track_id in range(100):
+        store.update(track_id, None, track_id, track_id)
+    assert store.expire(10 ** 6, 10 ** 6) == []
+    assert len(store) == 100
+
+
+def test_track_max_age_frames(engine):
+    extension = create_crossing(engine, track_max_age_frames=2)
+    process(extension, (1, LEFT), (2, LEFT))
+    process(extension, (2, LEFT))
+    process(extension, (2, LEFT))
+    # Track 1 was not seen for two frames and is remembered
+    assert process(extension, (1, RIGHT)) == [([0], 2, 0, 0)]
+    process(extension, (2, LEFT))
+    process(extension, (2, LEFT))
+    process(extension, (2, LEFT))
+    process(extension, (2, LEFT))
+    # Track 1 was not seen for four frames and is forgotten
+    assert process(extension, (1, LEFT), (2, RIGHT)) == [([1], 1, 1, 0)]
+
+
+def test_track_max_age_seconds(engine, clock):
+    extension = create_crossing(engine, track_max_age_seconds=5)
+    process(extension, (1, LEFT), (2, LEFT))
+    clock.now += 5
+    process(extension, (2, LEFT))
+    assert process(extension, (1, RIGHT)) == [([0], 2, 0, 0)]
+    clock.now += 3
+    process(extension, (2, LEFT))
+    clock.now += 3
+    process(extension, (2, LEFT))
+    assert process(extension, (1, LEFT), (2, RIGHT)) == [([1], 1, 1, 0)]
+
+
+def test_max_tracks(engine):
+    extension = create_crossing(engine, max_tracks=2)
+    process(extension, (1, LEFT), (2, LEFT), (3, LEFT))
+    # Track 1 is the least recently seen and is evicted
+    assert process(extension, (1, RIGHT), (2, RIGHT), (3, RIGHT)) == [([1, 2], 2, 0, 1)]
+    frame = FakeFrame([FakeRegion(LEFT, object_id=3)])
+    extension.process_frame(frame)
+    assert frame.events()[0]["tracks"] == 2
+    assert frame.events()[0]["evicted-tracks"] == 2
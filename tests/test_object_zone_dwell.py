@@ -0,0 +1,115 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import pytest
+from conftest import FakeFrame, FakeRegion
+from extensions.spatial_analytics import object_zone_dwell
+from extensions.spatial_analytics.object_zone_dwell import ObjectZoneDwell
+
+ZONES = [{"name": "Left", "polygon": [[0.0, 0.0], [0.0, 1.0], [0.5, 1.0], [0.5, 0.0]]},
+         {"name": "Right", "polygon": [[0.5, 0.0], [0.5, 1.0], [1.0, 1.0], [1.0, 0.0]]}]
+LEFT = (0.1, 0.1, 0.2, 0.2)
+RIGHT = (0.7, 0.1, 0.2, 0.2)
+OUTSIDE = (0.1, 1.1, 0.2, 0.2)
+
+
+class Clock:
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(object_zone_dwell.time, "time", lambda: self.now)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+@pytest.fixture(params=["python", "numpy"])
+def engine(request):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    return request.param
+
+
+def create_dwell(engine, **kwargs):
+    return ObjectZoneDwell([dict(zone) for zone in ZONES], engine=engine,
+                           include_intersects=False, **kwargs)
+
+
+def process(extension, *regions):
+    frame = FakeFrame([FakeRegion(rect, object_id=object_id) for object_id, rect in regions])
+    extension.process_frame(frame)
+    return [(event["event-type"], event["zone-name"], event["track-ids"], event["occupancy"])
+            for event in frame.events()]
+
+
+def test_enter_and_exit(engine, clock):
+    extension = create_dwell(engine)
+    assert process(extension, (1, LEFT), (2, LEFT)) == [
+        ("object-zone-enter", "Left", [1, 2], 2)]
+    clock.now += 1
+    assert process(extension, (1, LEFT), (2, LEFT)) == []
+    clock.now += 1
+    assert process(extension, (1, RIGHT), (2, LEFT)) == [
+        ("object-zone-exit", "Left", [1], 1),
+        ("object-zone-enter", "Right", [1], 1)]
+    clock.now += 1
+    events = FakeFrame([FakeRegion(OUTSIDE, object_id=1), FakeRegion(LEFT, object_id=2)])
+    extension.process_frame(events)
+    assert events.events() == [{"event-type": "object-zone-exit", "zone-name": "Right",
+                                "track-ids": [1], "dwell-times": [1.0], "occupancy": 0}]
+
+
+def test_dwell_reported_once(engine, clock):
+    extension = create_dwell(engine, dwell_threshold=5)
+    process(extension, (1, LEFT))
+    clock.now += 4
+    assert process(extension, (1, LEFT)) == []
+    clock.now += 1
+    frame = FakeFrame([FakeRegion(LEFT, object_id=1)])
+    extension.process_frame(frame)
+    assert frame.events() == [{"event-type": "object-zone-dwell", "zone-name": "Left",
+                               "related-objects": [0], "track-ids": [1],
+                               "dwell-times": [5.0], "occupancy": 1}]
+    clock.now += 10
+    assert process(extension, (1, LEFT)) == []
+
+
+def test_expired_tracks_exit(engine, clock):
+    extension = create_dwell(engine, track_max_age_frames=2)
+    process(extension, (1, LEFT), (2, RIGHT))
+    for _ in range(2):
+        clock.now += 1
+        assert process(extension, (2, RIGHT)) == []
+    clock.now += 1
+    assert process(extension, (2, RIGHT)) == [("object-zone-exit", "Left", [1], 0)]
+
+
+def test_expired_tracks_by_time(engine, clock):
+    extension = create_dwell(engine, track_max_age_frames=None, track_max_age_seconds=10)
+    process(extension, (1, LEFT))
+    clock.now += 11
+    assert process(extension) == [("object-zone-exit", "Left", [1], 0)]
+
+
+def test_evicted_tracks_exit(engine, clock):
+    extension = create_dwell(engine, max_tracks=1)
+    process(extension, (1, LEFT))
+    clock.now += 1
+    # Events are added in zone order
+    assert process(extension, (2, RIGHT)) == [
+        ("object-zone-exit", "Left", [1], 0),
+        ("object-zone-enter", "Right", [2], 1)]
+
+
+@pytest.mark.parametrize("untracked_id", [0, None])
+def test_untracked_detections_are_ignored(engine, clock, untracked_id):
+    extension = create_dwell(engine)
+    assert process(extension, (untracked_id, LEFT), (untracked_id, LEFT), (1, LEFT)) == [
+        ("object-zone-enter", "Left", [1], 1)]
+    clock.now += 1
+    assert process(extension, (untracked_id, RIGHT), (1, LEFT)) == []
@@ -0,0 +1,63 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+from conftest import write_pipeline
+
+
+def touch(path, offset):
+    # Changes the modification time even within the file system resolution
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + offset))
+
+
+def test_reload_added_updated_removed(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager()
+    write_pipeline(pipeline_dir, "detect", version="2")
+    path = pipeline_dir / "detect" / "1" / "pipeline.json"
+    path.write_text(path.read_text().replace("Fake pipeline detect", "Updated"))
+    touch(path, 10)
+    changes = manager.reload_pipelines()
+    assert changes == {"added": ["detect/2"], "updated": ["detect/1"], "removed": [],
+                       "errors": []}
+    assert manager.pipelines["detect"]["1"]["description"] == "Updated"
+    path.unlink()
+    assert manager.reload_pipelines()["removed"] == ["detect/1"]
+    assert list(manager.pipelines["detect"]) == ["2"]
+    assert manager.reload_pipelines() == {"added": [], "updated": [], "removed": [],
+                                          "errors": []}
+
+
+def test_invalid_file_keeps_last_config(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager()
+    path = pipeline_dir / "detect" / "1" / "pipeline.json"
+    config = path.read_text()
+    # Half written by an editor
+    path.write_text(config[:len(config) // 2])
+    touch(path, 10)
+    changes = manager.reload_pipelines()
+    assert changes["errors"] == [str(path)]
+    assert not changes["removed"]
+    assert manager.pipeline_exists("detect", "1")
+    instance_id, _ = manager.create_instance("detect", "1", {}, None)
+    assert instance_id
+    path.write_text(config.replace("Fake pipeline detect", "Updated"))
+    touch(path, 20)
+    assert manager.reload_pipelines()["updated"] == ["detect/1"]
+    assert manager.pipelines["detect"]["1"]["description"] == "Updated"
+
+
+def test_invalid_new_file_not_loaded(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager()
+    path = pipeline_dir / "track" / "1"
+    path.mkdir(parents=True)
+    (path / "pipeline.json").write_text("{")
+    changes = manager.reload_pipelines()
+    assert changes["errors"] == [str(path / "pipeline.json")]
+    assert not manager.pipeline_exists("track", "1")
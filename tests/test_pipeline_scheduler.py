@@ -0,0 +1,153 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.pipeline import Pipeline
+from server.pipeline_scheduler import FairScheduler, FifoScheduler
+from conftest import write_pipeline
+
+
+def create_instances(manager, count, name="detect", tenant=None, priority=None):
+    request = {}
+    if tenant is not None:
+        request["tags"] = {"tenant": tenant}
+    if priority is not None:
+        request["priority"] = priority
+    instance_ids = []
+    for _ in range(count):
+        instance_id, error = manager.create_instance(name, "1", dict(request), None)
+        assert error is None
+        instance_ids.append(instance_id)
+    return instance_ids
+
+
+def start_order(manager):
+    """Finishes running instances in the order they were started until
+    none are left, returns instance ids in the order they were started."""
+    order = []
+    while True:
+        running = sorted((instance for instance in manager.pipeline_instances.values()
+                          if instance.state is Pipeline.State.RUNNING),
+                         key=lambda instance: instance.start_sequence)
+        for instance in running:
+            if instance.identifier not in order:
+                order.append(instance.identifier)
+        if not running:
+            return order
+        running[0].finish()
+
+
+def test_fifo_without_priorities_or_tenants(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=2)
+    instance_ids = create_instances(manager, 10)
+    assert start_order(manager) == instance_ids
+
+
+def test_batch_tenant_does_not_starve_live_tenant(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=4)
+    batch = create_instances(manager, 500, tenant="batch")
+    live = create_instances(manager, 10, tenant="live")
+    order = start_order(manager)
+    assert len(order) == 510
+    # Live instances are interleaved with the queued batch jobs
+    assert max(order.index(instance_id) for instance_id in live) < 4 + 2 * len(live)
+    assert [instance_id for instance_id in order if instance_id in batch] == batch
+
+
+def test_tenant_weights(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=1, tenant_weights={"gold": 3, "bronze": 1})
+    gold = set(create_instances(manager, 100, tenant="gold"))
+    create_instances(manager, 100, tenant="bronze")
+    order = start_order(manager)
+    gold_share = sum(1 for instance_id in order[:80] if instance_id in gold)
+    assert 58 <= gold_share <= 62
+
+
+def test_priority_starts_first(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=1)
+    low = create_instances(manager, 5, tenant="a")
+    high = create_instances(manager, 5, tenant="b", priority=10)
+    order = start_order(manager)
+    # The first low priority instance started before the others were queued
+    assert order[0] == low[0]
+    assert order[1:6] == high
+    assert order[6:] == low[1:]
+
+
+def test_max_running_instances(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "file", **{"max-running-instances": 1})
+    write_pipeline(pipeline_dir, "live")
+    manager = create_manager(max_running_pipelines=3)
+    files = create_instances(manager, 5, name="file")
+    live = create_instances(manager, 2, name="live")
+    running = {instance_id for instance_id, instance in manager.pipeline_instances.items()
+               if instance.state is Pipeline.State.RUNNING}
+    # Capped instances stay queued while other pipelines start
+    assert running == {files[0]} | set(live)
+    assert manager.get_instance_status(files[1])["queue_position"] == 1
+    order = start_order(manager)
+    assert [instance_id for instance_id in order if instance_id in files] == files
+
+
+def test_queue_position_and_estimated_wait(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=2)
+    instance_ids = create_instances(manager, 6)
+    status = manager.get_instance_status(instance_ids[5])
+    assert status["state"] is Pipeline.State.QUEUED
+    assert status["queue_position"] == 4
+    # No instance has finished yet
+    assert status["estimated_wait"] is None
+    manager.pipeline_instances[instance_ids[0]].finish()
+    status = manager.get_instance_status(instance_ids[5])
+    assert status["queue_position"] == 3
+    assert status["estimated_wait"] is not None
+    assert "queue_position" not in manager.get_instance_status(instance_ids[0])
+
+
+def test_stop_queued_instance(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(max_running_pipelines=1)
+    instance_ids = create_instances(manager, 3)
+    manager.stop_instance(instance_ids[1])
+    assert start_order(manager) == [instance_ids[0], instance_ids[2]]
+
+
+def test_inactive_tenants_are_pruned():
+    scheduler = FairScheduler()
+    for index in range(1000):
+        scheduler.add(index, {"tags": {"tenant": "tenant{}".format(index)}})
+        assert scheduler.next(lambda instance_id: True) == index
+    # The busy period ends whenever the queue is empty
+    assert not scheduler._virtual_times
+    scheduler.add("a", {"tags": {"tenant": "busy"}})
+    scheduler.add("b", {"tags": {"tenant": "busy"}})
+    scheduler.add("c", {"tags": {"tenant": "idle"}})
+    assert [scheduler.next(lambda instance_id: True) for _ in range(3)] == ["a", "c", "b"]
+    assert len(scheduler) == 0
+
+
+def test_inactive_tenants_are_bounded_while_busy():
+    scheduler = FairScheduler()
+    scheduler.add("busy0", {"tags": {"tenant": "busy"}})
+    for index in range(5000):
+        scheduler.add(index, {"tags": {"tenant": "tenant{}".format(index)}})
+        scheduler.add("busy{}".format(index + 1), {"tags": {"tenant": "busy"}})
+        scheduler.next(lambda instance_id: True)
+    assert len(scheduler._virtual_times) <= FairScheduler.MAX_INACTIVE_TENANTS + \
+        len(scheduler._queues)
+
+
+def test_fifo_scheduler_skips_instances_that_cannot_start():
+    scheduler = FifoScheduler()
+    for index in range(3):
+        scheduler.add(index, {})
+    assert scheduler.next(lambda instance_id: instance_id != 0) == 1
+    assert scheduler.position(2) == 2
+    assert list(scheduler) == [0, 2]
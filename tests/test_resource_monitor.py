@@ -0,0 +1,176 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import random
+import pytest
+from server import resource_monitor
+from server.pipeline import Pipeline
+from server.resource_monitor import ResourceMonitor
+from conftest import write_pipeline
+
+MB = 1024 * 1024
+# CPU cores per frame per second and memory bytes per instance
+COSTS = {"small/1": (0.01, 50 * MB), "large/1": (0.05, 200 * MB)}
+BASE_MEMORY = 100 * MB
+FPS = 30
+
+
+class Instance:
+    def __init__(self, identifier):
+        self.identifier = identifier
+        self.frame_count = 0
+
+    @staticmethod
+    def child_process_id():
+        return None
+
+
+class SimulatedProcess:
+    """Server process running a changing mix of pipeline instances"""
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        self.cpu_time = 0.0
+        self.running = []
+        self._next_id = 0
+        monkeypatch.setattr(resource_monitor.time, "time", lambda: self.now)
+
+    def set_mix(self, counts):
+        # New instances have not processed frames yet
+        self.running = []
+        for key, count in counts.items():
+            for _ in range(count):
+                self.running.append((key, Instance(self._next_id)))
+                self._next_id += 1
+
+    def advance(self, seconds=1.0):
+        self.now += seconds
+        for key, instance in self.running:
+            instance.frame_count += FPS * seconds
+            self.cpu_time += COSTS[key][0] * FPS * seconds
+
+    def read_usage(self, running):
+        memory = BASE_MEMORY + sum(COSTS[key][1] for key, _ in running)
+        return self.cpu_time, memory
+
+
+@pytest.fixture
+def process(monkeypatch):
+    return SimulatedProcess(monkeypatch)
+
+
+def create_monitor(process):
+    monitor = ResourceMonitor(0, lambda: list(process.running))
+    monitor._read_usage = process.read_usage
+    return monitor
+
+
+def test_cost_fit_converges(process):
+    random.seed(0)
+    monitor = create_monitor(process)
+    monitor.sample()
+    for step in range(400):
+        if step % 5 == 0:
+            process.set_mix({key: random.randint(0, 3) for key in COSTS})
+        else:
+            process.advance()
+        monitor.sample()
+    for key, (cpu_per_frame, memory) in COSTS.items():
+        cpu, learned_memory = monitor.get_cost(key)
+        assert cpu == pytest.approx(cpu_per_frame * FPS, rel=0.05)
+        assert learned_memory == pytest.approx(memory, rel=0.05)
+        cost = monitor.get_instance_cost(key, 10)
+        assert cost["cpu"] == pytest.approx(cpu_per_frame * 10, rel=0.05)
+
+
+def test_cost_unknown_until_pipeline_runs(process):
+    monitor = create_monitor(process)
+    monitor.sample()
+    process.set_mix({"small/1": 1})
+    monitor.sample()
+    process.advance()
+    monitor.sample()
+    assert monitor.get_cost("large/1") is None
+    assert monitor.get_instance_cost("large/1", FPS) is None
+    assert monitor.get_cost("small/1") is not None
+
+
+def test_fit_does_not_learn_negative_costs(process):
+    monitor = create_monitor(process)
+    costs = {"small/1": 0.0}
+    monitor._fit(costs, {"small/1": 30.0}, -1.0)
+    assert costs["small/1"] == 0
+
+
+def test_child_process_usage(process, monkeypatch):
+    monitor = ResourceMonitor(0, lambda: [])
+    child = Instance(0)
+    child.child_process_id = lambda: 1234
+    stats = {"self": (100, 10), 1234: (50, 5)}
+    monkeypatch.setattr(ResourceMonitor, "_read_stat", staticmethod(lambda pid="self": stats[pid]))
+    cpu_time, memory = monitor._read_usage([("ffmpeg/1", child)])
+    assert cpu_time == 150 / monitor._clock_ticks
+    assert memory == 15 * monitor._page_size
+
+
+class StubMonitor:
+    enabled = True
+
+    def __init__(self, cpu_utilization, costs):
+        self.cpu_utilization = cpu_utilization
+        self.memory_usage = 0
+        self._costs = costs
+
+    def get_cost(self, key):
+        return self._costs.get(key)
+
+    def get_instance_cost(self, key, fps):
+        return None
+
+    def stop(self):
+        pass
+
+
+def running_ids(manager):
+    return {instance_id for instance_id, instance in manager.pipeline_instances.items()
+            if instance.state is Pipeline.State.RUNNING}
+
+
+def test_admission_within_cpu_budget(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    write_pipeline(pipeline_dir, "new")
+    manager = create_manager(cpu_budget=1.0)
+    manager.resource_monitor = StubMonitor(0.1, {"detect/1": (0.4, 0)})
+    instance_ids = [manager.create_instance("detect", "1", {}, None)[0] for _ in range(4)]
+    # 0.1 measured + 0.4 pending + 0.4 fits, a third instance would not
+    assert running_ids(manager) == set(instance_ids[:2])
+    # Pipelines without a learned cost are admitted
+    new_id = manager.create_instance("new", "1", {}, None)[0]
+    assert new_id in running_ids(manager)
+    # Pending cost is replaced by the next measurement
+    manager.resource_monitor.cpu_utilization = 0.9
+    manager._resources_sampled()
+    assert running_ids(manager) == set(instance_ids[:2]) | {new_id}
+    manager.pipeline_instances[instance_ids[0]].finish()
+    manager.resource_monitor.cpu_utilization = 0.5
+    manager._resources_sampled()
+    assert running_ids(manager) == {instance_ids[1], instance_ids[2], new_id}
+
+
+def test_admission_without_budget(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager()
+    # No budget, the monitor is not started and does not limit instances
+    assert manager.resource_monitor._thread is None
+    manager.resource_monitor = StubMonitor(100.0, {"detect/1": (10.0, 0)})
+    instance_ids = [manager.create_instance("detect", "1", {}, None)[0] for _ in range(3)]
+    assert running_ids(manager) == set(instance_ids)
+
+
+def test_monitor_started_with_budget(create_manager, pipeline_dir):
+    write_pipeline(pipeline_dir, "detect")
+    manager = create_manager(cpu_budget=1.0, resource_sample_interval=60)
+    assert manager.resource_monitor._thread is not None
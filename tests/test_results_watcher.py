@@ -0,0 +1,38 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import gzip
+import json
+import pytest
+
+pytest.importorskip("kafka")
+pytest.importorskip("paho.mqtt.client")
+# pylint: disable=wrong-import-position
+from client.results_watcher import ResultsWatcher
+
+RESULTS = [{"timestamp": 0, "objects": [{"id": 1}]},
+           {"timestamp": 1, "objects": []}]
+
+
+def test_decode_single_result():
+    payload = json.dumps(RESULTS[0]).encode()
+    assert ResultsWatcher.decode_results(payload) == RESULTS[:1]
+
+
+def test_decode_indented_result():
+    payload = json.dumps(RESULTS[0], indent=4).encode()
+    assert ResultsWatcher.decode_results(payload) == RESULTS[:1]
+
+
+def test_decode_batch():
+    payload = "\n".join(json.dumps(result) for result in RESULTS).encode()
+    assert ResultsWatcher.decode_results(payload) == RESULTS
+    assert ResultsWatcher.decode_results(gzip.compress(payload)) == RESULTS
+
+
+def test_decode_indented_batch():
+    payload = "\n".join(json.dumps(result, indent=4) for result in RESULTS).encode()
+    assert ResultsWatcher.decode_results(payload) == RESULTS
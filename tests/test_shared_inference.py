@@ -0,0 +1,252 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import queue
+import threading
+import time
+import pytest
+from server.shared_inference import InferenceBatcher, SharedInference
+
+TIMEOUT = 5
+
+
+class StubExecutor:
+    """Stub inference element: runs each batch in a thread of its own
+    and returns the frames in order, tagged with their batch"""
+
+    def __init__(self, unused_element, batch_size, batcher, batch_time=0.0, fail=False):
+        self.batch_size = batch_size
+        self.batcher = batcher
+        self.batch_time = batch_time
+        self.fail = fail
+        self.batches = []
+        self.stopped = False
+        self.released = threading.Event()
+        self.released.set()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frames):
+        if self.fail:
+            raise Exception("device lost")
+        assert len(frames) == self.batch_size
+        self._queue.put(list(frames))
+
+    def _run(self):
+        frames = self._queue.get()
+        while frames is not None:
+            self.released.wait()
+            time.sleep(self.batch_time)
+            self.batches.append(frames)
+            for frame in frames:
+                self.batcher.complete(dict(frame, batch=len(self.batches)))
+            frames = self._queue.get()
+
+    def stop(self):
+        self.stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+class Instance:
+    def __init__(self, shared_inference, key="GstGvaDetect_inf0", name=None, caps=None):
+        self.name = name
+        self.frames = []
+        self.errors = []
+        self.ended = threading.Event()
+        self.member = shared_inference.attach(key, None, self.frames.append, self.ended.set,
+                                              self.errors.append, caps=caps)
+
+    def submit(self, count, interval=0.0):
+        for index in range(count):
+            self.member.batcher.submit(self.member, {"instance": self.name, "index": index})
+            time.sleep(interval)
+        self.member.batcher.finish(self.member)
+
+
+def get_status(shared_inference, key="GstGvaDetect_inf0"):
+    return next(status for status in shared_inference.status() if status["key"] == key)
+
+
+def create_shared_inference(batch_size=4, max_wait=0.05, **kwargs):
+    executors = []
+
+    def create_executor(element, size, batcher):
+        executors.append(StubExecutor(element, size, batcher, **kwargs))
+        return executors[-1]
+    return SharedInference(batch_size, max_wait, create_executor), executors
+
+
+def run_instances(instances, count, interval=0.0):
+    threads = [threading.Thread(target=instance.submit, args=(count, interval))
+               for instance in instances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    for instance in instances:
+        assert instance.ended.wait(TIMEOUT)
+
+
+def test_instances_share_batches():
+    shared_inference, executors = create_shared_inference(batch_size=4, max_wait=1)
+    instances = [Instance(shared_inference, name=index) for index in range(4)]
+    run_instances(instances, 8)
+    assert len(executors) == 1
+    for instance in instances:
+        assert [frame["index"] for frame in instance.frames] == list(range(8))
+        assert all(frame["instance"] == instance.name for frame in instance.frames)
+    status = get_status(shared_inference)
+    assert status["instances"] == 4
+    assert status["frames"] == 32
+    assert status["batches"] == 8
+    assert status["full_batches"] == 8
+    assert status["padded_frames"] == 0
+    assert status["avg_occupancy"] == 1
+    assert status["batch_sizes"] == [0, 0, 0, 0, 8]
+    assert len(executors[0].batches) == 8
+    # Frames of different instances are inferred in the same batches
+    assert any(len({frame["instance"] for frame in batch}) > 1
+               for batch in executors[0].batches)
+
+
+def test_partial_batch_padded():
+    shared_inference, executors = create_shared_inference(batch_size=4, max_wait=0.02)
+    instance = Instance(shared_inference)
+    run_instances([instance], 3)
+    assert [frame["index"] for frame in instance.frames] == [0, 1, 2]
+    assert executors[0].batches[0][3] == executors[0].batches[0][2]
+    status = get_status(shared_inference)
+    assert status["timed_out_batches"] == 1
+    assert status["frames"] == 3
+    assert status["padded_frames"] == 1
+    assert status["avg_occupancy"] == 0.75
+    assert status["batch_sizes"] == [0, 0, 0, 1, 0]
+
+
+def test_end_after_last_frame():
+    shared_inference, executors = create_shared_inference(batch_size=2, max_wait=1)
+    executors_released = threading.Event()
+    instance = Instance(shared_inference)
+    executors[0].released = executors_released
+    instance.submit(4)
+    # Finished but frames are still being inferred
+    assert not instance.ended.wait(0.1)
+    executors_released.set()
+    assert instance.ended.wait(TIMEOUT)
+    assert len(instance.frames) == 4
+
+
+def test_detach():
+    shared_inference, executors = create_shared_inference(batch_size=2, max_wait=10)
+    instances = [Instance(shared_inference, name=index) for index in range(2)]
+    executors[0].released.clear()
+    instances[0].member.batcher.submit(instances[0].member, {"instance": 0, "index": 0})
+    instances[0].member.batcher.submit(instances[0].member, {"instance": 0, "index": 1})
+    instances[0].member.batcher.submit(instances[0].member, {"instance": 0, "index": 2})
+    deadline = time.monotonic() + TIMEOUT
+    while (not get_status(shared_inference)["batches"]
+           and time.monotonic() < deadline):
+        time.sleep(0.01)
+    shared_inference.detach(instances[0].member)
+    # Results of detached instances are discarded and its queued frames
+    # are not waited for
+    executors[0].released.set()
+    run_instances(instances[1:], 2)
+    assert not instances[0].frames
+    assert [frame["index"] for frame in instances[1].frames] == [0, 1]
+    assert len(executors[0].batches) == 2
+    shared_inference.detach(instances[1].member)
+    assert executors[0].stopped
+    assert not shared_inference.status()
+    # A new instance starts a new shared inference element
+    Instance(shared_inference)
+    assert len(executors) == 2
+
+
+def test_keys_not_shared():
+    shared_inference, executors = create_shared_inference(batch_size=2, max_wait=0.02)
+    instances = [Instance(shared_inference, key=key) for key in ("GstGvaDetect_inf0",
+                                                               "GstGvaClassify_inf0")]
+    run_instances(instances, 2)
+    assert len(executors) == 2
+    for executor in executors:
+        assert all(len({frame["instance"] for frame in batch}) == 1
+                   for batch in executor.batches)
+    assert ({status["key"] for status in shared_inference.status()}
+            == {"GstGvaDetect_inf0", "GstGvaClassify_inf0"})
+
+
+def test_caps_not_shared():
+    shared_inference, executors = create_shared_inference(batch_size=2, max_wait=0.02)
+    caps = ["video/x-raw, width=(int)640, height=(int)480",
+            "video/x-raw, width=(int)1920, height=(int)1080"]
+    instances = [Instance(shared_inference, name=index, caps=caps[index % 2])
+                 for index in range(4)]
+    run_instances(instances, 2)
+    assert len(executors) == 2
+    for executor in executors:
+        assert all(len({frame["instance"] % 2 for frame in batch}) == 1
+                   for batch in executor.batches)
+    statuses = shared_inference.status()
+    assert sorted(status["caps"] for status in statuses) == sorted(caps)
+    assert all(status["instances"] == 2 for status in statuses)
+    assert "caps" not in Instance(shared_inference).member.batcher.status()
+
+
+def test_pending_frames_bounded():
+    batcher = InferenceBatcher("GstGvaDetect_inf0", 2, 0.01, max_pending=4)
+    executor = StubExecutor(None, 2, batcher)
+    executor.released.clear()
+    batcher.start(executor)
+    instance_frames = []
+    member = batcher.attach(instance_frames.append, lambda: None, lambda message: None)
+    submitted = []
+
+    def submit():
+        for index in range(8):
+            batcher.submit(member, {"index": index})
+            submitted.append(index)
+    thread = threading.Thread(target=submit, daemon=True)
+    thread.start()
+    time.sleep(0.2)
+    assert len(submitted) == 4
+    executor.released.set()
+    thread.join(TIMEOUT)
+    assert len(submitted) == 8
+    batcher.detach(member)
+    batcher.stop()
+
+
+def test_executor_error():
+    shared_inference, unused_executors = create_shared_inference(batch_size=2, max_wait=0.01,
+                                                                 fail=True)
+    instances = [Instance(shared_inference, name=index) for index in range(2)]
+    instances[0].member.batcher.submit(instances[0].member, {"instance": 0, "index": 0})
+    deadline = time.monotonic() + TIMEOUT
+    while not instances[1].errors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for instance in instances:
+        assert instance.errors == ["Shared inference GstGvaDetect_inf0: device lost"]
+    shared_inference.stop()
+
+
+@pytest.mark.parametrize("streams", [3, 8])
+def test_unaligned_streams(streams):
+    # Streams at independent frame rates fill batches up to max_wait
+    shared_inference, executors = create_shared_inference(batch_size=4, max_wait=0.01,
+                                                          batch_time=0.002)
+    instances = [Instance(shared_inference, name=index) for index in range(streams)]
+    run_instances(instances, 20, interval=0.005)
+    for instance in instances:
+        assert [frame["index"] for frame in instance.frames] == list(range(20))
+    status = get_status(shared_inference)
+    assert status["frames"] == streams * 20
+    assert sum(status["batch_sizes"]) == status["batches"] == len(executors[0].batches)
+    assert status["avg_batch_size"] > 1
+    shared_inference.stop()
+    assert executors[0].stopped
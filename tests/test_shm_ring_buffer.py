@@ -0,0 +1,118 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+import threading
+import uuid
+import pytest
+from server.shm.shm_ring_buffer import ShmRingReader, ShmRingWriter, get_path
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="requires /dev/shm")
+
+
+@pytest.fixture
+def name():
+    name = "test-{}".format(uuid.uuid4().hex)
+    yield name
+    try:
+        os.unlink(get_path(name))
+    except FileNotFoundError:
+        pass
+
+
+def frame_data(index, size=1024):
+    return bytes((index + offset) % 256 for offset in range(size))
+
+
+def read_frames(name, results, errors):
+    try:
+        reader = ShmRingReader(name, timeout=10)
+        frame = reader.read(timeout=10)
+        while frame:
+            with frame:
+                results.append((frame.pts, bytes(frame.data), frame.messages(), frame.caps))
+            frame = reader.read(timeout=10)
+        reader.close()
+    except Exception as error:  # pylint: disable=broad-except
+        errors.append(error)
+
+
+def test_round_trip_with_concurrent_start(name):
+    # The reader polls for the ring while the writer creates it, as
+    # when a consumer is started before the pipeline
+    for attempt in range(20):
+        results = []
+        errors = []
+        ring_name = "{}-{}".format(name, attempt)
+        reader = threading.Thread(target=read_frames, args=(ring_name, results, errors))
+        reader.start()
+        writer = ShmRingWriter(ring_name, 4, 1024 + 256)
+        try:
+            for index in range(32):
+                while not writer.has_space():
+                    pass
+                writer.write(frame_data(index), b'{"objects": []}', b"video/x-raw", pts=index)
+            writer.close()
+            reader.join(timeout=20)
+        finally:
+            writer.unlink()
+        assert not errors
+        assert [result[0] for result in results] == list(range(32))
+        assert all(result[1] == frame_data(index) for index, result in enumerate(results))
+        assert results[0][2] == [{"objects": []}]
+        assert results[0][3] == "video/x-raw"
+
+
+def test_no_temporary_files_left(name):
+    writer = ShmRingWriter(name, 2, 128)
+    writer.close()
+    writer.unlink()
+    assert not [entry for entry in os.listdir("/dev/shm") if entry.startswith("." + name)]
+
+
+def test_writer_replaces_stale_ring(name):
+    with open(get_path(name), "wb") as stale:
+        stale.write(b"stale")
+    writer = ShmRingWriter(name, 2, 128)
+    reader = ShmRingReader(name, timeout=1)
+    assert reader.slot_count == 2
+    reader.close()
+    writer.close()
+    writer.unlink()
+
+
+def test_frames_larger_than_slot_are_rejected(name):
+    writer = ShmRingWriter(name, 2, 128)
+    with pytest.raises(ValueError):
+        writer.write(bytes(256))
+    writer.close()
+    writer.unlink()
+
+
+def test_writer_waits_for_release(name):
+    writer = ShmRingWriter(name, 2, 128)
+    reader = ShmRingReader(name)
+    writer.write(b"a")
+    writer.write(b"b")
+    assert not writer.has_space()
+    first = reader.read(timeout=1)
+    assert not writer.has_space()
+    second = reader.read(timeout=1)
+    # Releasing a frame releases the frames read before it
+    second.release()
+    assert writer.has_space()
+    writer.add_dropped()
+    assert reader.dropped == 1
+    first.release()
+    writer.close()
+    assert reader.read(timeout=1) is None
+    reader.close()
+    writer.unlink()
+
+
+def test_reader_timeout(name):
+    with pytest.raises(FileNotFoundError):
+        ShmRingReader(name, timeout=0.01)
@@ -0,0 +1,122 @@
+'''
+* Copyright (C) 2022 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import itertools
+import random
+import pytest
+from conftest import FakeFrame, FakeRegion
+
+pytest.importorskip("numpy")
+# pylint: disable=wrong-import-position,protected-access
+from extensions.spatial_analytics.object_zone_count import ObjectZoneCount
+from extensions.spatial_analytics.zone_engine import ZoneEngine
+
+SQUARE = [[0.2, 0.2], [0.2, 0.6], [0.6, 0.6], [0.6, 0.2]]
+
+
+def zone(polygon, threshold=0.0, name="Zone"):
+    return {"name": name, "polygon": polygon, "threshold": threshold}
+
+
+def engines(zones):
+    python = ObjectZoneCount([dict(item) for item in zones], engine="python")
+    numpy = ObjectZoneCount([dict(item) for item in zones], engine="numpy")
+    assert numpy._zone_engine
+    return python, numpy
+
+
+def results(extension, frame):
+    if extension._zone_engine:
+        zone_results = extension._get_zone_results_batched(frame)
+    else:
+        zone_results = extension._get_zone_results(frame)
+    return [(item["name"], related_objects, statuses)
+            for item, related_objects, statuses in zone_results]
+
+
+def assert_same_results(zones, regions):
+    python, numpy = engines(zones)
+    frame = FakeFrame(regions)
+    expected = results(python, frame)
+    assert results(numpy, frame) == expected
+    return expected
+
+
+def test_status_inside_outside_intersecting():
+    expected = assert_same_results([zone(SQUARE)], [
+        FakeRegion((0.3, 0.3, 0.1, 0.1)),
+        FakeRegion((0.7, 0.7, 0.1, 0.1)),
+        FakeRegion((0.5, 0.5, 0.2, 0.2))])
+    assert expected == [("Zone", [0, 2], ["within", "intersects"])]
+
+
+@pytest.mark.parametrize("rect", [
+    (0.2, 0.2, 0.1, 0.1),   # corner on the first vertex
+    (0.5, 0.5, 0.1, 0.1),   # corner on the third vertex
+    (0.2, 0.3, 0.4, 0.1),   # sides on the left and right edges
+    (0.3, 0.2, 0.1, 0.4),   # sides on the top and bottom edges
+    (0.2, 0.2, 0.4, 0.4),   # detection equal to the zone
+    (0.6, 0.3, 0.1, 0.1),   # touching the right edge from outside
+    (0.3, 0.1, 0.1, 0.1),   # touching the top edge from outside
+    (0.4, 0.4, 0.0, 0.0)])  # point inside the zone
+def test_detection_on_zone_boundary(rect):
+    assert_same_results([zone(SQUARE)], [FakeRegion(rect)])
+
+
+def test_grid_aligned_detections():
+    # Detections on a grid shared with the zone vertices put corners on
+    # edges and vertices of the zones
+    zones = [zone(SQUARE, name="Square"),
+             zone([[0.3, 0.1], [0.1, 0.5], [0.5, 0.7], [0.7, 0.3]], name="Diamond"),
+             zone([[0.2, 0.2], [0.2, 0.6], [0.6, 0.6], [0.6, 0.2], [0.4, 0.4]],
+                  name="Concave")]
+    steps = [index / 10 for index in range(9)]
+    regions = [FakeRegion((x, y, w, h))
+               for x, y in itertools.product(steps, steps)
+               for w, h in ((0.1, 0.1), (0.2, 0.1), (0.0, 0.2))]
+    assert_same_results(zones, regions)
+
+
+@pytest.mark.parametrize("polygon", [
+    [[0.4, 0.4]] * 4,                                    # single point
+    [[0.2, 0.4], [0.3, 0.4], [0.5, 0.4], [0.6, 0.4]],    # horizontal line
+    [[0.4, 0.2], [0.4, 0.3], [0.4, 0.5], [0.4, 0.6]],    # vertical line
+    [[0.2, 0.2], [0.3, 0.3], [0.5, 0.5], [0.6, 0.6]],    # diagonal line
+    [[0.2, 0.2], [0.2, 0.2], [0.6, 0.6], [0.6, 0.2]]])   # repeated vertex
+def test_degenerate_zone(polygon):
+    steps = [index / 10 for index in range(8)]
+    regions = [FakeRegion((x, y, 0.2, 0.2)) for x, y in itertools.product(steps, steps)]
+    regions.append(FakeRegion((0.4, 0.4, 0.0, 0.0)))
+    assert_same_results([zone(polygon)], regions)
+
+
+def test_thresholds():
+    regions = [FakeRegion((0.3, 0.3, 0.1, 0.1), confidence) for confidence in (0.2, 0.5, 0.8)]
+    expected = assert_same_results([zone(SQUARE, threshold=0.5)], regions)
+    assert expected == [("Zone", [1, 2], ["within", "within"])]
+
+
+def test_random_zones_and_detections():
+    random.seed(0)
+    zones = []
+    for index in range(10):
+        x_min, y_min = random.random() * 0.8, random.random() * 0.8
+        x_max, y_max = x_min + random.random() * 0.2, y_min + random.random() * 0.2
+        zones.append(zone([[x_min + random.random() * 0.02, y_min], [x_min, y_max],
+                           [x_max, y_max], [x_max - random.random() * 0.02, y_min]],
+                          random.choice([0.0, 0.5]), "Zone{}".format(index)))
+    for _ in range(20):
+        assert_same_results(zones, [
+            FakeRegion((random.random() * 0.9, random.random() * 0.9,
+                        random.random() * 0.1, random.random() * 0.1), random.random())
+            for _ in range(50)])
+
+
+def test_zones_with_few_vertices_use_python_engine():
+    triangle = [[0.2, 0.2], [0.2, 0.6], [0.6, 0.6]]
+    assert not ZoneEngine.supports([zone(triangle)])
+    extension = ObjectZoneCount([zone(triangle)], engine="numpy")
+    assert extension._zone_engine is None